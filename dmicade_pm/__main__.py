@@ -2,16 +2,26 @@ import sys
 import threading
 import logging
 import json
+import signal
 
-from .helper import parse_command_line_arguments
+from .helper import parse_command_line_arguments, DmicEvent
 from .processmanager import DmicProcessManager
-from .statemachine import DmicStateMachine
+from .statemachine import DmicStateMachine, DmicStatePool
 from .tasks import DmicTask
 from .commands import commands_set_pm
 from .uds_server import UdsServer
 from .message_parser import DmicMessageParser
 from .config_loader import DmicConfigLoader
 from .logging_manager import DmicLogging
+from .metrics import DmicMetrics
+from .replay import DmicTaskRecorder, DmicRecordingProcessManager, DmicReplay
+from .runtime import create_runtime
+from .watchdog import DmicWatchdog
+from .flight_recorder import DmicFlightRecorder
+from .status_block import DmicStatusBlock
+from .launch_stats import DmicLaunchStats
+
+logger = logging.getLogger('dmicade_pm.client')
 
 def main():
     parsed_args = parse_command_line_arguments(sys.argv)
@@ -20,59 +30,209 @@ def main():
         print(json.dumps(DmicConfigLoader(parsed_args).global_config, indent=4))
         return
 
+    if 'graph' in parsed_args:
+        print(json.dumps(DmicStatePool().transition_graph(), indent=4))
+        return
+
+    if 'replay' in parsed_args:
+        print(json.dumps(DmicReplay(parsed_args['replay']).run(), indent=4))
+        return
+
     print(__import__('os').getcwd())
-    logger = DmicLogging(parsed_args)
-    logger.delete_old_logs()
-    logger.setup()
+    dmic_logging = DmicLogging(parsed_args)
+    dmic_logging.delete_old_logs()
+    dmic_logging.setup()
 
     try:
-        client = Client(parsed_args)
+        client = Client(parsed_args, dmic_logging)
 
         debug_mode = 'debug' in parsed_args
 
         client.start(debug_mode)
 
     except Exception as e:
-        logging.error(e)
+        logger.error(e)
+        if DmicEvent.flight_recorder:
+            DmicEvent.flight_recorder.dump(f'Unhandled exception: {e!r}')
 
-    logging.info('[MAIN]: Exit...')
+    logger.info('[MAIN]: Exit...')
 
 class Client:
     SOCKET_PATH = '/tmp/dmicade_socket.s'
 
-    def __init__(self, user_args):
+    def __init__(self, user_args, dmic_logging=None):
+        self._dmic_logging = dmic_logging
         self._config_loader = DmicConfigLoader(user_args)
-        self._uds_server = UdsServer(self.SOCKET_PATH)
+        self._setup_flight_recorder(self._config_loader.global_config)
+        self._metrics = DmicMetrics()
+        self._status_block = self._create_status_block(self._config_loader.global_config)
+        self._launch_stats = self._create_launch_stats(self._config_loader.global_config)
+        self._runtime = create_runtime(user_args.get('runtime', 'thread'))
+        self._uds_server = self._runtime.create_uds_server(self.SOCKET_PATH, self._metrics)
         self._message_parser = DmicMessageParser(self._uds_server)
-        self._process_manager = DmicProcessManager(self, self._uds_server, self._config_loader)
-        commands_set_pm(self._process_manager)
-        self._state_machine = DmicStateMachine(self._config_loader.global_config)
+        self._process_manager = DmicProcessManager(
+            self,
+            self._uds_server,
+            self._config_loader,
+            self._runtime,
+            self._status_block,
+            self._launch_stats)
+
+        self._recorder = None
+        if 'record' in user_args:
+            self._recorder = DmicTaskRecorder(user_args['record'], self._config_loader.global_config, self._config_loader.configs)
+            commands_set_pm(DmicRecordingProcessManager(self._process_manager, self._recorder))
+        else:
+            commands_set_pm(self._process_manager)
+
+        self._watchdog = DmicWatchdog(self._config_loader.global_config)
+        self._state_machine = DmicStateMachine(
+            self._config_loader.global_config, self._metrics, self._recorder, self._watchdog, self._status_block,
+            self._runtime.create_temperature_logging)
 
         self._message_parser.received_task_event += self.queue_state_task
+        self._message_parser.log_level_event += self.set_log_level
+
+        self._uds_server.register_query('status', self.dump_status)
+        self._uds_server.register_query('apps', self._process_manager.dump_apps)
+        self._uds_server.register_query('metrics', self.dump_metrics)
+        self._uds_server.register_query('threads', self.dump_threads)
 
     def start(self, debug_mode=False):
-        logging.debug('[PM CLIENT] Start')
+        logger.debug('[PM CLIENT] Start')
 
-        self._uds_server.connected_event += lambda x: logging.info('[PM CLIENT] UDS server connected!')
-        self._uds_server.disconnected_event += lambda x: logging.warning('[PM CLIENT] UDS server disconnected!')
+        self._uds_server.connected_event += lambda x: logger.info('[PM CLIENT] UDS server connected!')
+        self._uds_server.disconnected_event += lambda x: logger.warning('[PM CLIENT] UDS server disconnected!')
 
         self._uds_server.start()
 
+        # Dump latency metrics to the log on 'kill -USR1 <pid>'. The
+        # handler interrupts the main thread, which may hold the locks
+        # the dump takes, so the dump runs on its own thread.
+        if hasattr(signal, 'SIGUSR1'):
+            metrics_requested = threading.Event()
+            t = threading.Thread(target=self._log_metrics_on_request, args=(metrics_requested,), daemon=True)
+            t.name = 'MetricsDumpThread'
+            t.start()
+            signal.signal(signal.SIGUSR1, lambda signum, frame: metrics_requested.set())
+
         if debug_mode:
-            logging.info('[PM CLIENT] Running in Debug mode...')
+            logger.info('[PM CLIENT] Running in Debug mode...')
             t = threading.Thread(target=self._debug, daemon=True)
             t.name = 'DebugThread'
             t.start()
 
-        self._state_machine.run_event_loop_sync()
+        self._runtime.run(self._state_machine)
 
-        logging.debug('[PM CLIENT] Close uds server...')
+        logger.debug('[PM CLIENT] Close uds server...')
         self._uds_server.close()
-        logging.debug('[PM CLIENT] Done...\n')
+
+        if self._recorder:
+            self._recorder.close()
+        if self._status_block:
+            self._status_block.close()
+        logger.debug('[PM CLIENT] Done...\n')
+
+    def _create_status_block(self, global_config):
+        """Creates the shared memory status block, None if disabled or not possible."""
+
+        status_block_path = global_config.get('status_block_path')
+        if not status_block_path:
+            return None
+
+        try:
+            return DmicStatusBlock(status_block_path)
+        except OSError as e:
+            logger.warning('[PM CLIENT] Could not create status block: %s', e)
+            return None
+
+    def _create_launch_stats(self, global_config):
+        """Creates the launch statistics store, None if disabled."""
+
+        launch_stats_path = global_config.get('launch_stats_path')
+        if not launch_stats_path:
+            return None
+
+        return DmicLaunchStats(
+            launch_stats_path,
+            float(global_config.get('app_ready_timeout', 8)),
+            float(global_config.get('app_ready_timeout_max', 20)))
+
+    def _setup_flight_recorder(self, global_config):
+        """Enables recording of event firings.
+
+        Dumps the recorded firings when an exception is not handled on
+        any thread.
+        """
+
+        recorder_size = int(global_config.get('flight_recorder_size', 0))
+        if recorder_size <= 0:
+            return
+
+        recorder = DmicFlightRecorder(recorder_size, global_config.get('logs', './logs'))
+        DmicEvent.flight_recorder = recorder
+
+        default_excepthook = sys.excepthook
+        default_threading_excepthook = threading.excepthook
+
+        def excepthook(exc_type, exc_value, exc_traceback):
+            recorder.dump(f'Unhandled exception: {exc_value!r}')
+            default_excepthook(exc_type, exc_value, exc_traceback)
+
+        def threading_excepthook(args):
+            recorder.dump(f'Unhandled exception in thread {args.thread.name if args.thread else None}: {args.exc_value!r}')
+            default_threading_excepthook(args)
+
+        sys.excepthook = excepthook
+        threading.excepthook = threading_excepthook
 
     def queue_state_task(self, task: DmicTask):
         self._state_machine.queue_task_for_state(task)
 
+    def set_log_level(self, level_args):
+        """Changes a subsystems log level, see DmicLogging.set_level."""
+
+        if not self._dmic_logging:
+            return
+
+        try:
+            self._dmic_logging.set_level(*level_args)
+        except ValueError as e:
+            logger.warning('[PM CLIENT] %s', e)
+
+    def dump_status(self) -> dict:
+        """Returns state machine and process manager status as json serializable dictionary."""
+
+        status = self._state_machine.dump_status()
+        status.update(self._process_manager.dump_status())
+        status['runtime'] = self._runtime.NAME
+        status['uds_clients'] = len(self._uds_server.connections())
+        return status
+
+    def dump_threads(self) -> list:
+        """Returns name and state of all threads as json serializable list."""
+
+        return [{'name': t.name, 'daemon': t.daemon, 'alive': t.is_alive(), 'ident': t.ident} for t in threading.enumerate()]
+
+    def dump_metrics(self) -> dict:
+        """Returns state machine, uds server, parser and app launch metrics as json serializable dictionary."""
+
+        metrics = self._state_machine.dump_metrics()
+        metrics['uds'] = self._uds_server.dump_stats()
+        metrics['parser'] = self._message_parser.dump_stats()
+        if self._launch_stats:
+            metrics['launch'] = self._launch_stats.dump_stats()
+        return metrics
+
+    def log_metrics(self):
+        logger.info('[PM CLIENT] Metrics:\n%s', json.dumps(self.dump_metrics(), indent=4))
+
+    def _log_metrics_on_request(self, metrics_requested: threading.Event):
+        while True:
+            metrics_requested.wait()
+            metrics_requested.clear()
+            self.log_metrics()
+
     def _debug(self):
 
         input_str = ''
@@ -120,6 +280,10 @@ class Client:
                     print( list(self._config_loader.configs.keys()) )
                     continue
 
+                elif input_str.find('metrics') == 0:
+                    print(json.dumps(self.dump_metrics(), indent=4))
+                    continue
+
             except Exception as e:
                 print(e)
 
@@ -1 +1,3 @@
 from ._application_handler import DmicApplicationHandler
+from ._exit_watchers import DmicThreadExitWatcher, DmicLoopExitWatcher
+from ._window_backends import DmicWindowBackend, DmicFakeWindowBackend, create_window_backend
@@ -1,7 +1,15 @@
-import subprocess
+import selectors
+import threading
 import logging
+import time
+import os
 
 from ._applications import DmicAppNotRunningException, dmic_app_process_factory
+from ._exit_watchers import shared_exit_watcher
+from ._window_backends import create_window_backend
+from ._output_pump import DmicOutputPump
+
+logger = logging.getLogger(__name__)
 
 
 class DmicApplicationHandler:
@@ -17,19 +25,40 @@ class DmicApplicationHandler:
         A config loader for retrieving app configs.
       running_apps : dict
         Currently running DmicApp instances with their app id as keys.
+        Apps are started from job threads, so access is guarded by
+        'running_apps_lock'.
+      exit_watcher
+        Watches the processes of started apps for crashes.
+      window_backend : DmicWindowBackend
+        Finds, focuses and closes app windows.
+      launch_stats : DmicLaunchStats
+        Records start, window and focus times and sets the ready
+        timeout per app. Uses the configured 'app_ready_timeout' for
+        all apps when None.
+      output_pump : DmicOutputPump
+        Writes the output of started apps to rotating log files in
+        '<logs>/apps'.
+
+    Resolved window ids are cached on the running app for its process
+    and dropped when the app crashes, stops or gets closed. Window
+    search terms are cached per app id.
     """
 
-    CMD_GET_FOCUSED_WINDOW_ID   = 'xdotool getactivewindow'
-    CMD_SEARCH_WINDOW           = 'xdotool search --onlyvisible %s | head -n1'  # Only returns first found id.
-    CMD_FOCUS_WINDOW_SYNC       = 'xdotool search --onlyvisible %s windowactivate --sync'
-    CMD_KILL_WINDOW             = 'xdotool search --onlyvisible %s windowkill'
+    READY_POLL_MIN_INTERVAL = 0.05
+    READY_POLL_MAX_INTERVAL = 0.8
 
-    def __init__(self, process_manager, config_loader):
+    def __init__(self, process_manager, config_loader, exit_watcher=None, window_backend=None, launch_stats=None, output_pump=None):
         """Constructor for class DmicApplicationHandler"""
 
         self.process_manager = process_manager
         self._config_loader = config_loader
         self.running_apps = dict()
+        self.running_apps_lock = threading.RLock()
+        self.exit_watcher = exit_watcher if exit_watcher else shared_exit_watcher()
+        self.window_backend = window_backend if window_backend else create_window_backend()
+        self.launch_stats = launch_stats
+        self.output_pump = output_pump if output_pump else self._create_output_pump(config_loader.global_config)
+        self._window_search_terms = dict()
 
     def start_app(self, app_id):
         """Starts an app by its id.
@@ -46,124 +75,286 @@ class DmicApplicationHandler:
           DmicAppNotConfiguredException: If app is not configured correctly.
         """
 
-        logging.debug(f'[APP HANDLER] Start app: {app_id}')
-        logging.debug(f'[APP HANDLER] {self.running_apps=}')
+        logger.debug('[APP HANDLER] Start app: %s', app_id)
+        logger.debug('[APP HANDLER] self.running_apps=%r', self.running_apps)
         app_config = self._config_loader.configs[app_id]
 
         # Stop/Remove if already present
-        if app_id in self.running_apps:
-            self.running_apps[app_id].stop()
+        previous_app = self._get_running_app(app_id)
+        if previous_app:
+            previous_app.stop(self._get_stop_timeout())
 
         # Create process
         app_process = dmic_app_process_factory(app_id, app_config)
         try:
-            app_process.run(self._config_loader.apps_path)
+            app_process.run(self._config_loader.apps_path, self.exit_watcher, self.output_pump)
         except Exception as e:
-            logging.error(e)
+            logger.error(e)
             return
 
-        app_process.crash_event += self._get_crash_callback_function(app_id)
+        if self.launch_stats:
+            self.launch_stats.record_start(app_id, time.monotonic() - app_process.started_at)
+
+        app_process.crash_event += self._get_crash_callback_function(app_process)
+
+        with self.running_apps_lock:
+            self.running_apps[app_id] = app_process
+        logger.debug('[APP HANDLER] self.running_apps=%r', self.running_apps)
+
+    def dump_running_apps(self) -> dict:
+        """Returns process id, return code and output log of all running apps as json serializable dictionary."""
+
+        with self.running_apps_lock:
+            running_apps = list(self.running_apps.items())
 
-        self.running_apps[app_id] = app_process
-        logging.debug(f'[APP HANDLER] {self.running_apps=}')
+        apps = dict()
+        for app_id, app in running_apps:
+            process = app.sub_process
+            apps[app_id] = {
+                'pid': process.pid if process else None,
+                'should_be_running': app.is_running(),
+                'return_code': process.poll() if process else None,
+                'output_log': app.output.log_path if app.output else None,
+            }
+        return apps
 
     def verify_running(self, app_id):
         """Checks if a application is running."""
 
-        logging.debug(f'[APP HANDLER] Verify running: {app_id=}')
+        logger.debug('[APP HANDLER] Verify running: app_id=%r', app_id)
 
-        app_exists = app_id in self.running_apps
-        logging.debug(f'[APP HANDLER] Verify running: {app_exists=}')
+        app = self._get_running_app(app_id)
+        app_exists = app is not None
+        logger.debug('[APP HANDLER] Verify running: app_exists=%r', app_exists)
         app_process_is_running = False
         window_found = False
         if app_exists:
-            app_process_is_running = self.running_apps[app_id].is_running()
-            logging.debug(f'[APP HANDLER] Verify running: {app_process_is_running=}')
+            app_process_is_running = app.is_running()
+            logger.debug('[APP HANDLER] Verify running: app_process_is_running=%r', app_process_is_running)
             try:
                 window_found = self._get_window_id(app_id) > 0
             except DmicAppNotRunningException:
                 window_found = False
 
-        logging.debug(f'[APP HANDLER] Verify running: {window_found=}')
+        logger.debug('[APP HANDLER] Verify running: window_found=%r', window_found)
 
         app_is_running = app_exists and app_process_is_running and window_found
         return app_is_running
 
+    def wait_until_running(self, app_id, is_cancelled=None, timeout=None) -> bool:
+        """Waits until an app is running or the timeout passed.
+
+        Checks again whenever the app writes to its readiness pipe or
+        the window backend reports mapped windows. Polls with an
+        exponentially growing interval in between, for apps that give
+        no signal and backends that can not watch windows.
+
+        Args:
+          app_id: str
+            The started app to wait for.
+          is_cancelled:
+            Callable returning True when waiting should be aborted,
+            checked at least every READY_POLL_MAX_INTERVAL seconds.
+          timeout: float
+            Seconds to wait at most. Uses the ready timeout of the app
+            when None.
+
+        Returns:
+          Whether the app is running. False when the app exited,
+          the timeout passed or waiting got cancelled.
+        """
+
+        app = self._get_running_app(app_id)
+        if app is None:
+            return False
+
+        if timeout is None:
+            timeout = self._get_ready_timeout(app_id)
+        deadline = time.monotonic() + timeout
+        interval = self.launch_stats.poll_interval(app_id) if self.launch_stats else self.READY_POLL_MIN_INTERVAL
+
+        # Watch before the first check so no mapped window gets missed.
+        self.window_backend.watch_window_events()
+        try:
+            with selectors.DefaultSelector() as selector:
+                if app.ready_fileno() is not None:
+                    selector.register(app.ready_fileno(), selectors.EVENT_READ, 'ready')
+                if self.window_backend.window_events_fileno() is not None:
+                    selector.register(self.window_backend.window_events_fileno(), selectors.EVENT_READ, 'windows')
+
+                while True:
+                    if self.verify_running(app_id):
+                        if self.launch_stats:
+                            self.launch_stats.record_window(app_id, time.monotonic() - app.started_at)
+                        return True
+                    if app.has_exited():
+                        logger.warning('[APP HANDLER] App exited while starting: %s', app_id)
+                        if self.launch_stats:
+                            self.launch_stats.record_failure(app_id)
+                        return False
+                    if is_cancelled and is_cancelled():
+                        return False
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        logger.debug('[APP HANDLER] Not running after %ss: %s', timeout, app_id)
+                        if self.launch_stats:
+                            self.launch_stats.record_failure(app_id)
+                        return False
+
+                    events = selector.select(min(interval, remaining))
+                    if not events:
+                        interval = min(interval * 2, self.READY_POLL_MAX_INTERVAL)
+
+                    for key, _ in events:
+                        if key.data == 'windows':
+                            self.window_backend.read_window_events()
+                        elif app.read_ready():
+                            logger.debug('[APP HANDLER] App notified readiness: %s', app_id)
+                        else:
+                            # The app closed the readiness pipe or exited.
+                            selector.unregister(key.fileobj)
+        finally:
+            self.window_backend.unwatch_window_events()
+
     def focus_app_sync(self, app_id):
         """Focuses application synchronously."""
 
         try:
-            window_term = self.running_apps[app_id].get_window_search_term()
-            sp_check_output(self.CMD_FOCUS_WINDOW_SYNC % window_term)
-        except subprocess.CalledProcessError as e:
-            logging.warning(f'[APP HANDLER] focus app subprocess error: {e}')
+            window_id = self._get_window_id(app_id)
+        except DmicAppNotRunningException:
+            logger.warning('[APP HANDLER] Tried to focus none running app: %s', app_id)
             return False
 
+        focus_start = time.monotonic()
+        if not self.window_backend.activate_window(window_id):
+            logger.warning('[APP HANDLER] Could not focus app window: %s', window_id)
+            self._invalidate_window(app_id)
+            return False
+
+        if self.launch_stats:
+            self.launch_stats.record_focus(app_id, time.monotonic() - focus_start)
         return True
 
     def verify_focus(self, app_id):
         """Checks if application is focused."""
 
         try:
-            focused_window_id = int(sp_check_output(self.CMD_GET_FOCUSED_WINDOW_ID))
-            logging.debug(f'[APP HANDLER] {focused_window_id=}')
+            focused_window_id = self.window_backend.get_active_window()
+            logger.debug('[APP HANDLER] focused_window_id=%r', focused_window_id)
             app_window_id = self._get_window_id(app_id)
-            logging.debug(f'[APP HANDLER] {app_window_id=}')
+            logger.debug('[APP HANDLER] app_window_id=%r', app_window_id)
         except DmicAppNotRunningException:
-            logging.warning(f'[APP HANDLER] Tried to verify focus of none running app: {app_id}')
+            logger.warning('[APP HANDLER] Tried to verify focus of none running app: %s', app_id)
             return False
 
-        return focused_window_id == app_window_id
+        if focused_window_id != app_window_id:
+            # The cached window may be gone, look it up again next time.
+            self._invalidate_window(app_id)
+            return False
+
+        return True
 
     def close_app(self, app_id):
         """Closes an application."""
 
-        logging.debug(f'[APP HANDLER] Close: {app_id}...')
-        if app_id in self.running_apps:
-            self.running_apps[app_id].stop()
-            del self.running_apps[app_id]
-
-        window_search_term = dmic_app_process_factory(app_id, self._config_loader.configs[app_id]).get_window_search_term()
-        try:
-            logging.debug(f'[APP HANDLER] Windowkill: {window_search_term}...')
-            sp_check_output(self.CMD_KILL_WINDOW % window_search_term)
-        except subprocess.CalledProcessError as e:
-            logging.debug(f'[APP HANDLER] close app subprocess error: {e}')
+        logger.debug('[APP HANDLER] Close: %s...', app_id)
+        window_id = 0
+        with self.running_apps_lock:
+            app = self.running_apps.pop(app_id, None)
+        if app:
+            window_id = app.get_cached_window_id()
+            all_exited = app.stop(self._get_stop_timeout())
+            if all_exited:
+                return
+
+        # Kill windows of apps not started by this process manager or
+        # left after stopping their processes.
+        if not window_id:
+            window_id = self.window_backend.find_window(self._get_window_search_term(app_id))
+
+        logger.debug('[APP HANDLER] Windowkill: %s...', window_id)
+        if not window_id or not self.window_backend.kill_window(window_id):
+            logger.debug('[APP HANDLER] close app: no window found for %s', app_id)
 
     def verify_closed(self, app_id):
         """Checks if an application is closed."""
 
-        window_search_term = dmic_app_process_factory(app_id, self._config_loader.configs[app_id]).get_window_search_term()
-        logging.debug(f'[APP HANDLER] Verify closed: {window_search_term=}')
-        found_window = sp_check_output(self.CMD_SEARCH_WINDOW % window_search_term)
-        logging.debug(f'[APP HANDLER] Verify closed: {found_window=} length: {len(found_window)}')
-        return len(found_window) == 0
+        window_search_term = self._get_window_search_term(app_id)
+        logger.debug('[APP HANDLER] Verify closed: window_search_term=%r', window_search_term)
+        found_window = self.window_backend.find_window(window_search_term)
+        logger.debug('[APP HANDLER] Verify closed: found_window=%r', found_window)
+        return found_window == 0
 
     def _get_window_id(self, app_id):
-        """Gets the window id of an application."""
+        """Gets the window id of an application.
 
-        try:
-            window_term = self.running_apps[app_id].get_window_search_term()
-            logging.debug(f'[APP HANDLER] Get Window Id: {window_term=}')
-            window_id = sp_check_output(self.CMD_SEARCH_WINDOW % window_term)
-            logging.debug(f'[APP HANDLER] Get Window Id: {window_id=} {type(window_id)}')
-            window_id = int(window_id)
-        except ValueError as e:
-            logging.debug(f'[APP HANDLER] Get Window Id ValueError: {e}')
+        Returns the cached window id of the app process, searches the
+        window and caches it otherwise.
+        """
+
+        app = self._get_running_app(app_id)
+        if app is None:
+            logger.debug('[APP HANDLER] Get Window Id: not running: %s', app_id)
             raise DmicAppNotRunningException(app_id)
-        except KeyError as e:
-            logging.debug(f'[APP HANDLER] Get Window Id KeyError: {e}')
+
+        window_id = app.get_cached_window_id()
+        if window_id:
+            return window_id
+
+        window_term = self._get_window_search_term(app_id)
+        logger.debug('[APP HANDLER] Get Window Id: window_term=%r', window_term)
+        window_id = self.window_backend.find_window(window_term)
+        logger.debug('[APP HANDLER] Get Window Id: window_id=%r', window_id)
+        if not window_id:
             raise DmicAppNotRunningException(app_id)
 
+        app.cache_window_id(window_id)
         return window_id
 
-    def _get_crash_callback_function(self, app_id):
-        """Returns function that queues a crash notification via the process manager."""
+    def _get_running_app(self, app_id):
+        with self.running_apps_lock:
+            return self.running_apps.get(app_id)
+
+    def _invalidate_window(self, app_id):
+        app = self._get_running_app(app_id)
+        if app:
+            app.invalidate_window()
+
+    def _get_stop_timeout(self):
+        return float(self._config_loader.global_config.get('app_stop_timeout', 3))
+
+    def _get_ready_timeout(self, app_id):
+        if self.launch_stats:
+            return self.launch_stats.ready_timeout(app_id)
+        return float(self._config_loader.global_config.get('app_ready_timeout', 8))
+
+    def _get_window_search_term(self, app_id):
+        """Gets the window search term of an app, computed once per app id."""
+
+        if app_id not in self._window_search_terms:
+            app = self._get_running_app(app_id)
+            if app is None:
+                app = dmic_app_process_factory(app_id, self._config_loader.configs[app_id])
+            self._window_search_terms[app_id] = app.window_search_term
+        return self._window_search_terms[app_id]
+
+    def _get_crash_callback_function(self, app_process):
+        """Returns function that queues a crash notification with the last app output via the process manager."""
 
-        return lambda arg: self.process_manager.queue_crash_notification(app_id)
+        def queue_crash_notification(arg):
+            # Called on the shared exit reaper thread, takes the lines
+            # read until now instead of waiting for the output to close.
+            output_tail = app_process.output.tail() if app_process.output else []
+            self.process_manager.queue_crash_notification(app_process.app_id, output_tail)
 
+        return queue_crash_notification
 
-def sp_check_output(cmd):
-    """Runs given command in a subprocess and returns the output."""
+    @staticmethod
+    def _create_output_pump(global_config):
+        return DmicOutputPump(
+            os.path.join(global_config.get('logs', './logs'), 'apps'),
+            int(global_config.get('app_log_max_bytes', 1048576)),
+            int(global_config.get('app_log_backups', 2)),
+            int(global_config.get('app_output_tail_lines', 50)))
 
-    return subprocess.check_output(cmd, shell=True)
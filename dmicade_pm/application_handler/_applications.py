@@ -1,77 +1,238 @@
 import subprocess
-import threading
 import logging
+import signal
+import time
+import os
 import re
 
 from abc import ABC, abstractmethod
 from ..helper import DmicEvent, DmicException
+from ._exit_watchers import shared_exit_watcher
+
+logger = logging.getLogger(__name__)
 
 
 class DmicApp(ABC):
-    """Abstract class DmicApp for all Dmic-Application types."""
+    """Abstract class DmicApp for all Dmic-Application types.
+
+    Apps get the write end of a readiness pipe, its descriptor number
+    is passed in the environment variable DMIC_READY_FD. Apps may write
+    to it once they are ready to be shown.
+
+    Apps run in their own session, so stopping an app reaches all
+    processes it started, also behind wrapper scripts.
+    """
 
     EXE = 'executable'
     MAME_ROM = 'mame_rom'
     GODOT = 'godot'
     UNITY = 'unity'
 
+    READY_FD_ENV = 'DMIC_READY_FD'
+
+    STOP_TIMEOUT = 3.0
+    KILL_TIMEOUT = 1.0
+    STOP_POLL_INTERVAL = 0.05
+
     def __init__(self, app_id, app_config):
         self.app_id = app_id
         self.app_config = app_config
-        self.crash_event = DmicEvent()
+        self.crash_event = DmicEvent(f'app.crash:{app_id}')
         self.sub_process = None
+        self.output = None
 
-        self._crash_check_thread = None
         self._should_be_running = False
-
-    def run(self, apps_path):
+        self._window_search_term = None
+        self._window_id = 0
+        self._window_pid = None
+        self._ready_fd = None
+        self._return_code = None
+        self.started_at = None
+
+    def run(self, apps_path, exit_watcher=None, output_pump=None):
         """Starts the app.
 
         Starts the app by executing the _start_app function of the
         child.
-        Starts a thread wich checks for crashes.
+        Watches the process for crashes with the given exit watcher.
 
         Args:
           apps_path: string
             Main media directory.
+          exit_watcher:
+            Exit watcher to wait for the process exit with. Uses the
+            shared exit watcher when None.
+          output_pump: DmicOutputPump
+            Pump reading stdout and stderr of the app into its log
+            file. The output is discarded when None.
         """
 
-        logging.debug('[DMICAPP] Run...')
-        self.sub_process = self._start_app(apps_path)
+        logger.debug('[DMICAPP] Run...')
+        self.started_at = time.monotonic()
+        self._ready_fd, ready_write_fd = os.pipe()
+        popen_args = {
+            'start_new_session': True,
+            'stdout': subprocess.PIPE if output_pump else subprocess.DEVNULL,
+            'stderr': subprocess.PIPE if output_pump else subprocess.DEVNULL,
+            'pass_fds': (ready_write_fd,),
+            'env': dict(os.environ, **{self.READY_FD_ENV: str(ready_write_fd)}),
+        }
+        try:
+            self.sub_process = self._start_app(apps_path, popen_args)
+        except Exception:
+            self.close_ready_fd()
+            raise
+        finally:
+            os.close(ready_write_fd)
+        self._should_be_running = True
 
-        self._crash_check_thread = threading.Thread(
-            target=self._wait_for_crash,
-            daemon=True)
-        self._crash_check_thread.name = self.app_id.title().replace('-', '').replace('_', '') + 'CrashCheckThread'
-        self._crash_check_thread.start()
+        if output_pump:
+            self.output = output_pump.pump(self.app_id, self.sub_process)
 
-        self._should_be_running = True
+        if exit_watcher is None:
+            exit_watcher = shared_exit_watcher()
+        exit_watcher.watch(self.sub_process, self._on_exit, self.app_id)
 
-    def _wait_for_crash(self):
-        """Synchronously waits until the suporcess closes.
+    def _on_exit(self, return_code):
+        """Called when the subprocess closed.
 
         Updates crash event when app is supposed to be running.
         """
 
-        self.sub_process.wait()
-
+        self._return_code = return_code
+        self.invalidate_window()
         if self._should_be_running:
-            logging.warning('[DMICAPP] APP CRASH!')
+            logger.warning('[DMICAPP] APP CRASH!')
             self.crash_event.update()
 
-    def stop(self):
+    def stop(self, timeout: float = None) -> bool:
+        """Stops all processes of the app.
+
+        Sends SIGTERM to the process group of the app, sends SIGKILL
+        to the group when processes are left after the timeout.
+
+        Args:
+          timeout: float
+            Seconds to wait after SIGTERM. Uses STOP_TIMEOUT when None.
+
+        Returns:
+          Whether all processes of the app exited.
+        """
+
         self._should_be_running = False
+        self.invalidate_window()
+        self.close_ready_fd()
+
+        if self.sub_process is None:
+            return True
+
+        logger.debug('[DMICAPP] Terminate: %s', self.app_id)
+        self._signal_group(signal.SIGTERM)
+        if self._wait_for_group(self.STOP_TIMEOUT if timeout is None else timeout):
+            return True
+
+        logger.warning('[DMICAPP] %s did not exit after SIGTERM, sending SIGKILL...', self.app_id)
+        self._signal_group(signal.SIGKILL)
+        if self._wait_for_group(self.KILL_TIMEOUT):
+            return True
+
+        logger.error('[DMICAPP] %s did not exit after SIGKILL.', self.app_id)
+        return False
+
+    def _signal_group(self, signal_number):
+        try:
+            os.killpg(self.sub_process.pid, signal_number)
+        except ProcessLookupError:
+            pass
+        except PermissionError as e:
+            # The group id is not ours anymore, only signal the child.
+            logger.warning('[DMICAPP] Could not signal process group of %s: %s', self.app_id, e)
+            if self.sub_process.poll() is None:
+                self.sub_process.send_signal(signal_number)
+
+    def _wait_for_group(self, timeout):
+        """Waits until the app process and all processes of its group exited.
 
-        logging.debug(f'[DMICAPP] Terminate: {self.app_id}')
-        self.sub_process.terminate()
+        Returns:
+          True if no process of the group is left.
+        """
+
+        deadline = time.monotonic() + timeout
+        try:
+            self.sub_process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            return False
+
+        while _process_group_exists(self.sub_process.pid):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.STOP_POLL_INTERVAL)
+        return True
 
     def is_running(self):
         return self._should_be_running
 
+    def has_exited(self):
+        return self._return_code is not None
+
+    def ready_fileno(self):
+        """Returns the read end of the readiness pipe or None when closed."""
+
+        return self._ready_fd
+
+    def read_ready(self) -> bool:
+        """Reads a readiness notification from the readiness pipe.
+
+        Returns:
+          True if the app notified readiness, False if the pipe got
+          closed by the app.
+        """
+
+        try:
+            return len(os.read(self._ready_fd, 64)) > 0
+        except (OSError, TypeError):
+            return False
+
+    def close_ready_fd(self):
+        if self._ready_fd is not None:
+            ready_fd, self._ready_fd = self._ready_fd, None
+            os.close(ready_fd)
+
+    @property
+    def window_search_term(self) -> str:
+        """The window search term, computed on first use."""
+
+        if self._window_search_term is None:
+            self._window_search_term = self.get_window_search_term()
+        return self._window_search_term
+
+    def get_cached_window_id(self) -> int:
+        """Returns the cached window id or 0 when none is cached for the current process."""
+
+        if self.sub_process is None or self._window_pid != self.sub_process.pid:
+            return 0
+        return self._window_id
+
+    def cache_window_id(self, window_id: int):
+        """Caches the resolved window id for the current process."""
+
+        self._window_id = window_id
+        self._window_pid = self.sub_process.pid if self.sub_process else None
+
+    def invalidate_window(self):
+        self._window_id = 0
+        self._window_pid = None
+
     @abstractmethod
-    def _start_app(self, apps_path) -> subprocess.Popen:
+    def _start_app(self, apps_path, popen_args: dict) -> subprocess.Popen:
         """Starts the app in a subprocess.
 
+        Args:
+          apps_path: string
+            Main media directory.
+          popen_args: dict
+            Additional keyword arguments for subprocess.Popen.
+
         Returns:
           The supprocess the app is running in.
         """
@@ -89,16 +250,16 @@ class DmicAppMameRom(DmicApp):
     def get_window_search_term(self):
         return 'MAME'
 
-    def _start_app(self, apps_path):
-        logging.debug('[DMICAPP MAME] Start...')
+    def _start_app(self, apps_path, popen_args):
+        logger.debug('[DMICAPP MAME] Start...')
         if 'command' not in self.app_config:
             raise DmicAppNotConfiguredException(self.app_id)
 
         cmd = self.app_config['command']
         cmd = cmd.replace('%%path%%', apps_path)
-        logging.debug(f'[DMICAPP MAME] Run: {cmd}')
+        logger.debug('[DMICAPP MAME] Run: %s', cmd)
 
-        return subprocess.Popen(cmd.split(), stdout=subprocess.PIPE)
+        return subprocess.Popen(cmd.split(), **popen_args)
 
 
 class DmicAppExecutable(DmicApp):
@@ -112,8 +273,8 @@ class DmicAppExecutable(DmicApp):
         window_search_term = window_search_term.replace('.x86_64', '')
         return window_search_term
 
-    def _start_app(self, apps_path):
-        logging.debug('[DMICAPP EXE] Start...')
+    def _start_app(self, apps_path, popen_args):
+        logger.debug('[DMICAPP EXE] Start...')
         if 'exe' not in self.app_config:
             raise DmicAppNotConfiguredException(self.app_id)
 
@@ -122,7 +283,7 @@ class DmicAppExecutable(DmicApp):
         if '_debug_path' in self.app_config:
             cmd = self.app_config['_debug_path']
 
-        return subprocess.Popen(cmd, stdout=subprocess.PIPE)
+        return subprocess.Popen(cmd, **popen_args)
 
 
 class DmicAppGodot(DmicAppExecutable):
@@ -153,6 +314,37 @@ class DmicAppNotConfiguredException(DmicException):
         self.app_id = app_id
 
 
+def _process_group_exists(pgid):
+    """Checks if a process of the group is still alive.
+
+    Exited processes waiting to be reaped by init do not count.
+    """
+
+    try:
+        pids = [entry for entry in os.listdir('/proc') if entry.isdigit()]
+    except OSError:
+        try:
+            os.killpg(pgid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat', 'rb') as stat_file:
+                stat = stat_file.read()
+        except OSError:
+            continue
+
+        # Fields after the command name: state, ppid, pgrp, ...
+        fields = stat[stat.rfind(b')') + 2:].split()
+        if len(fields) > 2 and int(fields[2]) == pgid and fields[0] not in (b'Z', b'X'):
+            return True
+    return False
+
+
 def dmic_app_process_factory(app_id, app_config) -> DmicApp:
     """Factory for Dmic-Applications."""
 
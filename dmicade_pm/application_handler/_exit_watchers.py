@@ -0,0 +1,171 @@
+import selectors
+import threading
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class DmicThreadExitWatcher:
+    """Waits for app processes to exit on one shared reaper thread.
+
+    Processes are watched through pidfds, which become readable when
+    the process exits. Where pidfds are not available, processes are
+    checked with waitid every FALLBACK_POLL_INTERVAL seconds. The
+    reaper thread is started with the first watched process.
+    """
+
+    FALLBACK_POLL_INTERVAL = 0.5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._polled = dict()  # Only used on the reaper thread.
+        self._thread = None
+        self._selector = None
+        self._wakeup_read_fd = None
+        self._wakeup_write_fd = None
+
+    def watch(self, process, callback, name):
+        """Calls callback with the return code once the process exited.
+
+        Args:
+          process: subprocess.Popen
+            The process to watch.
+          callback:
+            Callable taking the return code of the process. Called on
+            the reaper thread, which is shared by all apps, so it must
+            not block.
+          name: str
+            Name of the watched process used for logging.
+        """
+
+        with self._lock:
+            self._pending.append((process, callback, name))
+            if self._thread is None:
+                self._start_thread()
+
+        os.write(self._wakeup_write_fd, b'w')
+
+    def _start_thread(self):
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_read_fd, self._wakeup_write_fd = os.pipe()
+        os.set_blocking(self._wakeup_read_fd, False)
+        self._selector.register(self._wakeup_read_fd, selectors.EVENT_READ, None)
+
+        self._thread = threading.Thread(target=self._reap, daemon=True)
+        self._thread.name = 'ExitReaperThread'
+        self._thread.start()
+
+    def _reap(self):
+        while True:
+            timeout = self.FALLBACK_POLL_INTERVAL if self._polled else None
+            for key, _ in self._selector.select(timeout):
+                if key.data is None:
+                    self._drain_wakeups()
+                    continue
+
+                self._selector.unregister(key.fd)
+                os.close(key.fd)
+                self._deliver(*key.data)
+
+            self._register_pending()
+            self._check_polled()
+
+    def _drain_wakeups(self):
+        try:
+            while os.read(self._wakeup_read_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _register_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        for process, callback, name in pending:
+            if process.returncode is not None:
+                self._deliver(process, callback, name)
+                continue
+
+            try:
+                pidfd = os.pidfd_open(process.pid)
+            except (AttributeError, OSError) as e:
+                logger.debug('[EXIT WATCHER] No pidfd for %s, polling: %s', name, e)
+                self._polled[process.pid] = (process, callback, name)
+                continue
+
+            self._selector.register(pidfd, selectors.EVENT_READ, (process, callback, name))
+
+    def _check_polled(self):
+        for pid, (process, callback, name) in list(self._polled.items()):
+            if _has_exited(process):
+                del self._polled[pid]
+                self._deliver(process, callback, name)
+
+    def _deliver(self, process, callback, name):
+        """Reaps the exited process and calls its callback with the return code."""
+
+        return_code = process.wait()
+        logger.debug('[EXIT WATCHER] %s exited: %s', name, return_code)
+        try:
+            callback(return_code)
+        except Exception as e:
+            logger.exception('[EXIT WATCHER] Exit callback of %s raised: %s', name, e)
+
+
+class DmicLoopExitWatcher(DmicThreadExitWatcher):
+    """Waits for app processes to exit on an asyncio event loop.
+
+    Uses a pidfd per process, which becomes readable when the process
+    exits. Falls back to the reaper thread where pidfds are not
+    available.
+    """
+
+    def __init__(self, loop):
+        super().__init__()
+        self._loop = loop
+
+    def watch(self, process, callback, name):
+        try:
+            pidfd = os.pidfd_open(process.pid)
+        except (AttributeError, OSError) as e:
+            logger.debug('[EXIT WATCHER] No pidfd for %s, using reaper thread: %s', name, e)
+            super().watch(process, callback, name)
+            return
+
+        self._loop.call_soon_threadsafe(self._loop.add_reader, pidfd, self._on_exit, pidfd, process, callback, name)
+
+    def _on_exit(self, pidfd, process, callback, name):
+        self._loop.remove_reader(pidfd)
+        os.close(pidfd)
+        self._deliver(process, callback, name)
+
+
+_shared_exit_watcher = None
+_shared_exit_watcher_lock = threading.Lock()
+
+
+def shared_exit_watcher() -> DmicThreadExitWatcher:
+    """Returns the exit watcher shared by apps that were not given one."""
+
+    global _shared_exit_watcher
+    with _shared_exit_watcher_lock:
+        if _shared_exit_watcher is None:
+            _shared_exit_watcher = DmicThreadExitWatcher()
+        return _shared_exit_watcher
+
+
+def _has_exited(process) -> bool:
+    """Checks if a process exited without reaping it."""
+
+    if process.returncode is not None:
+        return True
+    if not hasattr(os, 'waitid'):
+        return process.poll() is not None
+
+    try:
+        return os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+    except ChildProcessError:
+        # Already reaped elsewhere.
+        return True
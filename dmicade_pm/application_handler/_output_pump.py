@@ -0,0 +1,184 @@
+import logging.handlers
+import collections
+import selectors
+import threading
+import codecs
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class DmicAppOutput:
+    """Output of an app process, written to a rotating log file.
+
+    Keeps the last lines of stdout and stderr in memory to report
+    them when the app crashes.
+
+    Attributes:
+      app_id : str
+        The app the output belongs to.
+      log_path : str
+        File the output is written to. Rotated to '<log_path>.1' and
+        so on when it gets larger than the given maximum.
+    """
+
+    MAX_LINE_LENGTH = 4096
+
+    def __init__(self, app_id: str, log_path: str, max_bytes: int, backup_count: int, tail_lines: int):
+        self.app_id = app_id
+        self.log_path = log_path
+
+        self._handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self._handler.setFormatter(logging.Formatter('%(asctime)s %(stream)s: %(message)s'))
+        self._tail = collections.deque(maxlen=tail_lines)
+        self._tail_lock = threading.Lock()
+        self._decoders = dict()
+        self._partial_lines = dict()
+
+    def open_stream(self, stream_name: str):
+        self._decoders[stream_name] = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._partial_lines[stream_name] = ''
+
+    def feed(self, stream_name: str, data: bytes):
+        """Writes all complete lines of the given output chunk."""
+
+        text = self._partial_lines[stream_name] + self._decoders[stream_name].decode(data)
+        lines = text.split('\n')
+        partial_line = lines.pop()
+        if len(partial_line) > self.MAX_LINE_LENGTH:
+            lines.append(partial_line)
+            partial_line = ''
+        self._partial_lines[stream_name] = partial_line
+
+        for line in lines:
+            self._write_line(stream_name, line.rstrip('\r'))
+
+    def close_stream(self, stream_name: str):
+        """Writes the remaining output of a stream that reached its end."""
+
+        rest = self._partial_lines.pop(stream_name) + self._decoders.pop(stream_name).decode(b'', final=True)
+        if rest:
+            self._write_line(stream_name, rest)
+
+        if not self._decoders:
+            self._handler.close()
+
+    def tail(self) -> list:
+        """Returns the last output lines read so far."""
+
+        with self._tail_lock:
+            return list(self._tail)
+
+    def _write_line(self, stream_name, line):
+        with self._tail_lock:
+            self._tail.append(line if stream_name == 'stdout' else f'[{stream_name}] {line}')
+        self._handler.handle(logging.makeLogRecord({'msg': line, 'stream': stream_name, 'levelno': logging.INFO}))
+
+
+class DmicOutputPump:
+    """Reads stdout and stderr of all app processes on one thread.
+
+    Apps block when their output pipe is full, so their output gets
+    read continuously and written to a rotating log file per app in
+    the given folder. The pump thread is started with the first app.
+    """
+
+    READ_SIZE = 65536
+
+    def __init__(self, log_folder: str, max_bytes: int = 1048576, backup_count: int = 2, tail_lines: int = 50):
+        self.log_folder = log_folder
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.tail_lines = tail_lines
+
+        self._lock = threading.Lock()
+        self._pending = []
+        self._thread = None
+        self._selector = None
+        self._wakeup_read_fd = None
+        self._wakeup_write_fd = None
+
+    def pump(self, app_id: str, process) -> DmicAppOutput:
+        """Starts reading the output pipes of the process.
+
+        Args:
+          app_id: str
+            The app the process belongs to, names the log file.
+          process: subprocess.Popen
+            Process started with stdout and/or stderr set to PIPE.
+
+        Returns:
+          The DmicAppOutput the output gets written to.
+        """
+
+        os.makedirs(self.log_folder, exist_ok=True)
+        output = DmicAppOutput(
+            app_id,
+            os.path.join(self.log_folder, f'{app_id}.log'),
+            self.max_bytes,
+            self.backup_count,
+            self.tail_lines)
+
+        streams = [(name, stream) for name, stream in (('stdout', process.stdout), ('stderr', process.stderr)) if stream]
+        for name, stream in streams:
+            output.open_stream(name)
+            os.set_blocking(stream.fileno(), False)
+
+        with self._lock:
+            self._pending.extend((output, name, stream) for name, stream in streams)
+            if self._thread is None:
+                self._start_thread()
+
+        os.write(self._wakeup_write_fd, b'p')
+        return output
+
+    def _start_thread(self):
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_read_fd, self._wakeup_write_fd = os.pipe()
+        os.set_blocking(self._wakeup_read_fd, False)
+        self._selector.register(self._wakeup_read_fd, selectors.EVENT_READ, None)
+
+        self._thread = threading.Thread(target=self._pump, daemon=True)
+        self._thread.name = 'OutputPumpThread'
+        self._thread.start()
+
+    def _pump(self):
+        while True:
+            for key, _ in self._selector.select():
+                if key.data is None:
+                    self._drain_wakeups()
+                    continue
+
+                output, name = key.data
+                self._read(key.fileobj, output, name)
+
+            with self._lock:
+                pending, self._pending = self._pending, []
+            for output, name, stream in pending:
+                self._selector.register(stream, selectors.EVENT_READ, (output, name))
+
+    def _read(self, stream, output, name):
+        try:
+            data = os.read(stream.fileno(), self.READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logger.debug('[OUTPUT PUMP] Read error of %s %s: %s', output.app_id, name, e)
+            data = b''
+
+        if data:
+            output.feed(name, data)
+            return
+
+        self._selector.unregister(stream)
+        stream.close()
+        output.close_stream(name)
+
+    def _drain_wakeups(self):
+        try:
+            while os.read(self._wakeup_read_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
@@ -0,0 +1,402 @@
+import subprocess
+import threading
+import logging
+import time
+import os
+import re
+
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+
+class DmicWindowBackend(ABC):
+    """Abstract window backend for finding, focusing and closing app windows.
+
+    Search terms are regular expressions matched case insensitive
+    against the name and class of visible windows, like
+    'xdotool search --onlyvisible' does.
+    """
+
+    NAME = None
+
+    @abstractmethod
+    def find_window(self, search_term: str) -> int:
+        """Returns the id of the first visible window matching the search term or 0."""
+        pass
+
+    @abstractmethod
+    def get_active_window(self) -> int:
+        """Returns the id of the focused window or 0."""
+        pass
+
+    @abstractmethod
+    def activate_window(self, window_id: int) -> bool:
+        """Focuses the window and waits until it is active.
+
+        Returns:
+          Whether the window got activated.
+        """
+        pass
+
+    @abstractmethod
+    def kill_window(self, window_id: int) -> bool:
+        """Kills the client of the window.
+
+        Returns:
+          Whether the window existed.
+        """
+        pass
+
+    def watch_window_events(self):
+        """Starts receiving window events, until 'unwatch_window_events' is called."""
+        pass
+
+    def unwatch_window_events(self):
+        """Stops receiving window events and drops the ones not read."""
+        pass
+
+    def window_events_fileno(self):
+        """Returns a descriptor that becomes readable when windows get mapped.
+
+        Only becomes readable while window events are watched.
+
+        Returns:
+          The descriptor or None when the backend can not watch
+          windows, then windows have to be polled.
+        """
+
+        return None
+
+    def read_window_events(self) -> bool:
+        """Reads pending window events.
+
+        Returns:
+          Whether a window got mapped or the managed windows changed.
+        """
+
+        return True
+
+    def close(self):
+        pass
+
+
+class DmicXdotoolWindowBackend(DmicWindowBackend):
+    """Window backend running xdotool for every query.
+
+    Runs xdotool directly instead of through a shell, used when no
+    persistent X connection is available.
+    """
+
+    NAME = 'xdotool'
+
+    CMD_GET_FOCUSED_WINDOW_ID   = ['xdotool', 'getactivewindow']
+    CMD_SEARCH_WINDOW           = ['xdotool', 'search', '--onlyvisible', '--limit', '1']
+    CMD_FOCUS_WINDOW_SYNC       = ['xdotool', 'windowactivate', '--sync']
+    CMD_KILL_WINDOW             = ['xdotool', 'windowkill']
+
+    def find_window(self, search_term):
+        return self._first_window_id(self._run(self.CMD_SEARCH_WINDOW + [search_term]))
+
+    def get_active_window(self):
+        return self._first_window_id(self._run(self.CMD_GET_FOCUSED_WINDOW_ID))
+
+    def activate_window(self, window_id):
+        return self._run(self.CMD_FOCUS_WINDOW_SYNC + [str(window_id)]) is not None
+
+    def kill_window(self, window_id):
+        return self._run(self.CMD_KILL_WINDOW + [str(window_id)]) is not None
+
+    @staticmethod
+    def _first_window_id(output):
+        if not output:
+            return 0
+        try:
+            return int(output.split()[0])
+        except (ValueError, IndexError):
+            return 0
+
+    @staticmethod
+    def _run(cmd):
+        """Runs xdotool and returns its output or None when it failed."""
+
+        try:
+            return subprocess.check_output(cmd, stderr=subprocess.DEVNULL)
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.debug('[WINDOW BACKEND] xdotool error: %s', e)
+            return None
+
+
+class DmicXlibWindowBackend(DmicWindowBackend):
+    """Window backend keeping one persistent X connection via python-xlib.
+
+    Queries read the window manager's client list on the open
+    connection instead of starting a process per query.
+
+    Raises:
+      ImportError: If python-xlib is not installed.
+    """
+
+    NAME = 'xlib'
+
+    ACTIVATE_TIMEOUT = 2.0
+    ACTIVATE_POLL_INTERVAL = 0.01
+
+    def __init__(self):
+        from Xlib import X, display, error, protocol
+        self._X = X
+        self._error = error
+        self._protocol = protocol
+
+        self._lock = threading.RLock()
+        self._display = display.Display()
+        self._root = self._display.screen().root
+        self._net_active_window = self._display.intern_atom('_NET_ACTIVE_WINDOW')
+        self._net_client_list = self._display.intern_atom('_NET_CLIENT_LIST')
+        self._net_wm_name = self._display.intern_atom('_NET_WM_NAME')
+        self._utf8_string = self._display.intern_atom('UTF8_STRING')
+
+        # Events are received on a separate connection so queries do
+        # not have to skip them. They are only selected while watched,
+        # nothing reads them otherwise.
+        self._event_display = display.Display()
+        self._event_root = self._event_display.screen().root
+
+    def find_window(self, search_term):
+        with self._lock:
+            window = self._find(re.compile(search_term, re.IGNORECASE))
+            return window.id if window else 0
+
+    def get_active_window(self):
+        with self._lock:
+            prop = self._root.get_full_property(self._net_active_window, self._X.AnyPropertyType)
+            return int(prop.value[0]) if prop and len(prop.value) else 0
+
+    def activate_window(self, window_id):
+        with self._lock:
+            window = self._display.create_resource_object('window', window_id)
+
+            # Ask the window manager like 'xdotool windowactivate' does.
+            event = self._protocol.event.ClientMessage(
+                window=window,
+                client_type=self._net_active_window,
+                data=(32, [2, self._X.CurrentTime, 0, 0, 0]))
+            mask = self._X.SubstructureRedirectMask | self._X.SubstructureNotifyMask
+            try:
+                self._root.send_event(event, event_mask=mask)
+                self._display.sync()
+            except self._error.XError as e:
+                logger.debug('[WINDOW BACKEND] Activate window %s failed: %s', window_id, e)
+                return False
+
+        deadline = time.monotonic() + self.ACTIVATE_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.get_active_window() == window_id:
+                return True
+            time.sleep(self.ACTIVATE_POLL_INTERVAL)
+
+        logger.warning('[WINDOW BACKEND] Window %s not active after %ss', window_id, self.ACTIVATE_TIMEOUT)
+        return False
+
+    def kill_window(self, window_id):
+        with self._lock:
+            window = self._display.create_resource_object('window', window_id)
+            try:
+                window.kill_client()
+                self._display.sync()
+            except self._error.XError as e:
+                logger.debug('[WINDOW BACKEND] Kill window %s failed: %s', window_id, e)
+                return False
+            return True
+
+    def watch_window_events(self):
+        with self._lock:
+            self._event_root.change_attributes(event_mask=self._X.SubstructureNotifyMask | self._X.PropertyChangeMask)
+            self._event_display.flush()
+
+    def unwatch_window_events(self):
+        with self._lock:
+            self._event_root.change_attributes(event_mask=self._X.NoEventMask)
+            # Events sent before the mask got cleared are still read.
+            self._event_display.sync()
+            self.read_window_events()
+
+    def window_events_fileno(self):
+        return self._event_display.fileno()
+
+    def read_window_events(self):
+        windows_changed = False
+        with self._lock:
+            while self._event_display.pending_events():
+                event = self._event_display.next_event()
+                if event.type == self._X.MapNotify:
+                    windows_changed = True
+                elif event.type == self._X.PropertyNotify and event.atom == self._net_client_list:
+                    windows_changed = True
+        return windows_changed
+
+    def close(self):
+        with self._lock:
+            self._event_display.close()
+            self._display.close()
+
+    def _find(self, pattern):
+        """Returns the first viewable window matching the pattern.
+
+        Only checks the clients listed by the window manager in
+        _NET_CLIENT_LIST. Walks the whole window tree if the window
+        manager does not publish the list.
+        """
+
+        client_ids = self._client_list()
+        if client_ids is None:
+            return self._find_in_tree(pattern)
+
+        for window_id in client_ids:
+            window = self._display.create_resource_object('window', window_id)
+            try:
+                if self._matches(window, pattern):
+                    return window
+            except self._error.XError:
+                # Window got destroyed while searching.
+                continue
+        return None
+
+    def _client_list(self):
+        """Returns the window ids in _NET_CLIENT_LIST or None if not set."""
+
+        try:
+            prop = self._root.get_full_property(self._net_client_list, self._X.AnyPropertyType)
+        except self._error.XError:
+            return None
+        return [int(window_id) for window_id in prop.value] if prop else None
+
+    def _find_in_tree(self, pattern):
+        """Returns the first viewable window in the tree matching the pattern."""
+
+        pending = [self._root]
+        while pending:
+            window = pending.pop(0)
+            try:
+                if window != self._root and self._matches(window, pattern):
+                    return window
+                pending.extend(window.query_tree().children)
+            except self._error.XError:
+                # Window got destroyed while searching.
+                continue
+        return None
+
+    def _matches(self, window, pattern):
+        if window.get_attributes().map_state != self._X.IsViewable:
+            return False
+
+        names = []
+        net_wm_name = window.get_full_property(self._net_wm_name, self._utf8_string)
+        if net_wm_name:
+            names.append(net_wm_name.value.decode('utf-8', 'replace'))
+        wm_name = window.get_wm_name()
+        if wm_name:
+            names.append(wm_name if isinstance(wm_name, str) else wm_name.decode('latin-1'))
+        wm_class = window.get_wm_class()
+        if wm_class:
+            names.extend(wm_class)
+
+        return any(pattern.search(name) for name in names)
+
+
+class DmicFakeWindowBackend(DmicWindowBackend):
+    """In-memory window backend for tests and replays.
+
+    Attributes:
+      windows : dict
+        Names of open windows with their window ids as keys.
+      active_window : int
+        Id of the focused window, 0 when none.
+
+    Opening a window makes the window events descriptor readable.
+    """
+
+    NAME = 'fake'
+
+    def __init__(self):
+        self.windows = dict()
+        self.active_window = 0
+        self._next_window_id = 1
+        self._event_read_fd, self._event_write_fd = os.pipe()
+        os.set_blocking(self._event_read_fd, False)
+
+    def open_window(self, name: str) -> int:
+        """Opens a window with the given name and returns its id."""
+
+        window_id = self._next_window_id
+        self._next_window_id += 1
+        self.windows[window_id] = name
+        os.write(self._event_write_fd, b'm')
+        return window_id
+
+    def find_window(self, search_term):
+        pattern = re.compile(search_term, re.IGNORECASE)
+        for window_id, name in self.windows.items():
+            if pattern.search(name):
+                return window_id
+        return 0
+
+    def get_active_window(self):
+        return self.active_window
+
+    def activate_window(self, window_id):
+        if window_id not in self.windows:
+            return False
+
+        self.active_window = window_id
+        return True
+
+    def kill_window(self, window_id):
+        if window_id not in self.windows:
+            return False
+
+        del self.windows[window_id]
+        if self.active_window == window_id:
+            self.active_window = 0
+        return True
+
+    def window_events_fileno(self):
+        return self._event_read_fd
+
+    def read_window_events(self):
+        try:
+            return len(os.read(self._event_read_fd, 4096)) > 0
+        except BlockingIOError:
+            return False
+
+    def unwatch_window_events(self):
+        self.read_window_events()
+
+    def close(self):
+        os.close(self._event_read_fd)
+        os.close(self._event_write_fd)
+
+
+WINDOW_BACKENDS = {backend.NAME: backend for backend in (DmicXdotoolWindowBackend, DmicXlibWindowBackend, DmicFakeWindowBackend)}
+
+
+def create_window_backend(name='auto') -> DmicWindowBackend:
+    """Creates the window backend with the given name.
+
+    'auto' uses a persistent X connection when python-xlib is
+    installed and a display is available, xdotool otherwise.
+
+    Raises:
+      ValueError: If no backend with the given name exists.
+    """
+
+    if name == 'auto':
+        try:
+            return DmicXlibWindowBackend()
+        except Exception as e:
+            logger.info('[WINDOW BACKEND] No persistent X connection, using xdotool: %s', e)
+            return DmicXdotoolWindowBackend()
+
+    if name not in WINDOW_BACKENDS:
+        raise ValueError(f'Invalid window backend: {name} (options: auto, {", ".join(WINDOW_BACKENDS)})')
+    return WINDOW_BACKENDS[name]()
@@ -3,6 +3,8 @@ import re
 
 from .serial_connection import DmicSerialConnector
 
+logger = logging.getLogger(__name__)
+
 
 class DmicButtonController():
 
@@ -19,18 +21,18 @@ class DmicButtonController():
 
         # Special cases
         if 'RAINBOW' in color_data:
-            logging.info(f"[BUTTON CONTROLLER] Apply Colors: rainbow")
+            logger.info('[BUTTON CONTROLLER] Apply Colors: rainbow')
             str_data = 'rainbow;'
-            logging.debug(f"[BUTTON CONTROLLER] Send color data: '{str_data}'")
+            logger.debug("[BUTTON CONTROLLER] Send color data: '%s'", str_data)
             self.serial_connector.write_data(str_data)
             return
 
         # Convert, order and send data.
         self._update_color_data(color_data)
-        logging.info(f"[BUTTON CONTROLLER] Apply Colors: {self.current_colors}")
+        logger.info('[BUTTON CONTROLLER] Apply Colors: %s', self.current_colors)
 
         str_data = self.system_btn_leds_state + ';'.join(self.order_color_data(self.current_colors)) + ';'
-        logging.debug(f"[BUTTON CONTROLLER] Send color data: '{str_data}'")
+        logger.debug("[BUTTON CONTROLLER] Send color data: '%s'", str_data)
         self.serial_connector.write_data(str_data)
 
     def queue_menu_button_state(self, is_on:bool):
@@ -80,14 +82,14 @@ class DmicButtonController():
                     continue
 
                 if not re.match('^P[12][A-F]$', key):
-                    logging.warning(f'[BUTTON CONTROLLER] ApplyColorData: "{key}" does not match button descriptor pattern ( ^P[12][A-F]$ ). Color ingnored.')
+                    logger.warning('[BUTTON CONTROLLER] ApplyColorData: "%s" does not match button descriptor pattern ( ^P[12][A-F]$ ). Color ingnored.', key)
                     continue
 
                 pos = 6 * (int(key[1]) - 1) + 'ABCDEF'.index(key[2])
 
                 value = self.get_hex_str(data[key])
                 if not value:
-                    logging.warning(f'[BUTTON CONTROLLER] ApplyColorData: "{key} : {data[key]}" is not a valid hex color value. Color ingnored.')
+                    logger.warning('[BUTTON CONTROLLER] ApplyColorData: "%s : %s" is not a valid hex color value. Color ingnored.', key, data[key])
                     continue
 
                 color_data[pos] = value
@@ -103,7 +105,7 @@ class DmicButtonController():
             for i in range(len(data[:12])):
                 hex_value = self.get_hex_str(data[i])
                 if not hex_value:
-                    logging.warning(f'[BUTTON CONTROLLER] ApplyColorData: Could not convert "{data[i]}" to hex value.') 
+                    logger.warning('[BUTTON CONTROLLER] ApplyColorData: Could not convert "%s" to hex value.', data[i]) 
                     continue
 
                 color_data[i] = hex_value
@@ -4,6 +4,9 @@ import os
 
 from ..processmanager import DmicProcessManager
 from ..tasks import DmicTask, DmicTaskType
+from ..jobs import DmicJob
+
+logger = logging.getLogger(__name__)
 
 
 _PM = None
@@ -24,43 +27,98 @@ def c_change_state(state: DmicTask):
     _PM.queue_state_task(change_state_task)
 
 
-def c_start_game(app_id: str):
+def c_start_game(app_id: str, job: DmicJob = None):
+    """Starts a game and waits until it is running, retries a few times."""
+
     START_TRIES = 3
     RETRY_START_APP_DELAY = 1
-    RETRY_VERIFIY_DELAY = 2 # Not lower then 2 for Godot games to be started-verified...
 
-    logging.debug(f'[COMMAND: StartGame] Execute: {app_id=}')
+    logger.debug('[COMMAND: StartGame] Execute: app_id=%r', app_id)
     is_running = False
 
     if not _PM.verify_closed(app_id):
-        logging.debug('[COMMAND: StartGame] Game already running... Closing game...')
+        logger.debug('[COMMAND: StartGame] Game already running... Closing game...')
         _PM.close_app(app_id)
 
     for retry in range(START_TRIES):
-        logging.debug(f'[COMMAND: StartGame] {retry=}')
+        if _is_cancelled(job):
+            break
 
-        _PM.close_app(app_id)
+        logger.debug('[COMMAND: StartGame] retry=%r', retry)
+        if job:
+            job.report_progress({'app_id': app_id, 'try': retry + 1, 'tries': START_TRIES})
 
-        _PM.start_app(app_id)
-        is_running = _PM.verify_running(app_id)
+        # Clean up the failed previous try.
+        if retry > 0:
+            _PM.close_app(app_id)
 
-        if not is_running:
-            logging.debug(f'[COMMAND: StartGame] Verifiy: {is_running=}; Wait {RETRY_VERIFIY_DELAY}s and retry verify...')
-            time.sleep(RETRY_VERIFIY_DELAY)
-            is_running = _PM.verify_running(app_id)
+        _PM.start_app(app_id)
+        is_running = _PM.wait_until_running(app_id, job.is_cancelled if job else None)
 
-        logging.debug(f'[COMMAND: StartGame] {is_running=}')
+        logger.debug('[COMMAND: StartGame] is_running=%r', is_running)
 
         if is_running:
             break
 
-        time.sleep(RETRY_START_APP_DELAY)
+        if _wait_or_cancel(job, RETRY_START_APP_DELAY):
+            break
+
+    # Do not leave a half started app behind when cancelled.
+    if _is_cancelled(job):
+        logger.info('[COMMAND: StartGame] Cancelled start of: %s', app_id)
+        _PM.close_app(app_id)
+        is_running = False
 
     return is_running
 
 
+def c_run_job(name: str, target, *args) -> DmicJob:
+    """Runs a command as cancellable job owned by the state machine.
+
+    The job target gets called with the given args and the job as
+    keyword argument 'job'. Its result gets queued as JOB_DONE task.
+
+    Returns:
+      The queued job, to match its JOB_DONE result against.
+    """
+
+    logger.debug('[COMMAND: RunJob] Execute: name=%r', name)
+    job = DmicJob(name, target, *args)
+    _PM.queue_state_task(DmicTask(DmicTaskType.RUN_JOB, job))
+    return job
+
+
+def c_cancel_job(name: str):
+    logger.debug('[COMMAND: CancelJob] Execute: name=%r', name)
+    _PM.queue_state_task(DmicTask(DmicTaskType.CANCEL_JOB, name))
+
+
+def c_wait(seconds: float, job: DmicJob = None):
+    """Waits the given seconds. Returns False when cancelled early."""
+
+    return not _wait_or_cancel(job, seconds)
+
+
+def _is_cancelled(job: DmicJob):
+    return job is not None and job.is_cancelled()
+
+
+def _wait_or_cancel(job: DmicJob, seconds: float):
+    """Sleeps the given seconds, aborts early when the job gets cancelled.
+
+    Returns:
+      True if the job got cancelled.
+    """
+
+    if job is None:
+        time.sleep(seconds)
+        return False
+
+    return job.wait(seconds)
+
+
 def c_set_active_app(app_id: str):
-    logging.debug(f'[COMMAND: SetActiveApp] Execute: {app_id=}')
+    logger.debug('[COMMAND: SetActiveApp] Execute: app_id=%r', app_id)
     _PM.queue_state_task(DmicTask(DmicTaskType.SET_ACTIVE_APP, app_id))
 
 
@@ -68,7 +126,7 @@ def c_focus_app(app_id: str):
     FOCUS_REPS = 3
     FOCUS_REP_DELAY = 0.1
 
-    logging.debug(f'[COMMAND: FocusApp] Execute: {app_id=}')
+    logger.debug('[COMMAND: FocusApp] Execute: app_id=%r', app_id)
     _PM.focus_app(app_id)
     app_is_focused = False
 
@@ -77,14 +135,14 @@ def c_focus_app(app_id: str):
         if app_is_focused:
             break
 
-        logging.debug(f'[COMMAND: FocusApp] app {app_id} not focused. Try: {rep+1}')
+        logger.debug('[COMMAND: FocusApp] app %s not focused. Try: %s', app_id, rep+1)
         time.sleep(FOCUS_REP_DELAY)
 
     return app_is_focused
 
 
 def c_close_game(app_id: str):
-    logging.debug(f'[COMMAND: CloseGame] Execute: {app_id=}')
+    logger.debug('[COMMAND: CloseGame] Execute: app_id=%r', app_id)
     app_id = app_id
 
     _PM.close_app(app_id)
@@ -93,9 +151,9 @@ def c_close_game(app_id: str):
     return is_closed
 
 
-def c_send_to_ui(msg: str):
-    logging.debug(f'[COMMAND: SendToUI] Execute: {msg=}')
-    bytes_sent = _PM.send_to_ui(msg)
+def c_send_to_ui(msg: str, track_ack=False):
+    logger.debug('[COMMAND: SendToUI] Execute: msg=%r', msg)
+    bytes_sent = _PM.send_to_ui(msg, track_ack)
 
     send_success = bytes_sent and bytes_sent > 0
 
@@ -111,17 +169,17 @@ def c_set_interaction_feedback(is_on: bool):
 
 
 def c_set_timer(seconds: int):
-    logging.debug(f'[COMMAND: SetTimer] Execute: {seconds=}')
+    logger.debug('[COMMAND: SetTimer] Execute: seconds=%r', seconds)
     _PM.set_timer(seconds)
 
 
 def c_set_timer_game():
-    logging.debug(f'[COMMAND: SetTimerGame] Execute.')
+    logger.debug('[COMMAND: SetTimerGame] Execute.')
     c_set_timer(int(_PM.config_loader.global_config['game_timeout']))
 
 
 def c_set_timer_menu():
-    logging.debug(f'[COMMAND: SetTimerMenu] Execute.')
+    logger.debug('[COMMAND: SetTimerMenu] Execute.')
     c_set_timer(int(_PM.config_loader.global_config['menu_timeout']))
 
 
@@ -130,10 +188,14 @@ def c_stop_timer():
 
 
 def c_set_volume(to: str):
+    """Sets the volume to 'min', 'max' or a percentage."""
+
     if to == 'min':
         _PM.set_volume(int(_PM.config_loader.global_config['volume_perc_low']))
     elif to == 'max':
         _PM.set_volume(int(_PM.config_loader.global_config['volume_perc_high']))
+    else:
+        _PM.set_volume(int(to))
 
 
 def c_enter_sleep():
@@ -151,7 +213,7 @@ def c_get_color_config(app_id):
 
 
 def c_change_button_colors(color_data):
-    logging.debug(f'[COMMAND: ChangeButtonColors] {color_data}')
+    logger.debug('[COMMAND: ChangeButtonColors] %s', color_data)
     _PM.set_button_colors(color_data)
 
 
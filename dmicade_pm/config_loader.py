@@ -3,6 +3,8 @@ import json
 import logging
 import re
 
+logger = logging.getLogger(__name__)
+
 DEFAULT_CONFIG_FILE_NAME = 'default_pm_config.json'
 
 CONFIG_REQUIREMENTS = {
@@ -24,7 +26,7 @@ class DmicConfigLoader:
         self.global_config = self._load_global_config(cl_args)
         self.apps_path = os.path.expanduser(self.global_config['apps_location'])
         self.configs = self._load_app_configs()
-        logging.info(f'[CONFIG LOADER] Registered apps: {list(self.configs.keys())}')
+        logger.info('[CONFIG LOADER] Registered apps: %s', list(self.configs.keys()))
 
     def _load_global_config(self, user_args: dict):
         """Loads the global process manager config.
@@ -46,17 +48,18 @@ class DmicConfigLoader:
         default_config_path = re.sub(r'[^/]+$', DEFAULT_CONFIG_FILE_NAME, __file__)
         if os.name == 'nt':
             default_config_path = re.sub(r'[^/\\]+$', DEFAULT_CONFIG_FILE_NAME, __file__)
-        logging.debug(f'[CONFIG LOADER] {default_config_path=}')
+        logger.debug('[CONFIG LOADER] default_config_path=%r', default_config_path)
 
         try:
             with open(default_config_path) as json_file:
                 default_pm_config = json.load(json_file)
                 pm_config = default_pm_config
         except:
-            logging.warning(f'[CONFIG LOADER] Could not load default config: {default_config_path}')
+            logger.warning('[CONFIG LOADER] Could not load default config: %s', default_config_path)
 
         pm_config.update(user_args)
-        logging.debug(f'[CONFIG LOADER] PM Config: {json.dumps(pm_config, indent=4)}')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('[CONFIG LOADER] PM Config: %s', json.dumps(pm_config, indent=4))
 
         return pm_config
 
@@ -70,25 +73,26 @@ class DmicConfigLoader:
 
         # Load directories
         apps_dir = os.listdir(self.apps_path)
-        logging.debug(f'[CONFIG LOADER] {apps_dir=}')
+        logger.debug('[CONFIG LOADER] apps_dir=%r', apps_dir)
         
         for app in apps_dir:
 
             app_config_path = os.path.join(self.apps_path, app, 'config.json')
-            logging.debug(f'[CONFIG LOADER] {app_config_path=}')
+            logger.debug('[CONFIG LOADER] app_config_path=%r', app_config_path)
 
             try:
                 with open(app_config_path) as json_file:
                     app_config = json.load(json_file)
-                    logging.debug(f'[CONFIG LOADER] {app} config: {json.dumps(app_config, indent=4)}')
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug('[CONFIG LOADER] %s config: %s', app, json.dumps(app_config, indent=4))
 
             except FileNotFoundError as e:
-                logging.warning(f'[CONFIG LOADER] Could not find config.json file for: {app}')
+                logger.warning('[CONFIG LOADER] Could not find config.json file for: %s', app)
                 continue
         
             config_is_valid = self.validate_app_config(app_config)
             if not config_is_valid:
-                logging.warning(f'[CONFIG LOADER] Config for "{app}" is invalid.')
+                logger.warning('[CONFIG LOADER] Config for "%s" is invalid.', app)
                 continue
 
             configs[app] = app_config
@@ -110,12 +114,12 @@ class DmicConfigLoader:
                 req_props = ['type','command']
             else:
                 config_type = config['type']
-                logging.warning(f'[CONFIG LOADER] Unknown application type "{config_type}"...')
+                logger.warning('[CONFIG LOADER] Unknown application type "%s"...', config_type)
                 return False
 
             for prop in req_props:
                 if prop not in config:
-                    logging.warning(f'[CONFIG LOADER] Property "{prop}" missing in app config...')
+                    logger.warning('[CONFIG LOADER] Property "%s" missing in app config...', prop)
                     return False
 
             # Make sure apps ID will not close UI.
@@ -127,7 +131,7 @@ class DmicConfigLoader:
                     ui_intersect_match = re.search(term, 'DMI-CADE-UI.x86_64')
                     print(ui_intersect_match)
                     if ui_intersect_match:
-                        logging.warning(f'[CONFIG LOADER] Apps file name intersects with UI name ("DMI-CADE-UI.x86_64"): {ui_intersect_match}')
+                        logger.warning('[CONFIG LOADER] Apps file name intersects with UI name ("DMI-CADE-UI.x86_64"): %s', ui_intersect_match)
                         return False
                 else:
                     return False
@@ -0,0 +1,72 @@
+import datetime
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class DmicFlightRecorder:
+    """Fixed size ring buffer recording DmicEvent firings.
+
+    Keeps the last 'size' firings with event name, firing thread,
+    timestamp and the duration of every subscriber. All slots are
+    allocated up front, recording only overwrites one with an entry
+    tuple. Events fire on many threads, so slots get claimed under a
+    lock.
+    """
+
+    FILE_NAME_FORMAT = 'DMIC-PM-FLIGHT-%s.log'
+    DATE_FORMAT = r'%Y%m%d-%H%M%S'
+
+    def __init__(self, size: int, log_folder='./logs'):
+        self.size = size
+        self._slots = [None] * size
+        self._recorded = 0
+        self._lock = threading.Lock()
+        self._dump_lock = threading.Lock()
+
+        file_name = self.FILE_NAME_FORMAT % datetime.datetime.now().strftime(self.DATE_FORMAT)
+        self.dump_file = os.path.join(log_folder, file_name)
+
+    def record(self, name: str, timestamp: float, durations: tuple):
+        """Records an event firing.
+
+        Args:
+          name: Name of the fired event.
+          timestamp: Time the event fired at (seconds since epoch).
+          durations: Seconds every subscriber took, in call order.
+        """
+
+        entry = (timestamp, name, threading.current_thread().name, durations)
+        with self._lock:
+            self._slots[self._recorded % self.size] = entry
+            self._recorded += 1
+
+    def entries(self):
+        """Returns the recorded firings from oldest to newest."""
+
+        with self._lock:
+            count = self._recorded
+            slots = list(self._slots)
+
+        first = max(0, count - self.size)
+        return [slots[i % self.size] for i in range(first, count)]
+
+    def dump(self, reason: str):
+        """Appends all recorded firings to the dump file."""
+
+        logger.info('[FLIGHT RECORDER] Dump (%s) to: %s', reason, self.dump_file)
+
+        lines = [f'=== {datetime.datetime.now().isoformat()} - {reason} ===']
+        for timestamp, name, thread_name, durations in self.entries():
+            time_str = datetime.datetime.fromtimestamp(timestamp).strftime('%H:%M:%S.%f')
+            durations_str = ', '.join(f'{d * 1000:.3f}' for d in durations)
+            lines.append(f'{time_str} ({thread_name:<24.24}) {name:<28} subscribers(ms): [{durations_str}]')
+
+        with self._dump_lock:
+            try:
+                with open(self.dump_file, 'a') as dump_file:
+                    dump_file.write('\n'.join(lines) + '\n\n')
+            except OSError as e:
+                logger.error('[FLIGHT RECORDER] Could not write dump: %s', e)
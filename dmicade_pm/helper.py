@@ -1,4 +1,5 @@
 import re
+import time
 
 
 def parse_command_line_arguments(cl_args):
@@ -47,9 +48,20 @@ class DmicException(Exception):
 
 
 class DmicEvent:
-    """Simple subscribable event class for dmic events."""
+    """Simple subscribable event class for dmic events.
+
+    Attributes:
+      flight_recorder : DmicFlightRecorder
+        Shared recorder for all event firings. Recording is disabled
+        when None.
+      name : str
+        Name of the event used for recording.
+    """
+
+    flight_recorder = None
 
-    def __init__(self):
+    def __init__(self, name='event'):
+        self.name = name
         self._subs = []
 
     def __iadd__(self, sub):
@@ -61,8 +73,24 @@ class DmicEvent:
     def update(self, event_args=None):
         """Calls all subscribers."""
 
+        recorder = DmicEvent.flight_recorder
+        if recorder is None:
+            for sub in self._subs:
+                sub(event_args)
+            return
+
+        timestamp = time.time()
+        durations = []
         for sub in self._subs:
+            sub_start = time.perf_counter()
             sub(event_args)
+            durations.append(time.perf_counter() - sub_start)
+        recorder.record(self.name, timestamp, tuple(durations))
+
+    def __str__(self):
+        """Lists the subscriber names, only built when a log record gets formatted."""
+
+        return str([getattr(sub, '__name__', repr(sub)) for sub in self._subs])
 
 
 class ObjectPool:
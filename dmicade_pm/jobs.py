@@ -0,0 +1,133 @@
+import threading
+import logging
+import time
+
+from .helper import DmicEvent
+
+logger = logging.getLogger(__name__)
+
+
+class DmicJob:
+    """Long running command executed on its own thread.
+
+    Jobs are owned by the state machine, which starts and cancels them
+    and turns their progress and completion into tasks. The job target
+    gets called with the job as keyword argument 'job' and is expected
+    to poll 'is_cancelled' or wait through 'wait' so a cancellation
+    takes effect immediately.
+
+    Attributes:
+      name : str
+        Name of the job. Only one job per name is run at a time.
+      args : tuple
+        Arguments the job target gets called with.
+      progress_event : DmicEvent
+        Updated with a DmicJobProgress when the target reports progress.
+      done_event : DmicEvent
+        Updated with a DmicJobResult when the target returned.
+      started_at : float
+        Monotonic time the job was started at.
+      finished_at : float
+        Monotonic time the job target returned at.
+    """
+
+    def __init__(self, name, target, *args):
+        self.name = name
+        self.progress_event = DmicEvent(f'job.progress:{name}')
+        self.done_event = DmicEvent(f'job.done:{name}')
+        self.started_at = None
+        self.finished_at = None
+
+        self.args = args
+
+        self._target = target
+        self._cancel_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Runs the job target on a new thread."""
+
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.name = self.name.title().replace('_', '') + 'JobThread'
+        self._thread.start()
+
+    def cancel(self):
+        """Requests the job to stop as soon as possible."""
+
+        logger.debug('[JOB] Cancel: %s', self.name)
+        self._cancel_event.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait(self, seconds) -> bool:
+        """Waits the given seconds or until the job gets cancelled.
+
+        Returns:
+          True if the job got cancelled.
+        """
+
+        return self._cancel_event.wait(seconds)
+
+    def duration(self) -> float:
+        """Returns the seconds the job ran or is running for."""
+
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def report_progress(self, data):
+        """Publishes progress data of the running job."""
+
+        self.progress_event.update(DmicJobProgress(self, data))
+
+    def _run(self):
+        logger.debug('[JOB] Start: %s', self.name)
+        result = None
+
+        try:
+            result = self._target(*self.args, job=self)
+        except Exception as e:
+            logger.exception('[JOB] %s raised: %s', self.name, e)
+
+        self.finished_at = time.monotonic()
+        logger.debug('[JOB] Done: %s, result=%r, cancelled=%s', self.name, result, self.is_cancelled())
+        self.done_event.update(DmicJobResult(self, result, self.is_cancelled()))
+
+
+class DmicJobProgress:
+    """Progress report of a running DmicJob.
+
+    Attributes:
+      job: The reporting DmicJob.
+      name: The name of the job.
+      data: The reported progress data.
+    """
+
+    def __init__(self, job: DmicJob, data):
+        self.job = job
+        self.name = job.name
+        self.data = data
+
+
+class DmicJobResult:
+    """Outcome of a finished DmicJob.
+
+    Attributes:
+      job: The finished DmicJob.
+      name: The name of the job.
+      args: The arguments the job target was called with.
+      result: The return value of the job target.
+      cancelled: Whether the job was cancelled before it finished.
+    """
+
+    def __init__(self, job: DmicJob, result, cancelled: bool):
+        self.job = job
+        self.name = job.name
+        self.args = job.args
+        self.result = result
+        self.cancelled = cancelled
@@ -0,0 +1,203 @@
+import statistics
+import threading
+import logging
+import json
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class DmicLaunchStats:
+    """Persistent per app launch statistics.
+
+    Keeps the last MAX_SAMPLES durations per app for the time until
+    the process got started, the time until the app window was found
+    and the time focusing took, together with start and failure
+    counts. Statistics are written to a json file after every change
+    and loaded again on start.
+
+    The ready timeout and poll interval for waiting on an app are
+    derived from the times until its window was found. Failed starts
+    are not samples, instead the ready timeout backs off from the
+    default ready timeout towards the maximum after them until the
+    app starts again.
+
+    Attributes:
+      path : str
+        File the statistics are stored in.
+      default_ready_timeout : float
+        Ready timeout for apps without enough samples.
+      max_ready_timeout : float
+        Upper limit for derived ready timeouts.
+    """
+
+    FORMAT_VERSION = 1
+    MAX_SAMPLES = 20
+    MIN_SAMPLES = 3
+    METRICS = ('process_start', 'window', 'focus')
+
+    READY_TIMEOUT_FACTOR = 1.5
+    READY_TIMEOUT_MARGIN = 1.0
+    MIN_READY_TIMEOUT = 2.0
+    FAILURE_BACKOFF_FACTOR = 2
+    MIN_POLL_INTERVAL = 0.05
+    MAX_POLL_INTERVAL = 0.8
+
+    def __init__(self, path: str, default_ready_timeout: float = 8, max_ready_timeout: float = 20):
+        self.path = path
+        self.default_ready_timeout = default_ready_timeout
+        self.max_ready_timeout = max(max_ready_timeout, default_ready_timeout)
+
+        self._lock = threading.Lock()
+        self._apps = self._load()
+
+    def record_start(self, app_id: str, process_start_seconds: float):
+        """Records a started app process and the seconds starting it took."""
+
+        with self._lock:
+            app = self._app(app_id)
+            app['starts'] += 1
+            self._add_sample(app, 'process_start', process_start_seconds)
+            self._save()
+
+    def record_window(self, app_id: str, seconds: float):
+        """Records the seconds from starting the app until its window was found."""
+
+        with self._lock:
+            app = self._app(app_id)
+            app['recent_failures'] = 0
+            self._add_sample(app, 'window', seconds)
+            self._save()
+
+    def record_failure(self, app_id: str):
+        """Records a start where the app window was not found in time or the app exited."""
+
+        with self._lock:
+            app = self._app(app_id)
+            app['failures'] += 1
+            app['recent_failures'] += 1
+            self._save()
+
+    def record_focus(self, app_id: str, seconds: float):
+        with self._lock:
+            self._add_sample(self._app(app_id), 'focus', seconds)
+            self._save()
+
+    def ready_timeout(self, app_id: str) -> float:
+        """Returns the seconds to wait for the app window after starting the app.
+
+        Allows the slowest recorded start plus a margin, the default
+        ready timeout until MIN_SAMPLES starts were recorded. Every
+        failed start since the last successful one multiplies the
+        timeout by FAILURE_BACKOFF_FACTOR, starting from at least the
+        default ready timeout.
+        """
+
+        with self._lock:
+            samples = self._samples(app_id, 'window')
+            if len(samples) < self.MIN_SAMPLES:
+                timeout = self.default_ready_timeout
+            else:
+                timeout = max(samples) * self.READY_TIMEOUT_FACTOR + self.READY_TIMEOUT_MARGIN
+
+            recent_failures = self._recent_failures(app_id)
+            if recent_failures:
+                timeout = max(timeout, self.default_ready_timeout) * self.FAILURE_BACKOFF_FACTOR ** (recent_failures - 1)
+
+            return min(max(timeout, self.MIN_READY_TIMEOUT), self.max_ready_timeout)
+
+    def poll_interval(self, app_id: str) -> float:
+        """Returns the first interval to check for the app window with.
+
+        Apps that take long to show their window are checked less
+        often in the beginning. Apps that failed to start since their
+        last successful start are checked as often as possible.
+        """
+
+        with self._lock:
+            samples = self._samples(app_id, 'window')
+            if len(samples) < self.MIN_SAMPLES or self._recent_failures(app_id):
+                return self.MIN_POLL_INTERVAL
+
+            return min(max(min(samples) / 4, self.MIN_POLL_INTERVAL), self.MAX_POLL_INTERVAL)
+
+    def dump_stats(self) -> dict:
+        """Returns counters, duration summaries and launch policy per app as json serializable dictionary."""
+
+        with self._lock:
+            app_ids = sorted(self._apps.keys())
+
+        return {app_id: self._summarize(app_id) for app_id in app_ids}
+
+    def _summarize(self, app_id):
+        with self._lock:
+            app = self._apps[app_id]
+            summary = {
+                'starts': app['starts'],
+                'failures': app['failures'],
+                'recent_failures': app['recent_failures'],
+            }
+            for metric in self.METRICS:
+                samples = app[metric]
+                summary[metric] = {
+                    'count': len(samples),
+                    'median_s': round(statistics.median(samples), 3) if samples else None,
+                    'max_s': round(max(samples), 3) if samples else None,
+                }
+
+        summary['ready_timeout_s'] = round(self.ready_timeout(app_id), 3)
+        summary['poll_interval_s'] = round(self.poll_interval(app_id), 3)
+        return summary
+
+    def _app(self, app_id):
+        if app_id not in self._apps:
+            self._apps[app_id] = self._app_defaults()
+        return self._apps[app_id]
+
+    def _samples(self, app_id, metric):
+        app = self._apps.get(app_id)
+        return app[metric] if app else []
+
+    def _recent_failures(self, app_id):
+        app = self._apps.get(app_id)
+        return app['recent_failures'] if app else 0
+
+    def _add_sample(self, app, metric, seconds):
+        samples = app[metric]
+        samples.append(round(seconds, 3))
+        del samples[:-self.MAX_SAMPLES]
+
+    def _load(self):
+        try:
+            with open(self.path) as stats_file:
+                stored = json.load(stats_file)
+        except FileNotFoundError:
+            return dict()
+        except (OSError, ValueError) as e:
+            logger.warning('[LAUNCH STATS] Could not load %s: %s', self.path, e)
+            return dict()
+
+        if stored.get('version') != self.FORMAT_VERSION:
+            logger.warning('[LAUNCH STATS] Ignoring stats with unknown version: %s', stored.get('version'))
+            return dict()
+
+        apps = dict()
+        for app_id, stored_app in stored.get('apps', {}).items():
+            app = self._app_defaults()
+            app.update({key: stored_app[key] for key in app if key in stored_app})
+            apps[app_id] = app
+        return apps
+
+    def _app_defaults(self):
+        return {'starts': 0, 'failures': 0, 'recent_failures': 0, **{metric: [] for metric in self.METRICS}}
+
+    def _save(self):
+        """Writes all stats to a temporary file and replaces the stats file with it."""
+
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'w') as stats_file:
+                json.dump({'version': self.FORMAT_VERSION, 'apps': self._apps}, stats_file, separators=(',', ':'))
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning('[LAUNCH STATS] Could not save %s: %s', self.path, e)
@@ -3,9 +3,12 @@ import sys
 import os
 import datetime
 import re
+import threading
 
 from .helper import ccolors
 
+logger = logging.getLogger(__name__)
+
 
 class DmicLogging():
 
@@ -16,8 +19,13 @@ class DmicLogging():
     MINIMUM_EXISTING_LOGS = 5 # Starts deleting when more logs exist.
     FORMAT = '%(asctime)s - (%(threadName)-12.12s) %(levelname)-7.7s: %(filename)-25s: %(message)s'
 
+    ROOT_LOGGER_NAME = 'dmicade_pm'
+
     def __init__(self, user_args):
         self.current_log_file = '' 
+        self._file_handler = None
+        self._level_overrides = dict() # logger name -> [previous level, level, revert timer]
+        self._level_lock = threading.Lock()
         self._no_file_log = 'nofilelog' in user_args
 
         self.log_folder = './logs'
@@ -64,12 +72,82 @@ class DmicLogging():
         self.current_log_file = self.FILE_NAME_FORMAT % current_datetime_suffix
 
         log_file_path = os.path.join(self.log_folder, self.current_log_file)
-        logging.info(f'[LOGGING MANAGER]: log to: {log_file_path}')
+        logger.info('[LOGGING MANAGER]: log to: %s', log_file_path)
 
         file_handler = logging.FileHandler(log_file_path)
         file_handler.setFormatter(log_formatter)
         file_handler.setLevel(logging.INFO)
         root_logger.addHandler(file_handler)
+        self._file_handler = file_handler
+
+    def set_level(self, subsystem: str, level_name: str, duration=None):
+        """Changes the log level of a subsystem at runtime.
+
+        Subsystems are the loggers of the package modules, names get
+        prefixed with 'dmicade_pm' (e.g. 'statemachine' or 'uds_server').
+        An empty subsystem or 'all' targets the whole package. Messages
+        down to the given level also get written to the log file.
+
+        Args:
+          subsystem: str
+            Name of the subsystem logger.
+          level_name: str
+            Name of the new log level (e.g. 'DEBUG').
+          duration: float
+            Seconds after which the previous level gets restored. The
+            level is kept when None.
+
+        Raises:
+          ValueError: If the log level is invalid.
+        """
+
+        level = getattr(logging, level_name.upper(), None)
+        if not isinstance(level, int):
+            raise ValueError('Invalid log level: %s' % level_name)
+
+        logger_name = self.ROOT_LOGGER_NAME
+        if subsystem and subsystem != 'all':
+            logger_name = subsystem if subsystem.startswith(self.ROOT_LOGGER_NAME) else f'{self.ROOT_LOGGER_NAME}.{subsystem}'
+        subsystem_logger = logging.getLogger(logger_name)
+
+        with self._level_lock:
+            override = self._level_overrides.get(logger_name)
+            if override:
+                if override[2]:
+                    override[2].cancel()
+            else:
+                override = self._level_overrides[logger_name] = [subsystem_logger.level, level, None]
+
+            override[1] = level
+            if duration:
+                override[2] = threading.Timer(duration, self._restore_level, (logger_name, override))
+                override[2].daemon = True
+                override[2].name = 'LogLevelTimer'
+                override[2].start()
+            else:
+                override[2] = None
+
+            subsystem_logger.setLevel(level)
+            self._update_file_handler_level()
+
+        logger.info('[LOGGING MANAGER]: Set %s to %s%s', logger_name, logging.getLevelName(level), f' for {duration}s' if duration else '')
+
+    def _restore_level(self, logger_name, override):
+        with self._level_lock:
+            if self._level_overrides.get(logger_name) is not override:
+                return
+
+            del self._level_overrides[logger_name]
+            logging.getLogger(logger_name).setLevel(override[0])
+            self._update_file_handler_level()
+
+        logger.info('[LOGGING MANAGER]: Restored level of %s to %s', logger_name, logging.getLevelName(override[0]))
+
+    def _update_file_handler_level(self):
+        """Lets the file handler pass the lowest overridden level, INFO at most."""
+
+        if self._file_handler:
+            self._file_handler.setLevel(min([logging.INFO] + [o[1] for o in self._level_overrides.values()]))
 
     def delete_old_logs(self):
         existing_logs_amount = len(list(filter(lambda x: x[:4] == self.FILE_NAME_FORMAT[:4], os.listdir(self.log_folder))))
@@ -88,7 +166,7 @@ class DmicLogging():
             if delete_threshold > log_datetime:
                 log_path = os.path.join(self.log_folder, file_name)
                 os.remove(log_path)
-                logging.info(f'[LOGGING MANAGER]: Deleted old log: {log_path}')
+                logger.info('[LOGGING MANAGER]: Deleted old log: %s', log_path)
             
 
 class DmicConsoleFormatter(logging.Formatter):
@@ -1,48 +1,174 @@
 import logging
 import re
 
-from .helper import DmicEvent 
+from collections import Counter
+from .helper import DmicEvent
 from .uds_server import UdsServer
 from .tasks import *
 
+logger = logging.getLogger(__name__)
+
+
+def _ignore_data(data_match):
+    return None
+
+
+def _to_color_data(data_match):
+    """Converts '<field>=<color>,...' to button color data.
+
+    Fields without a value (like 'RAINBOW') are set to True, values
+    '0' and '1' are converted to int for on/off LEDs.
+    """
+
+    color_data = dict()
+    for field in data_match.group(0).split(','):
+        key, separator, value = field.partition('=')
+        if not separator:
+            color_data[key] = True
+        else:
+            color_data[key] = int(value) if value in ('0', '1') else value
+    return color_data
+
+
+def _to_log_level_args(data_match):
+    duration = data_match.group('duration')
+    return data_match.group('subsystem'), data_match.group('level'), float(duration) if duration else None
+
 
 class DmicMessageParser:
     """Message parser for dmic process manager.
 
     Parses messages from the UdsServer to tasks for the dmic
     state machine.
-    
+
+    Messages have the format '<type>[:<data>]'. Message types are
+    looked up in a registry, their data is validated against the
+    precompiled pattern of the type and converted. Several messages
+    received at once can be separated by newlines. Messages with an
+    unknown type or invalid data are rejected and counted.
+
+    'start_app' and 'close_app' accept trailing data after the
+    matched part, like the original prefix matching parser did, so
+    messages of existing clients keep working. 'close_app' always
+    closes the active app, its data is ignored.
+
     Attributes:
       received_task_event : DmicEvent
         Event updated when a configured message is received by the
         uds server.
+      log_level_event : DmicEvent
+        Event updated with a tuple (subsystem, level, duration) when a
+        'log_level:<subsystem>=<level>[,<seconds>]' message is received.
+      parsed_counts : Counter
+        Parsed messages by type.
+      rejected_counts : Counter
+        Rejected messages by reason ('unknown_type', 'invalid_data').
     """
 
+    MESSAGE_SEPARATOR = re.compile(r'[\r\n]+')
+    TYPE_SEPARATOR = ':'
+
     def __init__(self, uds_server: UdsServer):
-        self.received_task_event = DmicEvent()
+        self.received_task_event = DmicEvent('parser.received_task')
+        self.log_level_event = DmicEvent('parser.log_level')
+        self.parsed_counts = Counter()
+        self.rejected_counts = Counter()
+
+        self._registry = dict()
+        self._register_messages()
 
         uds_server.received_event += self.parse_uds_message
 
+    def _register_messages(self):
+        self.register_task('start_app', DmicTaskType.START_APP, r'[^:\s]+', allow_trailing=True)
+        self.register_task('close_app', DmicTaskType.CLOSE_APP, r'', _ignore_data, allow_trailing=True)
+        self.register_task('volume', DmicTaskType.SET_VOLUME, r'min|max|100|\d{1,2}')
+        self.register_task('led', DmicTaskType.SET_BUTTON_COLORS, r'\w+(=\w*)?(,\w+(=\w*)?)*', _to_color_data)
+        self.register(
+            'log_level',
+            self.log_level_event.update,
+            r'(?P<subsystem>[\w.]*)=(?P<level>[a-zA-Z]+)(,(?P<duration>\d+(\.\d+)?))?',
+            _to_log_level_args)
+
+    def register(self, msg_type: str, handler, data_pattern: str = None, convert=None, allow_trailing=False):
+        """Registers a message type.
+
+        Args:
+          msg_type: str
+            The type of the message, the part before the first ':'.
+          handler:
+            Called with the converted message data.
+          data_pattern: str
+            Regular expression the whole data has to match. Data is
+            not validated when None.
+          convert:
+            Called with the data match object, returns the data passed
+            to the handler. Passes the matched string when None.
+          allow_trailing: bool
+            Only the start of the data has to match the pattern, the
+            rest is ignored.
+        """
+
+        compiled_pattern = re.compile(data_pattern if data_pattern is not None else r'.*', re.DOTALL)
+        self._registry[msg_type] = (compiled_pattern, convert, handler, allow_trailing)
+
+    def register_task(self, msg_type: str, task_type: DmicTaskType, data_pattern: str = None, convert=None, allow_trailing=False):
+        """Registers a message type queued as task of the given type."""
+
+        self.register(
+            msg_type,
+            lambda data: self.received_task_event.update(DmicTask(task_type, data)),
+            data_pattern,
+            convert,
+            allow_trailing)
+
+    def message_types(self):
+        return list(self._registry.keys())
+
+    def dump_stats(self) -> dict:
+        """Returns parsed and rejected message counters as json serializable dictionary."""
+
+        return {
+            'parsed': dict(self.parsed_counts),
+            'rejected': dict(self.rejected_counts),
+        }
+
     def parse_uds_message(self, message):
         """Parses msgs received from the uds server into dmic tasks.
-        
+
         When a matching massage is received it updates the
         received_task_event with the new task as a payload.
 
         Args:
           message:
-            The message to parse.
+            The message to parse, may contain several messages
+            separated by newlines.
         """
 
-        logging.debug(f'[MSG PARSER] {message=}')
+        logger.debug('[MSG PARSER] message=%r', message)
+
+        for single_message in self.MESSAGE_SEPARATOR.split(message):
+            single_message = single_message.strip()
+            if single_message:
+                self._parse_single_message(single_message)
+
+    def _parse_single_message(self, message):
+        msg_type, _, msg_data = message.partition(self.TYPE_SEPARATOR)
+
+        registered = self._registry.get(msg_type)
+        if registered is None:
+            self._reject(message, 'unknown_type')
+            return
 
-        msg_parts = re.match(r'(?P<msg_type>[^\:\s]+)\:?(?P<data>[^\:\s]*)', message)
-        if not msg_parts:
+        data_pattern, convert, handler, allow_trailing = registered
+        data_match = data_pattern.match(msg_data) if allow_trailing else data_pattern.fullmatch(msg_data)
+        if data_match is None:
+            self._reject(message, 'invalid_data')
             return
 
-        msg_type = msg_parts.group('msg_type')
-        msg_data = msg_parts.group('data')
+        self.parsed_counts[msg_type] += 1
+        handler(convert(data_match) if convert else data_match.group(0))
 
-        if msg_type == 'start_app':
-            task = DmicTask(DmicTaskType.START_APP, msg_data)
-            self.received_task_event.update(task)
+    def _reject(self, message, reason):
+        self.rejected_counts[reason] += 1
+        logger.debug('[MSG PARSER] Rejected (%s): %r', reason, message)
@@ -0,0 +1,91 @@
+import threading
+import bisect
+
+from collections import deque
+
+
+class DmicLatencyHistogram:
+    """Latency histogram with fixed buckets and a rolling sample window.
+
+    Bucket counts, count, mean and max cover all recorded samples.
+    Percentiles get calculated from the last WINDOW_SIZE samples so they
+    follow the current behaviour of the cabinet.
+    """
+
+    BUCKET_BOUNDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30) # Seconds.
+    WINDOW_SIZE = 256
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._buckets = [0] * (len(self.BUCKET_BOUNDS) + 1)
+        self._window = deque(maxlen=self.WINDOW_SIZE)
+
+    def add(self, seconds: float):
+        """Records a latency sample in seconds."""
+
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self._buckets[bisect.bisect_left(self.BUCKET_BOUNDS, seconds)] += 1
+        self._window.append(seconds)
+
+    def percentile(self, perc: float) -> float:
+        """Returns the given percentile (0-100) of the rolling window."""
+
+        if not self._window:
+            return 0.0
+
+        samples = sorted(self._window)
+        index = min(len(samples) - 1, int(len(samples) * perc / 100))
+        return samples[index]
+
+    def to_dict(self) -> dict:
+        """Returns the histogram as json serializable dictionary in ms."""
+
+        buckets = dict()
+        for bound, bucket_count in zip(self.BUCKET_BOUNDS, self._buckets):
+            buckets[f'<={bound * 1000:g}ms'] = bucket_count
+        buckets[f'>{self.BUCKET_BOUNDS[-1] * 1000:g}ms'] = self._buckets[-1]
+
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            'max_ms': round(self.max * 1000, 3),
+            'p50_ms': round(self.percentile(50) * 1000, 3),
+            'p95_ms': round(self.percentile(95) * 1000, 3),
+            'p99_ms': round(self.percentile(99) * 1000, 3),
+            'buckets': buckets,
+        }
+
+
+class DmicMetrics:
+    """Thread safe registry of named latency histograms.
+
+    Names are grouped by a prefix, e.g. 'task_wait:START_APP'.
+    """
+
+    def __init__(self):
+        self._histograms = dict()
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        """Adds a latency sample to the histogram with the given name."""
+
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = DmicLatencyHistogram()
+            histogram.add(seconds)
+
+    def dump(self) -> dict:
+        """Returns all histograms as json serializable dictionary."""
+
+        with self._lock:
+            return {name: self._histograms[name].to_dict() for name in sorted(self._histograms)}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
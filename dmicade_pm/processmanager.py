@@ -1,26 +1,33 @@
+import logging
+
+from .helper import DmicEvent
 from .tasks import DmicTask, DmicTaskType
-from .application_handler import DmicApplicationHandler
-from .timer import DmicTimer, SleepManager
+from .application_handler import DmicApplicationHandler, create_window_backend
 from .input_listener import KeyboardListener
-from .sound_manager import VolumeController
 from .button_controller import DmicButtonController
-from .serial_connection import DmicSerialConnector
+
+logger = logging.getLogger(__name__)
 
 
 class DmicProcessManager:
     """Facade for controlling process manager components."""
 
-    def __init__(self, client, uds_server, config_loader):
+    def __init__(self, client, uds_server, config_loader, runtime, status_block=None, launch_stats=None):
         self._client = client
         self.config_loader = config_loader
-        self._app_handler = DmicApplicationHandler(self, config_loader)
+        self._app_handler = DmicApplicationHandler(
+            self,
+            config_loader,
+            runtime.create_exit_watcher(),
+            create_window_backend(config_loader.global_config.get('window_backend', 'auto')),
+            launch_stats)
         self._uds_server = uds_server
-        self._timeout_timer = DmicTimer()
-        self._dyn_volume_timer = DmicTimer()
-        self._sleep_manager = SleepManager(config_loader.global_config)
+        self._timeout_timer = runtime.create_timer('timeout_timer')
+        self._dyn_volume_timer = runtime.create_timer('volume_timer')
+        self._sleep_manager = runtime.create_sleep_manager(config_loader.global_config)
         self._key_listener = KeyboardListener(config_loader.global_config)
-        self._volume_controller = VolumeController()
-        self._serial_connector = DmicSerialConnector(port=config_loader.global_config['serial_port'])
+        self._volume_controller = runtime.create_volume_controller()
+        self._serial_connector = runtime.create_serial_connector(config_loader.global_config['serial_port'])
         self._button_controller = DmicButtonController(config_loader.global_config, self._serial_connector)
 
         self._interaction_feedback_active = False
@@ -37,15 +44,44 @@ class DmicProcessManager:
         self._key_listener.keyboard_triggered_event += self._interaction_feedback_callback
 
         self._key_listener.menu_button_triggered_event += self._menu_button_callback
+
+        if status_block:
+            self._timeout_timer.changed_event += status_block.set_timeout_remaining
+            self._sleep_manager.entered_sleeptime_event += lambda x: status_block.update(sleep_time=True)
+            self._sleep_manager.exit_sleeptime_event += lambda x: status_block.update(sleep_time=False)
         self._key_listener.start()
 
-    def send_to_ui(self, msg: str):
-        self._uds_server.send(msg)
+    def send_to_ui(self, msg: str, track_ack=False):
+        self._uds_server.send(msg, track_ack=track_ack)
+
+    def dump_status(self) -> dict:
+        """Returns timer and app states as json serializable dictionary."""
+
+        timeout_remaining = self._timeout_timer.remaining()
+        return {
+            'timeout_remaining': round(timeout_remaining, 1) if timeout_remaining is not None else None,
+            'sleep_time': self._sleep_manager.is_sleep_time(),
+            'running_apps': self._app_handler.dump_running_apps(),
+        }
+
+    def dump_apps(self) -> dict:
+        """Returns configured and running apps as json serializable dictionary."""
+
+        return {
+            'configured': sorted(self.config_loader.configs.keys()),
+            'running': self._app_handler.dump_running_apps(),
+        }
 
     def queue_state_task(self, task: DmicTask):
         self._client.queue_state_task(task)
 
-    def queue_crash_notification(self, app_id):
+    def queue_crash_notification(self, app_id, output_tail=None):
+        if output_tail:
+            logger.warning('[PM] %s crashed, last output:\n%s', app_id, '\n'.join(output_tail))
+
+        if DmicEvent.flight_recorder:
+            DmicEvent.flight_recorder.dump(f'App crashed: {app_id}')
+
         app_crashed_notification_task = DmicTask(DmicTaskType.APP_CRASHED, app_id)
         self.queue_state_task(app_crashed_notification_task)
 
@@ -55,6 +91,9 @@ class DmicProcessManager:
     def verify_running(self, app_id):
         return self._app_handler.verify_running(app_id)
 
+    def wait_until_running(self, app_id, is_cancelled=None):
+        return self._app_handler.wait_until_running(app_id, is_cancelled)
+
     def focus_app(self, app_id):
         self._app_handler.focus_app_sync(app_id)
 
@@ -0,0 +1,338 @@
+import gzip
+import json
+import logging
+import threading
+import time
+
+from collections import deque, defaultdict
+from .tasks import DmicTask, DmicTaskType
+from .jobs import DmicJob
+from .metrics import DmicMetrics
+
+logger = logging.getLogger(__name__)
+
+
+RECORD_FORMAT_VERSION = 1
+
+"""Task types queued by states and the state machine itself. They get
+recreated while replaying and are not fed in from the recording."""
+INTERNAL_TASK_TYPES = {
+    DmicTaskType.CHANGE_STATE,
+    DmicTaskType.SET_ACTIVE_APP,
+    DmicTaskType.RUN_JOB,
+    DmicTaskType.CANCEL_JOB,
+    DmicTaskType.JOB_PROGRESS,
+    DmicTaskType.JOB_DONE,
+}
+
+
+def _open_record_file(path, mode):
+    """Opens a record file, gzip compressed if the path ends with '.gz'."""
+
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't')
+    return open(path, mode)
+
+
+def _to_json_value(value):
+    """Converts values that are not json serializable to strings."""
+
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_to_json_value(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _to_json_value(v) for k, v in value.items()}
+    return str(value)
+
+
+class DmicTaskRecorder:
+    """Records queued tasks and process manager command calls.
+
+    Writes one compact json object per line. The first line is a
+    header containing the global and app configs. Following lines are
+    either tasks ('k': 'task') or command calls ('k': 'cmd') with
+    their time in seconds since the start of the recording.
+    """
+
+    def __init__(self, path, global_config: dict, app_configs: dict):
+        self._file = _open_record_file(path, 'w')
+        self._lock = threading.Lock()
+        self._start_time = time.monotonic()
+
+        self._write({
+            'k': 'header',
+            'version': RECORD_FORMAT_VERSION,
+            'config': global_config,
+            'apps': app_configs,
+        })
+        logger.info('[RECORDER] Recording tasks to: %s', path)
+
+    def record_task(self, task: DmicTask):
+        self._write({
+            'k': 'task',
+            't': round(time.monotonic() - self._start_time, 6),
+            'type': task.type.name,
+            'data': _to_json_value(task.data),
+        })
+
+    def record_command(self, name: str, args: tuple, result):
+        self._write({
+            'k': 'cmd',
+            't': round(time.monotonic() - self._start_time, 6),
+            'name': name,
+            'args': _to_json_value(args),
+            'ret': _to_json_value(result),
+        })
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def _write(self, entry: dict):
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line)
+                self._file.flush()
+
+
+class DmicRecordingProcessManager:
+    """Process manager proxy recording every command call.
+
+    Wraps the DmicProcessManager handed to the commands. Attribute
+    access is passed through, method calls are passed through and
+    recorded together with their return value.
+    """
+
+    NOT_RECORDED = {'queue_state_task', 'queue_crash_notification'} # Recorded as tasks.
+
+    def __init__(self, process_manager, recorder: DmicTaskRecorder):
+        self._process_manager = process_manager
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        attribute = getattr(self._process_manager, name)
+        if not callable(attribute) or name in self.NOT_RECORDED:
+            return attribute
+
+        def recorded_call(*args):
+            result = attribute(*args)
+            self._recorder.record_command(name, args, result)
+            return result
+
+        return recorded_call
+
+
+class DmicVirtualClock:
+    """Virtual clock for replaying recordings faster than real time.
+
+    When installed, 'time.sleep', 'time.time', 'time.monotonic' and
+    DmicJob.wait are replaced. Sleeping advances the virtual time
+    instantly instead of blocking.
+    """
+
+    def __init__(self):
+        self._now = 0.0
+        self._lock = threading.Lock()
+        self._originals = None
+
+    def now(self) -> float:
+        with self._lock:
+            return self._now
+
+    def sleep(self, seconds):
+        with self._lock:
+            self._now += max(0.0, seconds)
+
+    def advance_to(self, point_in_time: float):
+        with self._lock:
+            self._now = max(self._now, point_in_time)
+
+    def install(self):
+        clock = self
+        self._originals = (time.sleep, time.time, time.monotonic, DmicJob.wait)
+
+        def job_wait(job, seconds):
+            if not job.is_cancelled():
+                clock.sleep(seconds)
+            return job.is_cancelled()
+
+        time.sleep = self.sleep
+        time.time = self.now
+        time.monotonic = self.now
+        DmicJob.wait = job_wait
+
+    def uninstall(self):
+        if self._originals:
+            time.sleep, time.time, time.monotonic, DmicJob.wait = self._originals
+            self._originals = None
+
+
+class DmicFakeConfigLoader:
+    """Config loader stand-in serving the configs of a recording."""
+
+    def __init__(self, global_config: dict, app_configs: dict):
+        self.global_config = global_config
+        self.configs = app_configs
+        self.apps_path = global_config.get('apps_location', '')
+
+
+class DmicFakeProcessManager:
+    """Process manager stand-in for replays.
+
+    Answers command calls with the return values from the recording,
+    in recorded order per command. Commands without a recorded return
+    value return True for verifications and waits and None otherwise.
+
+    Attributes:
+      calls : list
+        Names of all command calls in call order.
+    """
+
+    def __init__(self, config_loader: DmicFakeConfigLoader, recorded_returns: dict):
+        self.config_loader = config_loader
+        self.calls = []
+        self._state_machine = None
+        self._recorded_returns = recorded_returns
+        self._lock = threading.Lock()
+
+    def set_state_machine(self, state_machine):
+        self._state_machine = state_machine
+
+    def queue_state_task(self, task: DmicTask):
+        self._state_machine.queue_task_for_state(task)
+
+    def queue_crash_notification(self, app_id, output_tail=None):
+        self.queue_state_task(DmicTask(DmicTaskType.APP_CRASHED, app_id))
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def fake_call(*args):
+            with self._lock:
+                self.calls.append(name)
+                returns = self._recorded_returns.get(name)
+                if returns:
+                    return returns.popleft()
+            return True if name.startswith(('verify_', 'wait_until_')) else None
+
+        return fake_call
+
+
+class DmicReplay:
+    """Replays a task recording against the real states.
+
+    Feeds the recorded external tasks into a state machine with a fake
+    process manager while a virtual clock skips over all sleeps.
+    Compares the resulting command calls with the recorded ones.
+    """
+
+    JOB_SETTLE_TIMEOUT = 5 # Real seconds to wait for a running job to report back.
+
+    def __init__(self, path):
+        self._header = None
+        self._tasks = []
+        self._commands = []
+
+        with _open_record_file(path, 'r') as record_file:
+            for line in record_file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry['k'] == 'header':
+                    self._header = entry
+                elif entry['k'] == 'task':
+                    self._tasks.append(entry)
+                elif entry['k'] == 'cmd':
+                    self._commands.append(entry)
+
+        if not self._header or self._header['version'] != RECORD_FORMAT_VERSION:
+            raise ValueError(f'[REPLAY] Unsupported recording: {path}')
+
+    def run(self) -> dict:
+        """Runs the replay.
+
+        Returns:
+          A json serializable report of the replay.
+        """
+
+        # Imported here, states pull in the commands and the real process manager.
+        from .statemachine import DmicStateMachine
+        from .commands import commands_set_pm
+
+        recorded_returns = defaultdict(deque)
+        for command in self._commands:
+            recorded_returns[command['name']].append(command['ret'])
+
+        global_config = dict(self._header['config'])
+        global_config.pop('temp_port', None) # Never talk to real hardware.
+        process_manager = DmicFakeProcessManager(
+            DmicFakeConfigLoader(global_config, self._header['apps']),
+            recorded_returns)
+
+        clock = DmicVirtualClock()
+        metrics = DmicMetrics()
+        executed_tasks = 0
+        external_tasks = [t for t in self._tasks if DmicTaskType[t['type']] not in INTERNAL_TASK_TYPES]
+
+        clock.install()
+        wall_start = time.perf_counter()
+        try:
+            state_machine = DmicStateMachine(global_config, metrics)
+            process_manager.set_state_machine(state_machine)
+            commands_set_pm(process_manager)
+
+            state_machine.start()
+            executed_tasks += self._drain(state_machine)
+
+            for entry in external_tasks:
+                clock.advance_to(entry['t'])
+                state_machine.queue_task_for_state(DmicTask(DmicTaskType[entry['type']], entry['data']))
+                executed_tasks += self._drain(state_machine)
+
+            state_machine.stop_event_loop()
+        finally:
+            wall_seconds = time.perf_counter() - wall_start
+            virtual_seconds = clock.now()
+            clock.uninstall()
+
+        recorded_calls = [c['name'] for c in self._commands]
+        return {
+            'external_tasks': len(external_tasks),
+            'executed_tasks': executed_tasks,
+            'virtual_seconds': round(virtual_seconds, 3),
+            'wall_seconds': round(wall_seconds, 3),
+            'tasks_per_second': round(executed_tasks / wall_seconds, 1) if wall_seconds else None,
+            'recorded_commands': len(recorded_calls),
+            'replayed_commands': len(process_manager.calls),
+            'first_command_mismatch': self._first_mismatch(recorded_calls, process_manager.calls),
+            'latency': metrics.dump(),
+        }
+
+    def _drain(self, state_machine):
+        """Executes tasks until the queue is empty and no job is running."""
+
+        executed_tasks = 0
+        while True:
+            if state_machine.step(timeout=0):
+                executed_tasks += 1
+            elif state_machine.has_running_jobs():
+                if state_machine.step(timeout=self.JOB_SETTLE_TIMEOUT):
+                    executed_tasks += 1
+                else:
+                    logger.warning('[REPLAY] Job did not report back in time...')
+                    return executed_tasks
+            else:
+                return executed_tasks
+
+    def _first_mismatch(self, recorded_calls, replayed_calls):
+        for index, (recorded, replayed) in enumerate(zip(recorded_calls, replayed_calls)):
+            if recorded != replayed:
+                return {'index': index, 'recorded': recorded, 'replayed': replayed}
+
+        if len(recorded_calls) != len(replayed_calls):
+            return {'index': min(len(recorded_calls), len(replayed_calls)), 'recorded': None, 'replayed': None}
+
+        return None
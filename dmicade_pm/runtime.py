@@ -0,0 +1,106 @@
+import asyncio
+import logging
+
+from .timer import DmicTimer, SleepManager, DmicLoopTimer, DmicLoopSleepManager
+from .sound_manager import VolumeController, DmicLoopVolumeController
+from .uds_server import UdsServer, DmicLoopUdsServer
+from .application_handler import DmicThreadExitWatcher, DmicLoopExitWatcher
+from .serial_connection import DmicSerialConnector, DmicLoopSerialConnector
+from .temperature_logging import DmicTemperatureLogging, DmicLoopTemperatureLogging
+
+logger = logging.getLogger(__name__)
+
+
+class DmicThreadRuntime:
+    """Default runtime running every component on its own thread.
+
+    Runtimes create the timing and I/O components of the process
+    manager and run the state machine.
+    """
+
+    NAME = 'thread'
+
+    def create_timer(self, name='timer'):
+        return DmicTimer(name)
+
+    def create_sleep_manager(self, config):
+        return SleepManager(config)
+
+    def create_volume_controller(self):
+        return VolumeController()
+
+    def create_uds_server(self, socket_path, metrics=None):
+        return UdsServer(socket_path, metrics)
+
+    def create_exit_watcher(self):
+        return DmicThreadExitWatcher()
+
+    def create_serial_connector(self, port):
+        return DmicSerialConnector(port)
+
+    def create_temperature_logging(self, global_conf):
+        return DmicTemperatureLogging(global_conf)
+
+    def run(self, state_machine):
+        """Runs the state machine loop until it gets stopped."""
+
+        state_machine.run_event_loop_sync()
+
+
+class DmicAsyncioRuntime(DmicThreadRuntime):
+    """Runtime driving timers, UDS, serial I/O and process exits from one asyncio loop.
+
+    Components wait on the event loop instead of polling on their own
+    threads. The state machine keeps handling tasks on a single
+    executor thread, since states run blocking commands.
+    """
+
+    NAME = 'asyncio'
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+
+    def create_timer(self, name='timer'):
+        return DmicLoopTimer(self.loop, name)
+
+    def create_sleep_manager(self, config):
+        return DmicLoopSleepManager(config, self.loop)
+
+    def create_volume_controller(self):
+        return DmicLoopVolumeController(self.loop)
+
+    def create_uds_server(self, socket_path, metrics=None):
+        return DmicLoopUdsServer(socket_path, self.loop, metrics)
+
+    def create_exit_watcher(self):
+        return DmicLoopExitWatcher(self.loop)
+
+    def create_serial_connector(self, port):
+        return DmicLoopSerialConnector(port, self.loop)
+
+    def create_temperature_logging(self, global_conf):
+        return DmicLoopTemperatureLogging(global_conf, self.loop)
+
+    def run(self, state_machine):
+        logger.info('[RUNTIME] Running asyncio event loop...')
+        asyncio.set_event_loop(self.loop)
+
+        try:
+            self.loop.run_until_complete(self.loop.run_in_executor(None, state_machine.run_event_loop_sync))
+        finally:
+            self.loop.close()
+
+
+RUNTIMES = {runtime.NAME: runtime for runtime in (DmicThreadRuntime, DmicAsyncioRuntime)}
+
+
+def create_runtime(name='thread'):
+    """Creates the runtime with the given name.
+
+    Raises:
+      ValueError: If no runtime with the given name exists.
+    """
+
+    if name not in RUNTIMES:
+        raise ValueError(f'Invalid runtime: {name} (options: {", ".join(RUNTIMES)})')
+    return RUNTIMES[name]()
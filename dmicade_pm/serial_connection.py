@@ -1,11 +1,17 @@
 import logging
 import serial
 import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
 
 
 class DmicSerialConnector():
     """Interface for communicating with connected serial device."""
 
+    # Pause after each write so the device can keep up.
+    WRITE_DELAY = 0.05
+
     def __init__(self, port):
         self._connection = None
 
@@ -13,13 +19,48 @@ class DmicSerialConnector():
             self._connection = serial.Serial(port=port, baudrate=9600, timeout=.1)
             time.sleep(3)
         except serial.SerialException as se:
-            logging.warning(se)
+            logger.warning(se)
 
     def write_data(self, data_str):
         if self._connection:
             self._connection.write(bytes(data_str, 'utf-8'))
 
-        time.sleep(0.05)
+        time.sleep(self.WRITE_DELAY)
         
     def read_data(self):
         return self._connection.readline()
+
+    def fileno(self):
+        return self._connection.fileno()
+
+
+class DmicLoopSerialConnector(DmicSerialConnector):
+    """DmicSerialConnector writing from an asyncio event loop.
+
+    Writes get queued and written in order from the loop, spaced by
+    WRITE_DELAY, instead of sleeping on the calling thread.
+    """
+
+    def __init__(self, port, loop):
+        self._loop = loop
+        self._pending_writes = deque()
+        self._write_handle = None
+        super().__init__(port)
+
+    def write_data(self, data_str):
+        self._loop.call_soon_threadsafe(self._queue_write, data_str)
+
+    def _queue_write(self, data_str):
+        self._pending_writes.append(data_str)
+        if not self._write_handle:
+            self._write_next()
+
+    def _write_next(self):
+        self._write_handle = None
+        if not self._pending_writes:
+            return
+
+        data_str = self._pending_writes.popleft()
+        if self._connection:
+            self._connection.write(bytes(data_str, 'utf-8'))
+        self._write_handle = self._loop.call_later(self.WRITE_DELAY, self._write_next)
@@ -5,6 +5,8 @@ import math
 import subprocess
 import os
 
+logger = logging.getLogger(__name__)
+
 
 class VolumeController():
 
@@ -16,7 +18,12 @@ class VolumeController():
         self._audio_level = 0
         self._audio_level_goal = 0
         self._fade_time_delta = 0
-        
+
+        self._start_fading()
+
+    def _start_fading(self):
+        """Starts the volume fading thread."""
+
         self._change_volume_thread = threading.Thread(target=self._change_volume, daemon=True)
         self._change_volume_thread.name = 'VolumeControllerThread'
         self._change_volume_thread.start()
@@ -24,7 +31,7 @@ class VolumeController():
     def set_volume(self, volume_perc):
         """Sets system volume to given percentage."""
 
-        logging.info(f'[VOLUME CONTROL] Set volume to {volume_perc}%.')
+        logger.info('[VOLUME CONTROL] Set volume to %s%%.', volume_perc)
 
         self._audio_level = volume_perc
         self._audio_level_goal = volume_perc
@@ -48,12 +55,12 @@ class VolumeController():
         audio_level_steps = abs(goal_perc - self._audio_level_goal)
         self._audio_level_goal = goal_perc
         if audio_level_steps == 0:
-            logging.warning(f'[VOLUME CONTROL] Something went wrong... {self._audio_level=} {self._audio_level_goal=} {audio_level_steps=}')
+            logger.warning('[VOLUME CONTROL] Something went wrong... self._audio_level=%r self._audio_level_goal=%r audio_level_steps=%r', self._audio_level, self._audio_level_goal, audio_level_steps)
             return
 
         self._fade_time_delta = max_fade_duration / audio_level_steps
-        logging.info(f'[VOLUME CONTROL] Start Volume fade from {self._audio_level}% to {self._audio_level_goal}% in {max_fade_duration}s')
-        logging.debug(f'[VOLUME CONTROL] {self._fade_time_delta=}\n')
+        logger.info('[VOLUME CONTROL] Start Volume fade from %s%% to %s%% in %ss', self._audio_level, self._audio_level_goal, max_fade_duration)
+        logger.debug('[VOLUME CONTROL] self._fade_time_delta=%r\n', self._fade_time_delta)
 
     def _change_volume(self):
         """Waits for new audio level goal to be set. Then starts fading towards that level.
@@ -64,16 +71,50 @@ class VolumeController():
 
         while True:
             if self._audio_level != self._audio_level_goal:
-
-                # Move volume level towards the goal.
-                self._audio_level += math.copysign(1, self._audio_level_goal - self._audio_level)
-                # logging.debug(f'[VOLUME CONTROL] {self._audio_level=}')
-
-                set_volume_cmd = self.CMD_SET_VOLUME % self._audio_level + '%'
-                if os.name != 'nt':
-                    subprocess.Popen(set_volume_cmd, shell=True, stdout=subprocess.PIPE)
-                
+                self._step_volume()
                 time.sleep(self._fade_time_delta)
 
             else:
                 time.sleep(self.CHECK_AUDIO_UPDATE_DELAY)
+
+    def _step_volume(self):
+        """Moves the volume level one step towards the goal."""
+
+        self._audio_level += math.copysign(1, self._audio_level_goal - self._audio_level)
+        # logging.debug(f'[VOLUME CONTROL] {self._audio_level=}')
+
+        set_volume_cmd = self.CMD_SET_VOLUME % self._audio_level + '%'
+        if os.name != 'nt':
+            subprocess.Popen(set_volume_cmd, shell=True, stdout=subprocess.PIPE)
+
+
+class DmicLoopVolumeController(VolumeController):
+    """VolumeController fading from an asyncio event loop.
+
+    Only schedules fade steps while a fade is in progress instead of
+    polling for new volume goals.
+    """
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._fade_handle = None
+        super().__init__()
+
+    def _start_fading(self):
+        pass
+
+    def fade_volume(self, goal_perc, max_fade_duration):
+        super().fade_volume(goal_perc, max_fade_duration)
+        self._loop.call_soon_threadsafe(self._schedule_fade_step)
+
+    def _schedule_fade_step(self):
+        if self._fade_handle or self._audio_level == self._audio_level_goal:
+            return
+        self._fade_handle = self._loop.call_later(self._fade_time_delta, self._fade_step)
+
+    def _fade_step(self):
+        self._fade_handle = None
+        if self._audio_level != self._audio_level_goal:
+            self._step_volume()
+        self._schedule_fade_step()
+
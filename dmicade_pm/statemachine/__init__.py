@@ -1 +1,2 @@
 from ._statemachine import DmicStateMachine
+from ._states import DmicStatePool
@@ -2,51 +2,123 @@ import logging
 import time
 
 from ._states import DmicStatePool
+from ._task_queue import DmicTaskQueue
 from ..tasks import DmicTask, DmicTaskType
+from ..jobs import DmicJob
+from ..metrics import DmicMetrics
 from ..temperature_logging import DmicTemperatureLogging
 
+logger = logging.getLogger(__name__)
+
 class DmicStateMachine:
     """Statemachine of the processmanager.
 
     Has an active state to handle tasks and a task queue. The event
     loop handles task execution generally by delegating it to the
+    handler the active state declared for the task type. Tasks
+    without a handler in the active state are dropped.
+
+    Long running commands are run as DmicJobs owned by the state
+    machine. Their progress and results get queued as tasks for the
     active state.
-    """
 
-    TASK_CHECK_DELAY = 0.05
+    Every task gets timestamped when queued, taken from the queue and
+    done. Queue wait and handling time are recorded in latency
+    histograms per task type and state.
 
-    def __init__(self, global_conf=None):
+    Queued tasks are passed to an optional recorder for later replays
+    (see DmicTaskRecorder). An optional DmicWatchdog watches task
+    handling and jobs for running over budget. State and active app
+    changes get published to an optional DmicStatusBlock.
+    """
+
+    def __init__(self, global_conf=None, metrics: DmicMetrics = None, recorder=None, watchdog=None, status_block=None,
+                 create_temp_logging=DmicTemperatureLogging):
         self._state_pool = DmicStatePool()
-        self._current_state = self._state_pool.get_object('start')
-        self._task_queue = []
+        self._current_state_id = 'start'
+        self._current_state = self._state_pool.get_object(self._current_state_id)
+        self._task_queue = DmicTaskQueue()
         self._is_running = False
         self._active_app = None
+        self._jobs = dict()
+        self.metrics = metrics if metrics else DmicMetrics()
+        self._recorder = recorder
+        self._watchdog = watchdog
+        self._status_block = status_block
+        if status_block:
+            status_block.update(state=self._current_state_id)
+
+        # Tasks handled by the state machine itself.
+        self._internal_handlers = {
+            DmicTaskType.SET_ACTIVE_APP: self._set_active_app,
+            DmicTaskType.CHANGE_STATE: self._change_state,
+            DmicTaskType.RUN_JOB: self._run_job,
+            DmicTaskType.CANCEL_JOB: self._cancel_job,
+        }
 
         self._gconf = global_conf # TEMPLOGGING
-        self.temp_logging = DmicTemperatureLogging(self._gconf) # TEMPLOGGING
+        self._create_temp_logging = create_temp_logging # TEMPLOGGING
+        self.temp_logging = create_temp_logging(self._gconf) # TEMPLOGGING
 
     def run_event_loop_sync(self):
         """Runs synchronous state machine loop.
 
-        Waits for tasks to be queued, manages queued tasks and hands
-        them to the current state to handle.
+        Blocks until tasks are queued and hands them to the current
+        state to handle in order of their priority.
         """
 
-        self._is_running = True
+        self.start()
+
+        while self._is_running:
+            if not self.step():
+                break
+
+        for job in list(self._jobs.values()):
+            job.cancel()
+
+    def start(self):
+        """Enters the initial state."""
 
+        self._is_running = True
         self._current_state.enter()
 
-        while self._is_running:
-            if len(self._task_queue) > 0:
-                logging.debug(f"""[STATEM] Task is queued:\n |- self._current_state={type(self._current_state).__name__}\n |- Tasks: {[n.type for n in self._task_queue]}""")
-                task_is_ready = self._ready_task_buffer()
+    def step(self, timeout=None):
+        """Takes the next task from the queue and executes it.
+
+        Args:
+          timeout: float
+            Maximum seconds to wait for a task. Waits indefinitely
+            when None.
+
+        Returns:
+          False if no task was executed because the queue was closed or
+          the timeout ran out.
+        """
 
-                if task_is_ready:
-                    self._execute_next_task()
-                    logging.debug('[STATEM] Task Done!\n')
+        current_task = self._task_queue.get(timeout)
+        if current_task is None:
+            return False
 
-            else:
-                time.sleep(self.TASK_CHECK_DELAY)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('[STATEM] Task is queued:\n |- self._current_state=%s\n |- Task: %s\n |- Queued: %s', type(self._current_state).__name__, current_task.type, self._task_queue.task_types())
+        handling_state_id = self._current_state_id
+        if self._watchdog:
+            self._watchdog.begin(self, f'Task {current_task.type.name} ({current_task.data}) in state "{handling_state_id}"')
+
+        current_task.started_at = time.monotonic()
+        try:
+            self._execute_next_task(current_task)
+        finally:
+            if self._watchdog:
+                self._watchdog.end(self)
+        current_task.finished_at = time.monotonic()
+        self._record_latency(current_task, handling_state_id)
+        logger.debug('[STATEM] Task Done!\n')
+
+        return True
+
+    def has_running_jobs(self) -> bool:
+        return len(self._jobs) > 0
 
     def stop_event_loop(self):
         """Stops event loop.
@@ -54,65 +126,153 @@ class DmicStateMachine:
         Tells the event loop to exit after executing current task.
         """
 
-        logging.info('[STATEM] Stop event loop...')
+        logger.info('[STATEM] Stop event loop...')
         self._is_running = False
+        self._task_queue.close()
 
     def queue_task_for_state(self, task: DmicTask):
         """Queues a task to be handled by the current state.
 
+        Safe to call from any thread. Wakes the event loop immediately.
+
+        Tasks get coalesced with already queued tasks of the same type
+        according to the tasks coalesce policy.
+
         Args:
-          task: dict
+          task: DmicTask
             The task to queue.
         """
 
-        logging.debug(f'[STATEM] Queue: {task.type}, {task.data=}')
-        self._task_queue.append(task)
-        logging.debug(f'[STATEM] {[n.type for n in self._task_queue]}')
+        logger.debug('[STATEM] Queue: %s, task.data=%r, priority=%s', task.type, task.data, task.priority.name)
+        task.queued_at = time.monotonic()
+        if self._recorder:
+            self._recorder.record_task(task)
+        if not self._task_queue.put(task):
+            logger.debug('[STATEM] Coalesced: %s (%s)', task.type, task.coalesce_policy.name)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('[STATEM] %s', self._task_queue.task_types())
 
-    def _execute_next_task(self):
-        """Handles execution of the next queued task."""
+    def dump_metrics(self) -> dict:
+        """Returns latency histograms and queue counters as json serializable dictionary."""
 
-        current_task = self._task_queue[0]
+        return {
+            'queue': {
+                'length': len(self._task_queue),
+                'coalesced': self._task_queue.coalesced_count,
+                'dropped': self._task_queue.dropped_count,
+            },
+            'latency': self.metrics.dump(),
+        }
 
-        if logging.root.level <= logging.INFO:
-            print()
-        logging.info(f'[STATEM] Execute Task: {current_task.type.name}, {current_task.data}')
+    def dump_status(self) -> dict:
+        """Returns current state, active app, queued tasks and running jobs as json serializable dictionary."""
+
+        return {
+            'state': self._current_state_id,
+            'active_app': self._active_app,
+            'queue_length': len(self._task_queue),
+            'queued_tasks': [task_type.name for task_type in self._task_queue.task_types()],
+            'jobs': {name: round(job.duration(), 3) for name, job in list(self._jobs.items())},
+        }
+
+    def _record_latency(self, task: DmicTask, state_id: str):
+        task_name = task.type.name
+        self.metrics.record(f'task_wait:{task_name}', task.started_at - task.queued_at)
+        self.metrics.record(f'task_handle:{state_id}:{task_name}', task.finished_at - task.started_at)
+
+    def _execute_next_task(self, current_task: DmicTask):
+        """Handles execution of the given task taken from the queue."""
+
+        logger.info('[STATEM] Execute Task: %s, %s', current_task.type.name, current_task.data)
 
         if current_task.type is DmicTaskType.WAKE: # TEMPLOGGING
-            self.temp_logging = DmicTemperatureLogging(self._gconf) # TEMPLOGGING
+            self.temp_logging = self._create_temp_logging(self._gconf) # TEMPLOGGING
 
-        if current_task.type is DmicTaskType.SET_ACTIVE_APP:
-            self._active_app = current_task.data
-        elif current_task.type is DmicTaskType.CHANGE_STATE:
-            self._change_state(current_task.data)
-        else:
-            # Inject active apps name into task data while 'InGame'.
-            if self._current_state == self._state_pool.get_object('ingame') and not current_task.data:
-                current_task.data = self._active_app
+        internal_handler = self._internal_handlers.get(current_task.type)
+        if internal_handler:
+            internal_handler(current_task.data)
+            return
 
-            self._current_state.handle(current_task)
+        if current_task.type is DmicTaskType.JOB_DONE and not self._finish_job(current_task.data):
+            return
 
-        self._task_queue.remove(current_task)
-        logging.debug(f'[STATEM] Removed task, new queue: {[n.type for n in self._task_queue]}')
+        handler = self._state_pool.get_handler(self._current_state_id, current_task.type)
+        if handler is None:
+            logger.debug('[STATEM] Unhandled task %s in state: %s', current_task.type.name, self._current_state_id)
+            return
+
+        # Inject active apps name into task data while 'InGame'.
+        if self._current_state.INJECT_ACTIVE_APP and not current_task.data:
+            current_task.data = self._active_app
+
+        handler(current_task)
+
+    def _set_active_app(self, app_id: str):
+        self._active_app = app_id
+        if self._status_block:
+            self._status_block.update(active_app=app_id)
 
     def _change_state(self, state_name: str):
         """Handles steps to change to the next state."""
 
         # Only change state if state is different.
-        if self._current_state == self._state_pool.get_object(state_name):
+        if self._current_state_id == state_name:
             return
 
-        logging.debug('[STATEM] Exit state...')
+        logger.debug('[STATEM] Exit state...')
         self._current_state.exit()
 
-        logging.info(f'[STATEM] Change state to {state_name}.')
+        logger.info('[STATEM] Change state to %s.', state_name)
         logging.getLogger('temp_logger').info(f'Change state to {state_name}.') # TEMPLOGGING
         if state_name == 'sleep': # TEMPLOGGING
             self.temp_logging.stop() # TEMPLOGGING
             self.temp_logging = None  # TEMPLOGGING
+        self._current_state_id = state_name
         self._current_state = self._state_pool.get_object(state_name)
-        logging.debug(f'[STATEM] Enter state: {self._current_state}')
+        if self._status_block:
+            self._status_block.update(state=state_name)
+        logger.debug('[STATEM] Enter state: %s', self._current_state)
         self._current_state.enter()
 
-    def _ready_task_buffer(self):
-        return len(self._task_queue) > 0
+    def _run_job(self, job: DmicJob):
+        """Starts a job, cancelling a running job with the same name."""
+
+        self._cancel_job(job.name)
+
+        logger.debug('[STATEM] Run job: %s', job.name)
+        job.progress_event += lambda progress: self.queue_task_for_state(DmicTask(DmicTaskType.JOB_PROGRESS, progress))
+        job.done_event += lambda result: self.queue_task_for_state(DmicTask(DmicTaskType.JOB_DONE, result))
+        if self._watchdog:
+            self._watchdog.begin(job, f'Job {job.name}', self._watchdog.job_budget)
+            job.done_event += lambda result: self._watchdog.end(job)
+
+        self._jobs[job.name] = job
+        job.start()
+
+    def _finish_job(self, job_result):
+        """Unregisters a finished job.
+
+        Returns:
+          False if the job was replaced by a newer job with the same
+          name and its result should be ignored.
+        """
+
+        if self._jobs.get(job_result.name) is not job_result.job:
+            logger.debug('[STATEM] Ignore result of replaced job: %s', job_result.name)
+            return False
+
+        del self._jobs[job_result.name]
+        if not job_result.cancelled:
+            self.metrics.record(f'job:{job_result.name}', job_result.job.duration())
+        return True
+
+    def _cancel_job(self, job_name: str):
+        """Cancels a running job by its name.
+
+        The job stays registered until its result arrives so the
+        active state still gets notified about the cancelled job.
+        """
+
+        if job_name in self._jobs:
+            logger.info('[STATEM] Cancel job: %s', job_name)
+            self._jobs[job_name].cancel()
@@ -1,10 +1,12 @@
 import logging
 
 from abc import ABC
-from ..helper import ObjectPool
+from ..helper import ObjectPool, DmicException
 from ..tasks import DmicTask, DmicTaskType
 from ..commands import *
 
+logger = logging.getLogger(__name__)
+
 
 UI_MSG = {
     'app_started': 'app_started:',
@@ -18,30 +20,77 @@ UI_MSG = {
     'boot_menu': 'boot'
 }
 
+JOB_START_APP = 'start_app'
+JOB_IDLE_COLORS = 'idle_colors'
+
+
+def handles(*task_types: DmicTaskType, transitions=()):
+    """Declares a state method as handler for the given task types.
+
+    The declarations get compiled into the dispatch table of the
+    DmicStatePool.
+
+    Args:
+      task_types:
+        DmicTaskTypes the decorated method handles.
+      transitions:
+        Names of states the handler may change to. Used to generate
+        the transition graph.
+    """
+
+    def decorator(handler):
+        handler.handled_task_types = task_types
+        handler.transitions = tuple(transitions)
+        return handler
+
+    return decorator
+
 
 class DmicState(ABC):
-    """Abstract state class."""
+    """Abstract state class.
 
-    def enter(self) -> None:
-        """Runs when entering the state."""
-        pass
+    Tasks are handled by methods declared with the 'handles' decorator.
 
-    def handle(self, task: DmicTask) -> None:
-        """Handles occurring tasks.
+    Attributes:
+      ENTER_TRANSITIONS : tuple
+        Names of states the state may change to when entered.
+      INJECT_ACTIVE_APP : bool
+        Whether the state machine fills empty task data with the name
+        of the active app while in this state.
+    """
 
-        Args:
-          task:
-            A DmicTask to handle by the state.
-        """
+    ENTER_TRANSITIONS = ()
+    INJECT_ACTIVE_APP = False
+
+    def enter(self) -> None:
+        """Runs when entering the state."""
         pass
 
     def exit(self) -> None:
         """Runs when exiting the state."""
         pass
 
+    # Handlers of all states:
+
+    @handles(DmicTaskType.SET_VOLUME)
+    def _set_volume(self, task: DmicTask):
+        c_set_volume(task.data)
+
+    @handles(DmicTaskType.SET_BUTTON_COLORS)
+    def _set_button_colors(self, task: DmicTask):
+        c_change_button_colors(task.data)
+
 
 class DmicStatePool(ObjectPool):
-    """State pool for concrete DmicStates."""
+    """State pool for concrete DmicStates.
+
+    Compiles the handler declarations of all states into a dispatch
+    table once on creation.
+
+    Attributes:
+      dispatch_table : dict
+        Bound handler methods by (state id, DmicTaskType).
+    """
 
     STATE_PREFIX = 'S_'
 
@@ -49,7 +98,66 @@ class DmicStatePool(ObjectPool):
         """Constructor for class DmicStatePool."""
         super().__init__(globals(), DmicState, self.STATE_PREFIX)
 
-        logging.debug(f'[STATE POOL]: {self._pool=}')
+        logger.debug('[STATE POOL]: self._pool=%r', self._pool)
+
+        self.dispatch_table = self._compile_dispatch_table()
+        self._validate_transitions()
+
+    def state_ids(self):
+        return list(self._pool.keys())
+
+    def get_handler(self, state_id: str, task_type: DmicTaskType):
+        """Looks up the handler of a state for a task type.
+
+        Returns:
+          The bound handler method or None if the task type is not
+          handled in the given state.
+        """
+
+        return self.dispatch_table.get((state_id, task_type))
+
+    def transition_graph(self) -> dict:
+        """Generates the declared transition graph of all states.
+
+        Returns:
+          Dictionary mapping every state id to a dictionary of
+          triggers ('enter' or a task type name) and the state ids
+          reachable through them.
+        """
+
+        graph = dict()
+        for state_id, state in self._pool.items():
+            edges = dict()
+            if state.ENTER_TRANSITIONS:
+                edges['enter'] = list(state.ENTER_TRANSITIONS)
+
+            for (handler_state_id, task_type), handler in self.dispatch_table.items():
+                if handler_state_id == state_id and handler.transitions:
+                    edges[task_type.name] = list(handler.transitions)
+
+            graph[state_id] = edges
+
+        return graph
+
+    def _compile_dispatch_table(self):
+        dispatch_table = dict()
+
+        for state_id, state in self._pool.items():
+            for attr_name in dir(type(state)):
+                handler = getattr(state, attr_name)
+                for task_type in getattr(handler, 'handled_task_types', ()):
+                    if (state_id, task_type) in dispatch_table:
+                        raise DmicException(f'[STATE POOL] Multiple handlers for {task_type.name} in state "{state_id}"')
+                    dispatch_table[(state_id, task_type)] = handler
+
+        return dispatch_table
+
+    def _validate_transitions(self):
+        for state_id, edges in self.transition_graph().items():
+            for target_ids in edges.values():
+                for target_id in target_ids:
+                    if not self.object_exists(target_id):
+                        raise DmicException(f'[STATE POOL] State "{state_id}" declares transition to unknown state "{target_id}"')
 
 
 # Concrete States:
@@ -57,80 +165,134 @@ class DmicStatePool(ObjectPool):
 
 class S_Test(DmicState):
     def enter(self):
-        logging.debug('[TEST STATE]: Enter')
+        logger.debug('[TEST STATE]: Enter')
 
-    def handle(self, task: DmicTask):
-        logging.debug(f'[TEST STATE]: Handle: {task=}')
-        if task.type is DmicTaskType.TEST:
-            self.command_pool.invoke_command('test', task.data)
+    @handles(DmicTaskType.TEST)
+    def _test(self, task: DmicTask):
+        logger.debug('[TEST STATE]: Handle: task=%r', task)
+        c_test(task.data)
 
     def exit(self):
-        logging.debug('[TEST STATE]: Exit')
+        logger.debug('[TEST STATE]: Exit')
 
 
 class S_Start(DmicState):
+    ENTER_TRANSITIONS = ('inmenu',)
+
     def enter(self):
-        logging.debug('[STATE: START] Enter.')
+        logger.debug('[STATE: START] Enter.')
         c_send_to_ui(UI_MSG['boot_menu'])
         c_set_volume('min')
         c_change_state('inmenu')
 
 
 class S_InMenu(DmicState):
+    def __init__(self):
+        self._launching_app = None
+        self._launch_job = None
+
     def enter(self):
-        logging.debug('[STATE: INMENU] Enter.')
+        logger.debug('[STATE: INMENU] Enter.')
         # TODO Focus menu
         c_set_timer_menu()
-        c_send_to_ui(UI_MSG['activate_menu'])
+        c_send_to_ui(UI_MSG['activate_menu'], track_ack=True)
         c_queue_menu_button_led_state(False)
         c_set_menu_button_colors()
 
-    def handle(self, task):
-        logging.debug(f'[STATE: INMENU] Handle: {task=}')
-
-        if task.type is DmicTaskType.START_APP:
-            logging.debug('[STATE: INMENU] Start game!')
-            app_id = task.data
+    @handles(DmicTaskType.START_APP)
+    def _start_app(self, task):
+        logger.debug('[STATE: INMENU] Start game!')
+        app_id = task.data
 
-            # Verify app is configured
-            if not c_verify_app_is_configured(app_id):
-                logging.warning(f'[STATE: INMENU] Could not start app "{app_id}": not configured...')
-                c_send_to_ui(UI_MSG['app_not_found'])
-                return
+        if self._launching_app:
+            logger.warning('[STATE: INMENU] Ignore start of "%s": "%s" is still starting...', app_id, self._launching_app)
+            return
 
-            c_clear_button_colors()
+        # Verify app is configured
+        if not c_verify_app_is_configured(app_id):
+            logger.warning('[STATE: INMENU] Could not start app "%s": not configured...', app_id)
+            c_send_to_ui(UI_MSG['app_not_found'])
+            return
 
-            # Start app
-            app_started = c_start_game(app_id)
-            c_send_to_ui(UI_MSG['app_started'] + str(app_started).lower())
+        c_clear_button_colors()
 
-            if app_started:
-                c_change_state('ingame')
-                c_set_active_app(app_id)
-                app_focused = c_focus_app(app_id)
-                if not app_focused:
-                    logging.warning(f'[STATE: INMENU] Could not focus app: {app_id}')
-                    # TODO handle app not focused
+        # Start app without blocking the state machine.
+        self._launching_app = app_id
+        self._launch_job = c_run_job(JOB_START_APP, c_start_game, app_id)
+
+    @handles(DmicTaskType.JOB_PROGRESS)
+    def _job_progress(self, task):
+        if task.data.name == JOB_START_APP:
+            logger.debug('[STATE: INMENU] Starting app: %s', task.data.data)
+
+    @handles(DmicTaskType.JOB_DONE, transitions=('ingame',))
+    def _job_done(self, task):
+        if task.data.name != JOB_START_APP:
+            return
+
+        job_result = task.data
+        if job_result.job is not self._launch_job:
+            logger.debug('[STATE: INMENU] Ignore result of stale start job: %s', job_result.args)
+            if job_result.args[0] != self._launching_app:
+                self._close_aborted_app(job_result)
+            return
+
+        app_id = job_result.args[0]
+        self._launching_app = None
+        self._launch_job = None
+
+        app_started = bool(job_result.result) and not job_result.cancelled
+        c_send_to_ui(UI_MSG['app_started'] + str(app_started).lower(), track_ack=True)
+
+        if app_started:
+            c_change_state('ingame')
+            c_set_active_app(app_id)
+            app_focused = c_focus_app(app_id)
+            if not app_focused:
+                logger.warning('[STATE: INMENU] Could not focus app: %s', app_id)
+                # TODO handle app not focused
+
+            c_queue_menu_button_led_state(True)
+            c_set_app_button_colors(app_id)
+
+            c_send_to_ui(UI_MSG['deactivate_menu'], track_ack=True)
+
+        else:
+            if job_result.cancelled:
+                logger.info('[STATE: INMENU] Start of app aborted: %s', app_id)
+                self._close_aborted_app(job_result)
+            else:
+                logger.warning('[STATE: INMENU] Could not start app: %s', app_id)
+                # TODO handle game not starting
+            c_set_menu_button_colors()
 
-                c_queue_menu_button_led_state(True)
-                c_set_app_button_colors(app_id)
+    @handles(DmicTaskType.TIMEOUT, transitions=('idle',))
+    def _timeout(self, task):
+        c_change_state('idle')
 
-                c_send_to_ui(UI_MSG['deactivate_menu'])
+    def _close_aborted_app(self, job_result):
+        """Closes an app that finished starting after its start job got cancelled."""
 
-            else:
-                logging.warning(f'[STATE: INMENU] Could not start app: {app_id}')
-                c_set_menu_button_colors()
-                # TODO handle game not starting
+        if job_result.cancelled and job_result.result:
+            logger.info('[STATE: INMENU] Close app started after abort: %s', job_result.args[0])
+            c_close_game(job_result.args[0])
 
-        elif task.type is DmicTaskType.TIMEOUT:
-            c_change_state('idle')
+    @handles(DmicTaskType.CLOSE_APP)
+    def _close_app(self, task):
+        if self._launching_app:
+            logger.info('[STATE: INMENU] Abort start of: %s', self._launching_app)
+            c_cancel_job(JOB_START_APP)
+            return
 
-        elif task.type is DmicTaskType.CLOSE_APP:
-            os.sync()
-            logging.debug('[STATE: INMENU] \033[1m --- OS Synched! Ready for shutdown... --- \033[0m')
+        os.sync()
+        logger.debug('[STATE: INMENU] \033[1m --- OS Synched! Ready for shutdown... --- \033[0m')
 
     def exit(self):
-        logging.debug('[STATE: INMENU] Exit')
+        logger.debug('[STATE: INMENU] Exit')
+        if self._launching_app:
+            c_cancel_job(JOB_START_APP)
+            self._launching_app = None
+            self._launch_job = None
 
 
 class S_Idle(DmicState):
@@ -141,40 +303,48 @@ class S_Idle(DmicState):
         c_send_to_ui(UI_MSG['enter_idle'])
         c_queue_menu_button_led_state(True)
         c_clear_button_colors()
-        time.sleep(1)
-        c_change_button_colors({"RAINBOW": True})
+        c_run_job(JOB_IDLE_COLORS, c_wait, 1)
 
-    def handle(self, task):
-        if task.type is DmicTaskType.INTERACTION or task.type is DmicTaskType.CLOSE_APP:
-            if not self.waiting_for_interaction:
-                return
+    @handles(DmicTaskType.INTERACTION, DmicTaskType.CLOSE_APP, transitions=('inmenu',))
+    def _interaction(self, task):
+        if not self.waiting_for_interaction:
+            return
 
-            self.waiting_for_interaction = False
+        self.waiting_for_interaction = False
 
-            c_change_state('inmenu')
-            c_set_interaction_feedback(False)
-            c_send_to_ui(UI_MSG['exit_idle'])
+        c_change_state('inmenu')
+        c_set_interaction_feedback(False)
+        c_send_to_ui(UI_MSG['exit_idle'])
 
-        if task.type is DmicTaskType.SLEEP:
-            c_change_state('sleep')
+    @handles(DmicTaskType.JOB_DONE)
+    def _job_done(self, task):
+        if task.data.name == JOB_IDLE_COLORS and not task.data.cancelled:
+            c_change_button_colors({"RAINBOW": True})
+
+    @handles(DmicTaskType.SLEEP, transitions=('sleep',))
+    def _sleep(self, task):
+        c_change_state('sleep')
 
     def exit(self):
         c_set_interaction_feedback(False)
+        c_cancel_job(JOB_IDLE_COLORS)
 
 
 class S_InGame(DmicState):
+    INJECT_ACTIVE_APP = True
+
     def enter(self):
         c_set_timer_game()
 
-    def handle(self, task):
-        logging.debug(f'[STATE: INGAME] Handle: {task=}')
-        if task.type is DmicTaskType.CLOSE_APP or \
-                task.type is DmicTaskType.TIMEOUT:
-            self._go_to_menu(task, 'app_closed')
+    @handles(DmicTaskType.CLOSE_APP, DmicTaskType.TIMEOUT, transitions=('inmenu',))
+    def _close_app(self, task):
+        logger.debug('[STATE: INGAME] Handle: task=%r', task)
+        self._go_to_menu(task, 'app_closed')
 
-        elif task.type is DmicTaskType.APP_CRASHED:
-            logging.warning(f'[STATE: INGAME] Game crashed {task.data=}\n')
-            self._go_to_menu(task, 'app_crashed')
+    @handles(DmicTaskType.APP_CRASHED, transitions=('inmenu',))
+    def _app_crashed(self, task):
+        logger.warning('[STATE: INGAME] Game crashed task.data=%r\n', task.data)
+        self._go_to_menu(task, 'app_crashed')
 
     def _go_to_menu(self, task, msg_id):
         app_id = task.data
@@ -191,10 +361,10 @@ class S_Sleep(DmicState):
         c_clear_button_colors()
         c_enter_sleep()
 
-    def handle(self, task):
-        logging.debug(f'[STATE: SLEEP] Handle: {task=}')
-        if task.type is DmicTaskType.WAKE:
-            c_change_state('inmenu')
+    @handles(DmicTaskType.WAKE, transitions=('inmenu',))
+    def _wake(self, task):
+        logger.debug('[STATE: SLEEP] Handle: task=%r', task)
+        c_change_state('inmenu')
 
     def exit(self):
         c_send_to_ui(UI_MSG['exit_idle'])
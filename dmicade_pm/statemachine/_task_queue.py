@@ -0,0 +1,133 @@
+import threading
+import logging
+
+from collections import deque
+from ..tasks import DmicTask, DmicTaskPriority, DmicCoalescePolicy
+
+logger = logging.getLogger(__name__)
+
+
+class DmicTaskQueue:
+    """Thread safe blocking priority queue for dmic tasks.
+
+    Keeps one FIFO lane per DmicTaskPriority. 'get' blocks until a
+    task is available and always returns the oldest task of the most
+    important non-empty lane. Producers wake a waiting consumer
+    immediately.
+
+    Incoming tasks are coalesced with already queued tasks of the same
+    type according to their coalesce policy. Lanes other than the
+    internal one are bounded by MAX_LANE_LENGTH.
+
+    Attributes:
+      coalesced_count : int
+        Amount of tasks that were merged into or dropped in favour of
+        an already queued task.
+      dropped_count : int
+        Amount of tasks dropped because their lane was full.
+    """
+
+    MAX_LANE_LENGTH = 32
+
+    def __init__(self):
+        self._lanes = [deque() for _ in DmicTaskPriority]
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self.coalesced_count = 0
+        self.dropped_count = 0
+
+    def put(self, task: DmicTask):
+        """Adds a task to the lane of its priority and wakes the consumer.
+
+        Returns:
+          True if the task was added as a new entry to the queue.
+        """
+
+        with self._cond:
+            lane = self._lanes[task.priority]
+
+            if self._coalesce(lane, task):
+                self.coalesced_count += 1
+                return False
+
+            if task.priority is not DmicTaskPriority.INTERNAL and len(lane) >= self.MAX_LANE_LENGTH:
+                self.dropped_count += 1
+                logger.warning('[TASK QUEUE] Lane %s is full, dropped: %s', task.priority.name, task.type.name)
+                return False
+
+            lane.append(task)
+            self._size += 1
+            self._cond.notify()
+            return True
+
+    def get(self, timeout=None):
+        """Removes and returns the next task.
+
+        Blocks until a task is queued, the queue gets closed or the
+        timeout runs out.
+
+        Args:
+          timeout: float
+            Maximum seconds to wait. Waits indefinitely when None.
+
+        Returns:
+          The next DmicTask or None if the queue was closed or the
+          timeout ran out.
+        """
+
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._size > 0 or self._closed, timeout):
+                return None
+
+            if self._closed:
+                return None
+
+            for lane in self._lanes:
+                if lane:
+                    self._size -= 1
+                    return lane.popleft()
+
+    def _coalesce(self, lane, task: DmicTask):
+        """Applies the tasks coalesce policy against the queued tasks.
+
+        Returns:
+          True if the task was absorbed and must not be queued.
+        """
+
+        policy = task.coalesce_policy
+        if policy is DmicCoalescePolicy.APPEND:
+            return False
+
+        for queued_task in lane:
+            if queued_task.type is not task.type:
+                continue
+
+            if policy is DmicCoalescePolicy.DROP_IF_QUEUED:
+                return True
+
+            if policy is DmicCoalescePolicy.DROP_IF_DUPLICATE and queued_task.data == task.data:
+                return True
+
+            if policy is DmicCoalescePolicy.KEEP_LATEST:
+                queued_task.data = task.data
+                return True
+
+        return False
+
+    def close(self):
+        """Closes the queue and wakes up all waiting consumers."""
+
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def task_types(self):
+        """Returns the types of all queued tasks in execution order."""
+
+        with self._cond:
+            return [task.type for lane in self._lanes for task in lane]
+
+    def __len__(self):
+        return self._size
@@ -0,0 +1,144 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class DmicStatusBlock:
+    """Fixed layout status record in a memory mapped file.
+
+    Lets the UI and monitoring tools read the process manager status
+    by polling a file under /dev/shm instead of querying the socket.
+
+    Layout (little endian, 128 bytes):
+
+      offset  size  field
+      0       4     magic b'DMIC'
+      4       2     layout version
+      6       2     reserved
+      8       8     sequence counter (uint64)
+      16      8     last update, seconds since epoch (double)
+      24      8     timeout deadline, seconds since epoch, 0 when no timeout runs (double)
+      32      1     sleep time (uint8, 0 or 1)
+      33      15    reserved
+      48      16    current state (utf-8, nul padded)
+      64      64    active app (utf-8, nul padded)
+
+    The sequence counter is odd while an update is written. Readers
+    read the counter, the fields and the counter again and retry when
+    the counter was odd or changed.
+    """
+
+    MAGIC = b'DMIC'
+    LAYOUT_VERSION = 1
+    HEADER = struct.Struct('<4sHHQ')
+    FIELDS = struct.Struct('<ddB15x16s64s')
+    SEQUENCE_OFFSET = 8
+    FIELDS_OFFSET = HEADER.size
+    SIZE = HEADER.size + FIELDS.size
+
+    def __init__(self, path: str):
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._status = {
+            'timeout_deadline': 0.0,
+            'sleep_time': False,
+            'state': '',
+            'active_app': '',
+        }
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, self.SIZE)
+            self._mmap = mmap.mmap(fd, self.SIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+
+        self.HEADER.pack_into(self._mmap, 0, self.MAGIC, self.LAYOUT_VERSION, 0, self._sequence)
+        self._write()
+        logger.info('[STATUS BLOCK] Publishing status to: %s', path)
+
+    def update(self, **status):
+        """Updates the given fields and publishes the whole record.
+
+        Args:
+          status:
+            Any of 'state', 'active_app', 'timeout_deadline' and
+            'sleep_time'.
+        """
+
+        with self._lock:
+            self._status.update(status)
+            self._write()
+
+    def set_timeout_remaining(self, seconds):
+        """Publishes the timeout deadline, clears it when seconds is None."""
+
+        self.update(timeout_deadline=time.time() + seconds if seconds is not None else 0.0)
+
+    def close(self):
+        with self._lock:
+            self._mmap.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def _write(self):
+        """Writes all fields enclosed by sequence counter increments."""
+
+        if self._mmap.closed:
+            return
+
+        status = self._status
+        self._sequence += 1
+        struct.pack_into('<Q', self._mmap, self.SEQUENCE_OFFSET, self._sequence)
+        self.FIELDS.pack_into(
+            self._mmap, self.FIELDS_OFFSET,
+            time.time(),
+            status['timeout_deadline'],
+            1 if status['sleep_time'] else 0,
+            (status['state'] or '').encode('utf-8')[:16],
+            (status['active_app'] or '').encode('utf-8')[:64])
+        self._sequence += 1
+        struct.pack_into('<Q', self._mmap, self.SEQUENCE_OFFSET, self._sequence)
+
+    @classmethod
+    def read(cls, path: str, retries=100) -> dict:
+        """Reads a consistent status record from the given file.
+
+        Returns:
+          The status as dictionary or None if no consistent record
+          could be read.
+        """
+
+        with open(path, 'rb') as status_file:
+            with mmap.mmap(status_file.fileno(), cls.SIZE, mmap.MAP_SHARED, mmap.PROT_READ) as status_map:
+                for _ in range(retries):
+                    magic, version, _, sequence = cls.HEADER.unpack_from(status_map, 0)
+                    if magic != cls.MAGIC or version != cls.LAYOUT_VERSION:
+                        return None
+                    if sequence % 2:
+                        continue
+
+                    fields = cls.FIELDS.unpack_from(status_map, cls.FIELDS_OFFSET)
+                    if struct.unpack_from('<Q', status_map, cls.SEQUENCE_OFFSET)[0] != sequence:
+                        continue
+
+                    updated_at, timeout_deadline, sleep_time, state, active_app = fields
+                    return {
+                        'sequence': sequence,
+                        'updated_at': updated_at,
+                        'timeout_deadline': timeout_deadline or None,
+                        'sleep_time': bool(sleep_time),
+                        'state': state.rstrip(b'\0').decode('utf-8', 'replace'),
+                        'active_app': active_app.rstrip(b'\0').decode('utf-8', 'replace'),
+                    }
+
+        return None
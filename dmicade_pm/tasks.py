@@ -1,4 +1,4 @@
-from enum import Enum, auto
+from enum import Enum, IntEnum, auto
 
 
 class DmicTaskType(Enum):
@@ -12,6 +12,62 @@ class DmicTaskType(Enum):
     TIMEOUT = auto()
     SLEEP = auto()
     WAKE = auto()
+    RUN_JOB = auto()  # Handled by state machine.
+    CANCEL_JOB = auto()  # Handled by state machine.
+    JOB_PROGRESS = auto()
+    JOB_DONE = auto()
+    SET_VOLUME = auto()
+    SET_BUTTON_COLORS = auto()
+
+
+class DmicTaskPriority(IntEnum):
+    """Priority lanes of the state machines task queue.
+
+    Lower values get executed first. Tasks within the same lane keep
+    their queueing order.
+    """
+
+    INTERNAL = 0  # State machine bookkeeping, has to stay in order.
+    URGENT = 1
+    NORMAL = 2
+    BACKGROUND = 3
+
+
+TASK_PRIORITIES = {
+    DmicTaskType.CHANGE_STATE: DmicTaskPriority.INTERNAL,
+    DmicTaskType.SET_ACTIVE_APP: DmicTaskPriority.INTERNAL,
+    DmicTaskType.RUN_JOB: DmicTaskPriority.INTERNAL,
+    DmicTaskType.CANCEL_JOB: DmicTaskPriority.INTERNAL,
+    DmicTaskType.JOB_PROGRESS: DmicTaskPriority.INTERNAL,
+    DmicTaskType.JOB_DONE: DmicTaskPriority.INTERNAL,  # Must never be dropped, states wait for it.
+    DmicTaskType.APP_CRASHED: DmicTaskPriority.URGENT,
+    DmicTaskType.CLOSE_APP: DmicTaskPriority.URGENT,
+    DmicTaskType.INTERACTION: DmicTaskPriority.BACKGROUND,
+}
+
+
+class DmicCoalescePolicy(Enum):
+    """Policies for how a task is queued when tasks of its type are
+    already waiting in the task queue."""
+
+    APPEND = auto()  # Always queue the task.
+    DROP_IF_QUEUED = auto()  # Drop the task if any task of its type is queued.
+    DROP_IF_DUPLICATE = auto()  # Drop the task if a task with same type and data is queued.
+    KEEP_LATEST = auto()  # Replace the data of a queued task of same type.
+
+
+TASK_COALESCE_POLICIES = {
+    DmicTaskType.INTERACTION: DmicCoalescePolicy.DROP_IF_QUEUED,
+    DmicTaskType.START_APP: DmicCoalescePolicy.KEEP_LATEST,
+    DmicTaskType.CLOSE_APP: DmicCoalescePolicy.DROP_IF_DUPLICATE,
+    DmicTaskType.APP_CRASHED: DmicCoalescePolicy.DROP_IF_DUPLICATE,
+    DmicTaskType.TIMEOUT: DmicCoalescePolicy.DROP_IF_QUEUED,
+    DmicTaskType.SLEEP: DmicCoalescePolicy.DROP_IF_QUEUED,
+    DmicTaskType.WAKE: DmicCoalescePolicy.DROP_IF_QUEUED,
+    DmicTaskType.JOB_PROGRESS: DmicCoalescePolicy.KEEP_LATEST,
+    DmicTaskType.SET_VOLUME: DmicCoalescePolicy.KEEP_LATEST,
+    DmicTaskType.SET_BUTTON_COLORS: DmicCoalescePolicy.KEEP_LATEST,
+}
 
 
 class DmicTask:
@@ -20,8 +76,18 @@ class DmicTask:
     Attributes:
         dmic_task_type: A DmicTaskType indicating the type of the task.
         data: The tasks data.
+        priority: The DmicTaskPriority lane the task gets queued in.
+        coalesce_policy: The DmicCoalescePolicy used when queueing the task.
+        queued_at: Monotonic time the task was queued at.
+        started_at: Monotonic time the state machine took the task from the queue.
+        finished_at: Monotonic time the task was handled completely.
     """
 
     def __init__(self, dmic_task_type: DmicTaskType, data):
         self.type = dmic_task_type
         self.data = data
+        self.priority = TASK_PRIORITIES.get(dmic_task_type, DmicTaskPriority.NORMAL)
+        self.coalesce_policy = TASK_COALESCE_POLICIES.get(dmic_task_type, DmicCoalescePolicy.APPEND)
+        self.queued_at = None
+        self.started_at = None
+        self.finished_at = None
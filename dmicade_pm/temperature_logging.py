@@ -5,6 +5,8 @@ import datetime
 
 from .serial_connection import *
 
+logger = logging.getLogger(__name__)
+
 class DmicTemperatureLogging():
 
     def __init__(self, global_conf):
@@ -20,6 +22,9 @@ class DmicTemperatureLogging():
         self.logger = logging.getLogger('temp_logger') # First call creates new logger.
         self.logger.propagate = False # Do not pass logs to handlers of higher level (only own file handler).
 
+        self._start()
+
+    def _start(self):
         # Setup Temp Log Thread
         self.t = threading.Thread(target=self.temp_log_loop, daemon=True)
         self.t.name = 'TemperatureLoggingThread'
@@ -32,21 +37,34 @@ class DmicTemperatureLogging():
         file_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
         self.logger.addHandler(file_handler)
 
-    def temp_log_loop(self):
+    def _connect(self):
+        """Connects to the temperature port and starts the log file.
+
+        Blocks for a few seconds while the port opens.
+
+        Returns:
+          bool: Whether the port could be opened.
+        """
 
         self.serial_connector = DmicSerialConnector(self._port)
 
         if not self.serial_connector._connection:
-            logging.warning('[TEMPERATURE LOGGING] Could not connect..')
-            return
+            logger.warning('[TEMPERATURE LOGGING] Could not connect..')
+            return False
 
-        logging.info(f'[TEMPERATURE LOGGING] Connected! port={self._port}')
+        logger.info('[TEMPERATURE LOGGING] Connected! port=%s', self._port)
         self._logging_setup()
         self.logger.info('Start Temperature Logging...')
         
         initial_msg = self.serial_connector.read_data()
-        logging.info(f'[TEMPERATURE LOGGING] {initial_msg=}')
+        logger.info('[TEMPERATURE LOGGING] initial_msg=%r', initial_msg)
         self.logger.info('Initial Msg: ' + str(initial_msg))
+        return True
+
+    def temp_log_loop(self):
+
+        if not self._connect():
+            return
         
         while self.is_running:
             msg = self.serial_connector.read_data()
@@ -59,3 +77,48 @@ class DmicTemperatureLogging():
         self.is_running = False
         time.sleep(6)
         self.logger.handlers.clear()
+
+
+class DmicLoopTemperatureLogging(DmicTemperatureLogging):
+    """DmicTemperatureLogging reading the port from an asyncio event loop.
+
+    The port gets opened on the default executor, since opening it
+    blocks. Afterwards lines get logged from a reader callback as soon
+    as the port is readable instead of polling it every few seconds.
+    """
+
+    def __init__(self, global_conf, loop):
+        self._loop = loop
+        self._reading = False
+        super().__init__(global_conf)
+
+    def _start(self):
+        self._loop.call_soon_threadsafe(self._open_port)
+
+    def _open_port(self):
+        self._loop.run_in_executor(None, self._connect).add_done_callback(self._port_opened)
+
+    def _port_opened(self, future):
+        if future.exception():
+            logger.warning('[TEMPERATURE LOGGING] Could not connect: %s', future.exception())
+            return
+        if not future.result() or not self.is_running:
+            return
+
+        self._loop.add_reader(self.serial_connector.fileno(), self._read_line)
+        self._reading = True
+
+    def _read_line(self):
+        msg = self.serial_connector.read_data()
+        if len(msg) > 0:
+            self.logger.info(msg)
+
+    def _stop_reading(self):
+        if self._reading:
+            self._loop.remove_reader(self.serial_connector.fileno())
+            self._reading = False
+
+    def stop(self):
+        self.is_running = False
+        self._loop.call_soon_threadsafe(self._stop_reading)
+        self.logger.handlers.clear()
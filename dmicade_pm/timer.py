@@ -7,21 +7,38 @@ import subprocess
 
 from .helper import DmicEvent
 
+logger = logging.getLogger(__name__)
+
 
 class DmicTimer:
-    """Timer class for handling timeouts."""
+    """Timer class for handling timeouts.
+
+    Attributes:
+      alert_event : DmicEvent
+        Updated when the timer ran out.
+      changed_event : DmicEvent
+        Updated with the remaining seconds when the timer got set,
+        reset, stopped or ran out (None when not running anymore).
+    """
 
     TIMER_ACCURACY = 0.1
 
-    def __init__(self):
-        self.alert_event = DmicEvent()
+    def __init__(self, name='timer'):
+        self.alert_event = DmicEvent(f'{name}.alert')
+        self.changed_event = DmicEvent(f'{name}.changed')
         self._current_timer_length = 0
         self._elapsed_time = 0
+        self._deadline = None
 
         self._is_running = threading.Event()
         self._is_running.clear()
         self._restart_timer = False
 
+        self._start_timer()
+
+    def _start_timer(self):
+        """Starts the timer thread."""
+
         self._timer_thread = threading.Thread(target=self._timer, daemon=True)
         self._timer_thread.name = 'DmicTimerThread'
         self._timer_thread.start()
@@ -31,9 +48,19 @@ class DmicTimer:
 
         self._restart_timer = True
         self._current_timer_length = seconds
+        self._deadline = time.monotonic() + seconds
         if log:
-            logging.debug(f'[TIMER] Set timer to ({seconds})s.')
+            logger.debug('[TIMER] Set timer to (%s)s.', seconds)
         self._is_running.set()
+        self.changed_event.update(seconds)
+
+    def remaining(self):
+        """Returns the seconds until the timer runs out, None if not running."""
+
+        deadline = self._deadline
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.monotonic())
 
     def _timer(self):
         """Timer thread."""
@@ -56,7 +83,9 @@ class DmicTimer:
 
                 if self._elapsed_time > self._current_timer_length and not self._restart_timer:
                     self._is_running.clear()
-                    logging.info(f'[TIMER] Timer ran out! ({self._current_timer_length})s, invoke: {[f.__name__ for f in self.alert_event._subs]}\n')
+                    self._deadline = None
+                    self.changed_event.update(None)
+                    logger.info('[TIMER] Timer ran out! (%s)s, invoke: %s\n', self._current_timer_length, self.alert_event)
                     self.alert_event.update()
                 else:
                     time.sleep(self.TIMER_ACCURACY)
@@ -70,8 +99,10 @@ class DmicTimer:
     def stop(self):
         """Stops the timer."""
 
-        logging.debug('[TIMER] Stop timer.')
+        logger.debug('[TIMER] Stop timer.')
+        self._deadline = None
         self._is_running.clear()
+        self.changed_event.update(None)
 
 
 class SleepManager():
@@ -81,10 +112,10 @@ class SleepManager():
     CMD_SLEEP = 'rtcwake -m mem --date "%s"'
 
     def __init__(self, config):
-        self.entered_sleeptime_event = DmicEvent()
-        self.exit_sleeptime_event = DmicEvent()
-        self.notify_sleep_event = DmicEvent()
-        self.woke_up_event = DmicEvent()
+        self.entered_sleeptime_event = DmicEvent('sleep.entered_sleeptime')
+        self.exit_sleeptime_event = DmicEvent('sleep.exit_sleeptime')
+        self.notify_sleep_event = DmicEvent('sleep.notify')
+        self.woke_up_event = DmicEvent('sleep.woke_up')
 
         self._is_sleeping_time = False
         self._sleep_thread = None
@@ -95,20 +126,20 @@ class SleepManager():
 
         # Get sleep and wake time
         if not ('sleep_time' in config and 'wake_time' in config):
-            logging.warning('[SLEEP MANAGER] sleep_time and/or wake_time not set!')
+            logger.warning('[SLEEP MANAGER] sleep_time and/or wake_time not set!')
             return
 
         faulty_time_value = False
         try:
             self._st = datetime.datetime.strptime(config['sleep_time'], '%H:%M')
         except ValueError as ve:
-            logging.warning(f'[SLEEP MANAGER] sleep_{ve}')
+            logger.warning('[SLEEP MANAGER] sleep_%s', ve)
             faulty_time_value = True
 
         try:
             self._wt = datetime.datetime.strptime(config['wake_time'], '%H:%M')
         except ValueError as ve:
-            logging.warning(f'[SLEEP MANAGER] wake_{ve}')
+            logger.warning('[SLEEP MANAGER] wake_%s', ve)
             faulty_time_value = True
 
         if faulty_time_value:
@@ -117,14 +148,18 @@ class SleepManager():
         st = re.match(self.TIME_REGEX, config['sleep_time'])
         wt = re.match(self.TIME_REGEX, config['wake_time'])
         if not (st and wt):
-            logging.warning('[SLEEP MANAGER] sleep_time and/or wake_time not matching "hh:mm"!')
+            logger.warning('[SLEEP MANAGER] sleep_time and/or wake_time not matching "hh:mm"!')
             return
 
         self.sleep_time = int(st.group('hour'))%24 * 3600 + int(st.group('min')) * 60
         self.wake_time = int(wt.group('hour'))%24 * 3600 + int(wt.group('min')) * 60
-        logging.info(f'[SLEEP MANAGER] sleep_time: {config["sleep_time"]} (={self.sleep_time}s), wake_time: {config["wake_time"]} (={self.wake_time}s)')
+        logger.info('[SLEEP MANAGER] sleep_time: %s (=%ss), wake_time: %s (=%ss)', config["sleep_time"], self.sleep_time, config["wake_time"], self.wake_time)
+
+        self._start_time_checking()
+
+    def _start_time_checking(self):
+        """Starts the sleep time checking thread."""
 
-        # Start time checking.
         self._time_check_thread = threading.Thread(target=self._time_checking, daemon=True)
         self._time_check_thread.name = 'TimeCheckThread'
         self._time_check_thread.start() # TODO make start after full client init
@@ -133,17 +168,17 @@ class SleepManager():
         return self._is_sleeping_time
 
     def sleep_now(self):
-        logging.info('[SLEEP MANAGER] Start sleep mode!')
+        logger.info('[SLEEP MANAGER] Start sleep mode!')
 
         if self._sleep_thread and self._sleep_thread.is_alive():
-            logging.warning('[SLEEP MANAGER] Started sleep while sleep-thread still running!')
+            logger.warning('[SLEEP MANAGER] Started sleep while sleep-thread still running!')
 
         self._sleep_thread = threading.Thread(target=self._sleep)
         self._sleep_thread.name = 'SleepProcessThread'
         self._sleep_thread.start()
 
     def _sleep(self):
-        logging.debug('[SLEEP MANAGER] Run rtcwake...')
+        logger.debug('[SLEEP MANAGER] Run rtcwake...')
         # TODO set time correctly
 
         wake_datetime = datetime.datetime.now().replace(hour=self._wt.hour, minute=self._wt.minute, second=0)
@@ -153,31 +188,35 @@ class SleepManager():
 
         wake_datetime_str = wake_datetime.strftime('%Y-%m-%d %H:%M')
         sleep_cmd = self.CMD_SLEEP % wake_datetime_str
-        logging.debug(f'[SLEEP MANAGER] Run sleep cmd: {sleep_cmd}')
+        logger.debug('[SLEEP MANAGER] Run sleep cmd: %s', sleep_cmd)
         sp = subprocess.Popen(sleep_cmd, stdout=subprocess.PIPE, shell=True)
         sp.wait()
-        logging.info('[SLEEP MANAGER] Woke up!')
+        logger.info('[SLEEP MANAGER] Woke up!')
         self.woke_up_event.update()
 
     def _time_checking(self):
         """Sleep time checking thread function."""
 
-        logging.debug('[SLEEP MANAGER] Start time checking...')
+        logger.debug('[SLEEP MANAGER] Start time checking...')
 
         while True:
             time.sleep(self.notification_interval)
+            self._check_time()
 
-            logging.debug('[SLEEP MANAGER] Check time...')
+    def _check_time(self):
+        """Updates the sleeping time state and notifies when sleeping time."""
 
-            t = time.localtime()
-            now_s = t.tm_hour * 3600 + t.tm_min * 60 + t.tm_sec
-            if self._check_sleep_time(self.sleep_time, self.wake_time, now_s):
-                self._update_sleeping_time_state(True)
-            else:
-                self._update_sleeping_time_state(False)
+        logger.debug('[SLEEP MANAGER] Check time...')
 
-            if self._is_sleeping_time:
-                self.notify_sleep_event.update()
+        t = time.localtime()
+        now_s = t.tm_hour * 3600 + t.tm_min * 60 + t.tm_sec
+        if self._check_sleep_time(self.sleep_time, self.wake_time, now_s):
+            self._update_sleeping_time_state(True)
+        else:
+            self._update_sleeping_time_state(False)
+
+        if self._is_sleeping_time:
+            self.notify_sleep_event.update()
 
     def _check_sleep_time(self, sleep, wake, now, day_s=86400):
         """Checks if given time (now) is between sleep to wake time.
@@ -194,10 +233,77 @@ class SleepManager():
         # Trigger sleep state change events.
         if is_sleeping != self._is_sleeping_time:
             if is_sleeping:
-                logging.info('[SLEEP MANAGER] It is sleeping time...')
+                logger.info('[SLEEP MANAGER] It is sleeping time...')
                 self.entered_sleeptime_event.update()
             else:
-                logging.info('[SLEEP MANAGER] Wake up time!')
+                logger.info('[SLEEP MANAGER] Wake up time!')
                 self.exit_sleeptime_event.update()
 
         self._is_sleeping_time = is_sleeping
+
+
+class DmicLoopTimer(DmicTimer):
+    """DmicTimer driven by an asyncio event loop instead of a thread.
+
+    Safe to set, reset and stop from any thread.
+    """
+
+    def __init__(self, loop, name='timer'):
+        self._loop = loop
+        self._timer_handle = None
+        super().__init__(name)
+
+    def _start_timer(self):
+        pass
+
+    def set_timer(self, seconds: int, log=True):
+        """Starts and sets the timer to given seconds."""
+
+        self._current_timer_length = seconds
+        self._deadline = time.monotonic() + seconds
+        if log:
+            logger.debug('[TIMER] Set timer to (%s)s.', seconds)
+        self._loop.call_soon_threadsafe(self._schedule, seconds)
+        self.changed_event.update(seconds)
+
+    def stop(self):
+        """Stops the timer."""
+
+        logger.debug('[TIMER] Stop timer.')
+        self._deadline = None
+        self._loop.call_soon_threadsafe(self._cancel)
+        self.changed_event.update(None)
+
+    def _schedule(self, seconds):
+        self._cancel()
+        self._timer_handle = self._loop.call_later(seconds, self._alert)
+
+    def _cancel(self):
+        if self._timer_handle:
+            self._timer_handle.cancel()
+            self._timer_handle = None
+
+    def _alert(self):
+        self._timer_handle = None
+        self._deadline = None
+        self.changed_event.update(None)
+        logger.info('[TIMER] Timer ran out! (%s)s, invoke: %s\n', self._current_timer_length, self.alert_event)
+        self.alert_event.update()
+
+
+class DmicLoopSleepManager(SleepManager):
+    """SleepManager checking the sleep time from an asyncio event loop."""
+
+    def __init__(self, config, loop):
+        self._loop = loop
+        super().__init__(config)
+
+    def _start_time_checking(self):
+        self._loop.call_soon_threadsafe(self._schedule_time_check)
+
+    def _schedule_time_check(self):
+        self._loop.call_later(self.notification_interval, self._time_check_callback)
+
+    def _time_check_callback(self):
+        self._check_time()
+        self._schedule_time_check()
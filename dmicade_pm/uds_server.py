@@ -1,48 +1,299 @@
+import asyncio
+import codecs
+import json
 import os
 import os.path
+import selectors
 import socket
 import threading
+import time
 import warnings
 import logging
 
-from time import sleep
+from collections import deque
+from itertools import count, islice
 from .helper import DmicEvent
 
+logger = logging.getLogger(__name__)
+
+
+class DmicUdsConnection:
+    """A client connected to the UdsServer.
+
+    Outbound messages are queued in a bounded outbox and written by the
+    server when the socket is writable, several messages per sendmsg
+    call. When the outbox is full the oldest unsent message is dropped.
+
+    Attributes:
+      id : int
+        Running number of the connection, used in logs.
+      protocol : int
+        Protocol version negotiated with the client.
+      topics : set
+        Topics of outbound messages the client is subscribed to.
+      next_send_time : float
+        Monotonic time the next message may be sent to a legacy client.
+      queued_count, sent_count, dropped_count, batch_count : int
+        Counters of queued, sent and dropped messages and sendmsg calls.
+      acked_count, late_count, lost_count : int
+        Counters of acknowledged messages, acknowledgements arriving
+        after the late timeout and messages never acknowledged.
+    """
+
+    def __init__(self, conn: socket.socket, connection_id: int, topics, max_outbox_length: int):
+        self.id = connection_id
+        self.protocol = UdsServer.PROTOCOL_LEGACY
+        self.topics = set(topics)
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.partial_message = [] # Text received after the last complete message.
+        self.partial_length = 0
+        self.discarding = False # Skips the rest of a too long message.
+        self.next_send_time = 0.0
+        self.closed = False
+
+        self.queued_count = 0
+        self.sent_count = 0
+        self.dropped_count = 0
+        self.batch_count = 0
+        self.acked_count = 0
+        self.late_count = 0
+        self.lost_count = 0
+
+        self._pending_acks = dict() # correlation id -> (message type, queued time)
+        self._conn = conn
+        self._fileno = conn.fileno()
+        self._outbox = deque()
+        self._max_outbox_length = max_outbox_length
+        self._head_partially_sent = False
+        self._outbox_lock = threading.Lock()
+
+    def fileno(self):
+        """Returns the file descriptor the connection was opened with."""
+
+        return self._fileno
+
+    def queue(self, frame: bytes):
+        """Queues an encoded message for sending without blocking."""
+
+        with self._outbox_lock:
+            if len(self._outbox) >= self._max_outbox_length:
+                # Never drop a message that was partially sent already, it would corrupt the stream.
+                del self._outbox[1 if self._head_partially_sent else 0]
+                self.dropped_count += 1
+            self._outbox.append(frame)
+            self.queued_count += 1
+
+    def has_pending(self) -> bool:
+        return len(self._outbox) > 0
+
+    def flush(self, max_messages: int) -> bool:
+        """Writes queued messages to the socket in a single sendmsg call.
+
+        Args:
+          max_messages: int
+            Maximum amount of messages to write.
+
+        Returns:
+          True if the socket could not take all written messages.
+        """
+
+        # The send and the removal of sent frames happen in one critical
+        # section, so 'queue' never drops a frame that is being written.
+        # The socket is non-blocking, sendmsg returns right away.
+        with self._outbox_lock:
+            frames = list(islice(self._outbox, max_messages))
+            if not frames:
+                return False
+
+            try:
+                bytes_sent = self._conn.sendmsg(frames)
+            except BlockingIOError:
+                return True
+
+            self.batch_count += 1
+            blocked = bytes_sent < sum(len(frame) for frame in frames)
+
+            while bytes_sent > 0:
+                frame = self._outbox[0]
+                if len(frame) > bytes_sent:
+                    self._outbox[0] = frame[bytes_sent:]
+                    self._head_partially_sent = True
+                    break
+
+                bytes_sent -= len(frame)
+                self._outbox.popleft()
+                self._head_partially_sent = False
+                self.sent_count += 1
+
+        return blocked
+
+    def await_ack(self, correlation_id: int, message_type: str):
+        """Starts waiting for the client to acknowledge a message."""
+
+        with self._outbox_lock:
+            self._pending_acks[correlation_id] = (message_type, time.monotonic())
+
+    def acknowledge(self, correlation_id: int, late_timeout: float):
+        """Handles the acknowledgement of a message.
+
+        Returns:
+          Tuple (message type, round trip seconds) or None if no message
+          with the correlation id is awaited.
+        """
+
+        with self._outbox_lock:
+            pending = self._pending_acks.pop(correlation_id, None)
+            if pending is None:
+                return None
+
+            message_type, queued_time = pending
+            round_trip_time = time.monotonic() - queued_time
+            self.acked_count += 1
+            if round_trip_time > late_timeout:
+                self.late_count += 1
+            return message_type, round_trip_time
+
+    def expire_acks(self, lost_timeout: float):
+        """Stops waiting for acknowledgements older than the timeout.
+
+        Returns:
+          List of message types that were never acknowledged.
+        """
+
+        expire_time = time.monotonic() - lost_timeout
+        with self._outbox_lock:
+            lost = [i for i, (_, queued_time) in self._pending_acks.items() if queued_time < expire_time]
+            lost_types = [self._pending_acks.pop(i)[0] for i in lost]
+            self.lost_count += len(lost_types)
+        return lost_types
+
+    def recv_into(self, buffer) -> int:
+        return self._conn.recv_into(buffer)
+
+    def close(self):
+        try:
+            self._conn.shutdown(socket.SHUT_WR)
+        except socket.error:
+            pass
+        self._conn.close()
+
+    def stats(self) -> dict:
+        """Returns the connections counters as json serializable dictionary."""
+
+        return {
+            'protocol': self.protocol,
+            'topics': sorted(self.topics),
+            'pending': len(self._outbox),
+            'queued': self.queued_count,
+            'sent': self.sent_count,
+            'dropped': self.dropped_count,
+            'batches': self.batch_count,
+            'awaiting_ack': len(self._pending_acks),
+            'acked': self.acked_count,
+            'late': self.late_count,
+            'lost': self.lost_count,
+        }
+
+    def __str__(self):
+        return f'client {self.id} (protocol {self.protocol}, topics: {sorted(self.topics)})'
+
 
 class UdsServer:
     """Unix Domain Socket Server for dmicade process manager.
 
     Will disable core functionalities on Windows.
 
+    Accepts any number of clients (UI, control tools, monitoring) on a
+    single selector thread. Clients can disconnect and reconnect at
+    any time. Outbound messages are sent to all clients subscribed to
+    the messages topic, new clients are subscribed to 'ui'. Clients
+    change their subscriptions with 'subscribe:<topic>[,<topic>...]'
+    and 'unsubscribe:<topic>[,<topic>...]'.
+
+    Sending never blocks the caller. Messages are queued per client and
+    written from the server thread once the client is writable.
+
+    Clients start with the legacy protocol (version 1), where every
+    recv is one message and sends are spaced out by a short delay.
+    A client sending 'protocol:<version>' as its first message
+    negotiates the framed protocol (version 2): the server answers with
+    'protocol:<agreed version>' and from then on every message in both
+    directions is terminated by a newline, so sends need no delay.
+    Clients negotiating version 3 additionally get messages sent with
+    'track_ack' suffixed with '#<correlation id>' and answer them with
+    'ack:<correlation id>'. The round trip times get recorded as
+    'ui_rtt:<message type>' in the metrics, acknowledgements after
+    ACK_LATE_TIMEOUT count as late and messages without one after
+    ACK_LOST_TIMEOUT as lost.
+
+    Queries registered with 'register_query' get answered only to the
+    requesting client with '<query>:<json result>'.
+
     Attributes:
       connected_event : DmicEvent
-        Event handler that is raised when the server successfully
-        connects to a client.
+        Event handler that is raised with the DmicUdsConnection when a
+        client connects.
       received_event : DmicEvent
         Event handler that is raised when the server receives a message
-        from the client when connected.
+        from any client.
       disconnected_event : DmicEvent
-        Event handler that is raised when the server gets disconnected
-        from the client.
+        Event handler that is raised with the DmicUdsConnection when a
+        client disconnects.
     """
 
-    """Client timeout time used as interval for checking for received
-    messages."""
+    """Interval for checking if the server got closed."""
     CLIENT_TIMEOUT = 0.5
 
-    def __init__(self, socket_path):
-        self.connected_event = DmicEvent()
-        self.received_event = DmicEvent()
-        self.disconnected_event = DmicEvent()
-
-        self._connected = False
+    BACKLOG = 8
+    MAX_OUTBOX_LENGTH = 256 # Queued messages per client before dropping the oldest.
+    MAX_BATCH_MESSAGES = 64 # Messages written per sendmsg call.
+    RECEIVE_BUFFER_SIZE = 4096
+    MAX_MESSAGE_LENGTH = 65536 # Partial messages growing longer get discarded.
+    DEFAULT_TOPICS = ('ui',)
+
+    PROTOCOL_LEGACY = 1
+    PROTOCOL_FRAMED = 2
+    PROTOCOL_CORRELATED = 3
+    PROTOCOL_VERSION = PROTOCOL_CORRELATED # Highest supported version.
+    PROTOCOL_MESSAGE = 'protocol'
+    ACK_MESSAGE = 'ack'
+    CORRELATION_SEPARATOR = '#'
+    ACK_LATE_TIMEOUT = 1.0
+    ACK_LOST_TIMEOUT = 10.0
+    QUERY_SEPARATOR = ':'
+    SUBSCRIBE_MESSAGE = 'subscribe'
+    UNSUBSCRIBE_MESSAGE = 'unsubscribe'
+    FRAME_DELIMITER = '\n'
+    LEGACY_SEND_DELAY = 0.05
+
+    def __init__(self, socket_path, metrics=None):
+        self.connected_event = DmicEvent('uds.connected')
+        self.received_event = DmicEvent('uds.received')
+        self.disconnected_event = DmicEvent('uds.disconnected')
 
         self._socket_path = socket_path
+        self._metrics = metrics
+        self._correlation_ids = count(1)
+        self._query_handlers = dict()
+        self._next_ack_check = 0.0
         self._server_socket = None
-        self._client_conn = None
+        self._selector = None
+        self._is_running = False
+
+        self._connections = dict()
+        self._connections_lock = threading.Lock()
+        self._connection_count = 0
 
-        self._receive_thread = None
-        self._connect_thread = None
+        # Shared by all clients, receiving only happens on the server thread.
+        self._receive_buffer = bytearray(self.RECEIVE_BUFFER_SIZE)
+        self._receive_view = memoryview(self._receive_buffer)
+
+        self._serve_thread = None
+        self._wake_socket = None
+        self._wake_socket_r = None
+        # Guarded by the connections lock, clients get dropped from other threads.
+        self._pending_flushes = set()
+        self._scheduled_flushes = dict()
 
         if os.name == 'nt':
             warnings.warn('Uds socket functionalities are is disabled on Windows.')
@@ -50,120 +301,527 @@ class UdsServer:
 
         self._server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
         if os.path.exists(self._socket_path):
-            logging.debug('[UDS SERVER] Deleting old socket file...')
+            logger.debug('[UDS SERVER] Deleting old socket file...')
             os.remove(self._socket_path)
         self._server_socket.bind(self._socket_path)
 
-        # Start receive when connected.
-        self._receive_thread = threading.Thread(target=self._receive_continuous)
-        self._receive_thread.name = 'receive_thread'
-        self.connected_event += lambda arg: self._receive_thread.start()
-
     def start(self):
         """Starts the server in its separate thread.
 
-        At first it starts listening for a connection on a separate
-        thread.
-        If a client connected the receive thread is started and raises
-        the 'received_event' when a message from the client is received.
+        The server thread accepts connecting clients and raises the
+        'received_event' for every message received from any client.
         Will do nothing on Windows.
         """
 
         if os.name == 'nt':
             warnings.warn('Uds socket functionalities are is disabled on Windows.')
+            return
 
-        else:
-            self._connect_thread = threading.Thread(target=self._connect, daemon=True)
-            self._connect_thread.start()
+        self._server_socket.listen(self.BACKLOG)
+        self._is_running = True
+        self._selector = selectors.DefaultSelector()
+        self._register(self._server_socket, self._accept_client)
+
+        # Lets other threads wake the selector when messages got queued.
+        self._wake_socket_r, self._wake_socket = socket.socketpair()
+        self._wake_socket_r.setblocking(False)
+        self._wake_socket.setblocking(False)
+        self._register(self._wake_socket_r, self._on_wake)
+
+        self._serve_thread = threading.Thread(target=self._serve, daemon=True)
+        self._serve_thread.name = 'UdsServerThread'
+        self._serve_thread.start()
 
     def close(self):
-        """Disconnects the server socket and stops its threads.
+        """Disconnects all clients and stops the server."""
 
-        Only tries to close the connection if the server is currently
-        connected.
-        """
+        self._is_running = False
+        self._wake()
 
-        if self.is_connected():
-            try:
-                self._client_conn.shutdown(socket.SHUT_WR)
-                self._client_conn.close()
-            except socket.error:
-                logging.warning('[UDS SERVER] Shutdown failed.')
-                pass
+        with self._connections_lock:
+            connections = list(self._connections.values())
+        for connection in connections:
+            self._drop_client(connection)
 
-            self._connected = False
+    def send(self, message, return_zero_on_windows=False, topic='ui', track_ack=False):
+        """Queues a message for all clients subscribed to the topic.
 
-    def send(self, message, return_zero_on_windows=False):
-        """Sends a message to the connected client.
+        Does not block, the messages are written by the server thread.
 
         Args:
           message: str
-            The message to send to the client.
+            The message to send to the clients.
           return_zero_on_windows: bool
             If true message always returns 0 when run on windows.
+          topic: str
+            Topic of the message.
+          track_ack: bool
+            If true clients supporting correlation ids are expected to
+            acknowledge the message.
 
         Returns:
-          The amount of bytes sent to the client.
+          The amount of bytes queued for all clients.
         """
 
-        bytes_sent = 0
+        bytes_queued = 0
 
         if os.name == 'nt':
             if not return_zero_on_windows:
-                bytes_sent = len(message)
-            warnings.warn(f'UDS Server will not send msg on windows. Returning: {bytes_sent}')
+                bytes_queued = len(message)
+            warnings.warn(f'UDS Server will not send msg on windows. Returning: {bytes_queued}')
+            return bytes_queued
 
-        elif self.is_connected():
-            bytes_sent = self._client_conn.send(message.encode('ascii'))
+        correlation_id = next(self._correlation_ids) if track_ack else None
+        frames = dict()
+        for connection in self._subscribers(topic):
+            if connection.protocol not in frames:
+                frames[connection.protocol] = self._encode(message, connection.protocol, correlation_id)
 
-        sleep(0.05) # Simple fix to avoid messages getting munched together when send in quick succession...
+            if track_ack and connection.protocol >= self.PROTOCOL_CORRELATED:
+                connection.await_ack(correlation_id, message.partition(':')[0])
+            connection.queue(frames[connection.protocol])
+            bytes_queued += len(frames[connection.protocol])
+            self._request_flush(connection)
 
-        return bytes_sent
+        return bytes_queued
 
-    def _connect(self):
-        """Synchronously listens for a client to connect."""
+    def register_query(self, name: str, handler):
+        """Answers the query message 'name' with the handlers result.
 
-        self._server_socket.listen(1)
-        self._client_conn, addr = self._server_socket.accept()
-        self._client_conn.settimeout(self.CLIENT_TIMEOUT)
+        Args:
+          name: str
+            Message the query is requested with.
+          handler:
+            Callable without arguments returning a json serializable
+            result. Gets called on the server thread.
+        """
+
+        self._query_handlers[name] = handler
 
-        self._connected = True
-        self.connected_event.update()
+    def dump_stats(self) -> dict:
+        """Returns the outbound counters of all clients as json serializable dictionary."""
 
-    def _receive_continuous(self):
-        """Synchronously checks for received messages from the client.
+        return {str(c.id): c.stats() for c in self.connections()}
+
+    def is_connected(self):
+        """Checks if any client is connected to the server.
 
-        Checks for a new message every time the recv times out.
-        Updates the received event when message was received.
-        Closes the connection when a socket error occurs or a message
-        length of 0 is received.
+        Returns:
+          True if at least one client is currently connected.
         """
 
-        while self.is_connected():
-            try:
-                rec_msg = self._client_conn.recv(1024)
-                msg = rec_msg.decode('ascii')
+        return len(self._connections) > 0
 
-                # Close server when msg length of 0 is received indication a closed connection.
-                if len(msg) == 0:
-                    logging.info('[UDS SERVER] Connection closed by remote host.')
-                    self.close()
-                    break
+    def connections(self):
+        """Returns all currently connected clients."""
 
-                logging.debug(f'[UDS SERVER] Received: {msg=}')
-                self.received_event.update(msg)
+        with self._connections_lock:
+            return list(self._connections.values())
 
-            except socket.timeout:
-                continue
-            except socket.error as e:
-                logging.exception(f'[UDS SERVER] receive exception raised: {e}')
-                self.close()
+    def _subscribers(self, topic):
+        with self._connections_lock:
+            return [c for c in self._connections.values() if topic in c.topics]
 
-    def is_connected(self):
-        """Checks if server is connected to a client.
+    def _encode(self, message, protocol, correlation_id=None):
+        if correlation_id and protocol >= self.PROTOCOL_CORRELATED:
+            message += f'{self.CORRELATION_SEPARATOR}{correlation_id}'
+        if protocol >= self.PROTOCOL_FRAMED:
+            message += self.FRAME_DELIMITER
+        return message.encode('utf-8')
 
-        Returns:
-          True if server is currently connected to a client.
+    def _check_acks(self):
+        """Counts messages that were not acknowledged in time as lost."""
+
+        for connection in self.connections():
+            for message_type in connection.expire_acks(self.ACK_LOST_TIMEOUT):
+                logger.warning('[UDS SERVER] %s did not acknowledge: %s', connection, message_type)
+
+    def _acknowledge(self, connection: DmicUdsConnection, data):
+        try:
+            acknowledged = connection.acknowledge(int(data), self.ACK_LATE_TIMEOUT)
+        except ValueError:
+            acknowledged = None
+
+        if acknowledged is None:
+            logger.debug('[UDS SERVER] Unexpected ack from client %s: %r', connection.id, data)
+            return
+
+        message_type, round_trip_time = acknowledged
+        if round_trip_time > self.ACK_LATE_TIMEOUT:
+            logger.warning('[UDS SERVER] Late ack of %s from client %s: %.3fs', message_type, connection.id, round_trip_time)
+        if self._metrics:
+            self._metrics.record(f'ui_rtt:{message_type}', round_trip_time)
+
+    def _serve(self):
+        """Server thread function dispatching socket readiness."""
+
+        while self._is_running:
+            timeout = self.CLIENT_TIMEOUT
+            with self._connections_lock:
+                if self._scheduled_flushes:
+                    timeout = max(0, min(timeout, min(self._scheduled_flushes.values()) - time.monotonic()))
+
+            for key, events in self._selector.select(timeout):
+                on_readable, on_writable = key.data
+                if events & selectors.EVENT_READ:
+                    on_readable()
+                if events & selectors.EVENT_WRITE and on_writable:
+                    on_writable()
+
+            now = time.monotonic()
+            with self._connections_lock:
+                due = [connection for connection, flush_time in self._scheduled_flushes.items() if flush_time <= now]
+                for connection in due:
+                    del self._scheduled_flushes[connection]
+            for connection in due:
+                self._flush(connection)
+
+            if now >= self._next_ack_check:
+                self._next_ack_check = now + self.CLIENT_TIMEOUT
+                self._check_acks()
+
+        self._selector.close()
+        self._wake_socket_r.close()
+        self._wake_socket.close()
+
+    def _register(self, sock, on_readable, on_writable=None):
+        """Calls the callbacks whenever the socket becomes readable or writable."""
+
+        self._selector.register(sock, selectors.EVENT_READ, (on_readable, on_writable))
+
+    def _unregister(self, fileno):
+        try:
+            self._selector.unregister(fileno)
+        except (KeyError, ValueError):
+            pass
+
+    def _wake(self):
+        """Wakes the server thread from waiting in select."""
+
+        try:
+            self._wake_socket.send(b'\0')
+        except (BlockingIOError, AttributeError, OSError):
+            pass # Already woken, not started or closed.
+
+    def _on_wake(self):
+        try:
+            while self._wake_socket_r.recv(1024):
+                pass
+        except BlockingIOError:
+            pass
+
+        with self._connections_lock:
+            connections, self._pending_flushes = self._pending_flushes, set()
+        for connection in connections:
+            self._flush(connection)
+
+    def _request_flush(self, connection: DmicUdsConnection):
+        """Lets the server thread write the connections queued messages."""
+
+        with self._connections_lock:
+            self._pending_flushes.add(connection)
+        self._wake()
+
+    def _schedule_flush(self, connection: DmicUdsConnection, delay):
+        with self._connections_lock:
+            self._scheduled_flushes[connection] = time.monotonic() + delay
+
+    def _cancel_scheduled_flush(self, connection: DmicUdsConnection):
+        with self._connections_lock:
+            self._scheduled_flushes.pop(connection, None)
+
+    def _set_writable_callback(self, connection: DmicUdsConnection, enabled):
+        """Enables or disables flushing the connection when it becomes writable."""
+
+        try:
+            key = self._selector.get_key(connection.fileno())
+        except (KeyError, ValueError):
+            return
+
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if enabled else 0)
+        if key.events != events:
+            self._selector.modify(connection.fileno(), events, key.data)
+
+    def _flush(self, connection: DmicUdsConnection):
+        """Writes queued messages of a connection, called from the server thread.
+
+        Legacy clients get one message at a time, spaced out by the
+        legacy send delay.
+        """
+
+        if connection.closed:
+            return
+
+        max_messages = self.MAX_BATCH_MESSAGES
+        if connection.protocol == self.PROTOCOL_LEGACY:
+            delay = connection.next_send_time - time.monotonic()
+            if delay > 0:
+                self._set_writable_callback(connection, False)
+                self._schedule_flush(connection, delay)
+                return
+            max_messages = 1
+
+        try:
+            blocked = connection.flush(max_messages)
+        except socket.error as e:
+            logger.warning('[UDS SERVER] Send to %s failed: %s', connection, e)
+            self._drop_client(connection)
+            return
+
+        self._set_writable_callback(connection, blocked)
+        if connection.protocol == self.PROTOCOL_LEGACY:
+            connection.next_send_time = time.monotonic() + self.LEGACY_SEND_DELAY
+            if not blocked and connection.has_pending():
+                self._schedule_flush(connection, self.LEGACY_SEND_DELAY)
+        elif not blocked and connection.has_pending():
+            self._request_flush(connection)
+
+    def _accept_client(self):
+        """Accepts a pending client connection."""
+
+        conn, addr = self._server_socket.accept()
+        conn.setblocking(False)
+
+        with self._connections_lock:
+            self._connection_count += 1
+            connection = DmicUdsConnection(conn, self._connection_count, self.DEFAULT_TOPICS, self.MAX_OUTBOX_LENGTH)
+            self._connections[connection.fileno()] = connection
+
+        self._register(conn, lambda: self._receive_once(connection), lambda: self._flush(connection))
+        logger.info('[UDS SERVER] Connected: %s', connection)
+        self.connected_event.update(connection)
+
+    def _drop_client(self, connection: DmicUdsConnection):
+        """Closes a client connection. Does nothing if already closed."""
+
+        with self._connections_lock:
+            if connection.closed:
+                return
+            connection.closed = True
+            self._connections.pop(connection.fileno(), None)
+            self._pending_flushes.discard(connection)
+
+        self._cancel_scheduled_flush(connection)
+        connection.expire_acks(0)
+        self._unregister(connection.fileno())
+        try:
+            connection.close()
+        except socket.error:
+            logger.warning('[UDS SERVER] Shutdown failed.')
+
+        logger.info('[UDS SERVER] Disconnected: %s', connection)
+        self.disconnected_event.update(connection)
+
+    def _receive_once(self, connection: DmicUdsConnection):
+        """Receives and publishes messages from a readable client."""
+
+        try:
+            bytes_received = connection.recv_into(self._receive_view)
+
+            # Close connection when msg length of 0 is received indication a closed connection.
+            if bytes_received == 0:
+                logger.info('[UDS SERVER] Connection closed by remote host.')
+                self._drop_client(connection)
+                return
+
+            # Keeps incomplete utf-8 sequences until the rest arrives, invalid bytes get replaced.
+            msg = connection.decoder.decode(self._receive_view[:bytes_received])
+            if not msg:
+                return
+
+            logger.debug('[UDS SERVER] Received from client %s: msg=%r', connection.id, msg)
+            self._handle_received(connection, msg)
+
+        except (socket.timeout, BlockingIOError):
+            pass
+        except socket.error as e:
+            if not connection.closed:
+                logger.exception('[UDS SERVER] receive exception raised: %s', e)
+            self._drop_client(connection)
+
+    def _handle_received(self, connection: DmicUdsConnection, data):
+        """Splits received data into messages and handles them.
+
+        Legacy clients get every received chunk handled as one message
+        until they negotiate the framed protocol. Framed messages get
+        reassembled from partial and merged chunks.
         """
 
-        return self._connected
+        if connection.protocol == self.PROTOCOL_LEGACY:
+            if not data.startswith(self.PROTOCOL_MESSAGE + ':'):
+                self._handle_message(connection, data)
+                return
+
+            hello, _, data = data.partition(self.FRAME_DELIMITER)
+            self._negotiate_protocol(connection, hello)
+            if connection.protocol == self.PROTOCOL_LEGACY:
+                return
+
+        if self.FRAME_DELIMITER not in data:
+            connection.partial_message.append(data)
+            connection.partial_length += len(data)
+            if connection.partial_length > self.MAX_MESSAGE_LENGTH:
+                logger.warning('[UDS SERVER] Discard message from client %s longer than %s characters.', connection.id, self.MAX_MESSAGE_LENGTH)
+                connection.partial_message.clear()
+                connection.partial_length = 0
+                connection.discarding = True
+            return
+
+        if connection.partial_message:
+            connection.partial_message.append(data)
+            data = ''.join(connection.partial_message)
+            connection.partial_message.clear()
+
+        *messages, rest = data.split(self.FRAME_DELIMITER)
+        if rest:
+            connection.partial_message.append(rest)
+        connection.partial_length = len(rest)
+
+        if connection.discarding:
+            connection.discarding = False
+            messages = messages[1:]
+
+        for message in messages:
+            if message:
+                self._handle_message(connection, message)
+
+    def _handle_message(self, connection: DmicUdsConnection, message):
+        """Handles acknowledgements, queries and subscriptions, publishes all other messages."""
+
+        msg_type, _, data = message.partition(':')
+        if msg_type == self.ACK_MESSAGE:
+            self._acknowledge(connection, data)
+            return
+
+        if msg_type in self._query_handlers:
+            self._answer_query(connection, msg_type)
+            return
+
+        if msg_type not in (self.SUBSCRIBE_MESSAGE, self.UNSUBSCRIBE_MESSAGE):
+            self.received_event.update(message)
+            return
+
+        topics = {topic for topic in data.split(',') if topic}
+        if msg_type == self.SUBSCRIBE_MESSAGE:
+            connection.topics |= topics
+        else:
+            connection.topics -= topics
+        logger.info('[UDS SERVER] Subscriptions changed: %s', connection)
+
+    def _answer_query(self, connection: DmicUdsConnection, name):
+        """Sends the result of a query to the requesting client."""
+
+        logger.debug('[UDS SERVER] Query from client %s: %s', connection.id, name)
+        try:
+            result = self._query_handlers[name]()
+        except Exception as e:
+            logger.exception('[UDS SERVER] Query %s raised: %s', name, e)
+            result = {'error': repr(e)}
+
+        answer = f'{name}{self.QUERY_SEPARATOR}{json.dumps(result, separators=(",", ":"), default=str)}'
+        connection.queue(self._encode(answer, connection.protocol))
+        self._flush(connection)
+
+    def _negotiate_protocol(self, connection: DmicUdsConnection, hello):
+        """Agrees on the highest protocol version supported by both sides."""
+
+        try:
+            requested_version = int(hello.partition(':')[2])
+        except ValueError:
+            logger.warning('[UDS SERVER] Invalid protocol message: %r', hello)
+            return
+
+        connection.protocol = max(self.PROTOCOL_LEGACY, min(requested_version, self.PROTOCOL_VERSION))
+        logger.info('[UDS SERVER] Client %s requested protocol %s, using: %s', connection.id, requested_version, connection.protocol)
+        connection.queue(self._encode(f'{self.PROTOCOL_MESSAGE}:{connection.protocol}', connection.protocol))
+        self._flush(connection)
+
+
+class DmicLoopUdsServer(UdsServer):
+    """UdsServer driven by an asyncio event loop instead of a thread.
+
+    Uses the same accept and receive handlers, called from reader
+    callbacks of the loop when the sockets become readable.
+    """
+
+    def __init__(self, socket_path, loop, metrics=None):
+        self._loop = loop
+        super().__init__(socket_path, metrics)
+
+    def start(self):
+        """Starts accepting clients on the event loop."""
+
+        if os.name == 'nt':
+            warnings.warn('Uds socket functionalities are is disabled on Windows.')
+            return
+
+        self._server_socket.listen(self.BACKLOG)
+        self._server_socket.setblocking(False)
+        self._is_running = True
+        self._register(self._server_socket, self._accept_client)
+        self._call_on_loop(self._check_acks_periodically)
+
+    def close(self):
+        super().close()
+
+        if self._server_socket and not self._loop.is_closed():
+            self._unregister(self._server_socket.fileno())
+
+    def _call_on_loop(self, callback, *args):
+        """Calls the callback on the loop thread, directly if already on it."""
+
+        try:
+            on_loop_thread = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop_thread = False
+
+        if on_loop_thread:
+            callback(*args)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    def _register(self, sock, on_readable, on_writable=None):
+        self._call_on_loop(self._loop.add_reader, sock.fileno(), on_readable)
+
+    def _unregister(self, fileno):
+        self._call_on_loop(self._loop.remove_writer, fileno)
+        self._call_on_loop(self._loop.remove_reader, fileno)
+
+    def _drop_client(self, connection: DmicUdsConnection):
+        # Readers have to be removed on the loop before the socket gets closed.
+        if self._loop.is_closed():
+            super()._drop_client(connection)
+        else:
+            self._call_on_loop(super()._drop_client, connection)
+
+    def _check_acks_periodically(self):
+        if self._is_running:
+            self._check_acks()
+            self._loop.call_later(self.CLIENT_TIMEOUT, self._check_acks_periodically)
+
+    def _wake(self):
+        pass
+
+    def _request_flush(self, connection: DmicUdsConnection):
+        if not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._flush, connection)
+
+    def _schedule_flush(self, connection: DmicUdsConnection, delay):
+        # Only touched on the loop, keeps one timer per connection.
+        if connection not in self._scheduled_flushes:
+            self._scheduled_flushes[connection] = self._loop.call_later(delay, self._run_scheduled_flush, connection)
+
+    def _run_scheduled_flush(self, connection: DmicUdsConnection):
+        self._scheduled_flushes.pop(connection, None)
+        self._flush(connection)
+
+    def _cancel_scheduled_flush(self, connection: DmicUdsConnection):
+        timer = self._scheduled_flushes.pop(connection, None)
+        if timer:
+            timer.cancel()
+
+    def _set_writable_callback(self, connection: DmicUdsConnection, enabled):
+        if enabled:
+            self._loop.add_writer(connection.fileno(), self._flush, connection)
+        else:
+            self._loop.remove_writer(connection.fileno())
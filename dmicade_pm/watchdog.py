@@ -0,0 +1,126 @@
+import datetime
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+
+class DmicWatchdog:
+    """Watches activities like task handling for running over budget.
+
+    An activity is registered with 'begin' and unregistered with 'end'.
+    When an activity runs longer than its budget, the stacks of all
+    threads get written to a diagnostics file in the log folder once
+    for that activity.
+
+    The watch thread sleeps until the earliest budget of the watched
+    activities runs out, or until 'begin' adds an activity.
+    """
+
+    FILE_NAME_FORMAT = 'DMIC-PM-DIAG-%s.log'
+    DATE_FORMAT = r'%Y%m%d-%H%M%S'
+
+    def __init__(self, global_config):
+        self.budget = float(global_config.get('watchdog_budget', 5))
+        self.job_budget = float(global_config.get('watchdog_job_budget', 30))
+        self.dump_count = 0
+
+        log_folder = global_config.get('logs', './logs')
+        file_name = self.FILE_NAME_FORMAT % datetime.datetime.now().strftime(self.DATE_FORMAT)
+        self.diagnostics_file = os.path.join(log_folder, file_name)
+
+        self._activities = dict()
+        self._activities_changed = threading.Condition()
+
+        if self.budget <= 0:
+            logger.info('[WATCHDOG] Disabled.')
+            return
+
+        self._watch_thread = threading.Thread(target=self._watch, daemon=True)
+        self._watch_thread.name = 'WatchdogThread'
+        self._watch_thread.start()
+
+    def begin(self, key, description, budget=None):
+        """Starts watching an activity.
+
+        Args:
+          key:
+            Unique key of the activity, used to end it.
+          description: str
+            Description written to the diagnostics file.
+          budget: float
+            Seconds the activity may take. Uses the default budget when None.
+        """
+
+        with self._activities_changed:
+            self._activities[key] = [description, time.monotonic(), budget or self.budget, False]
+            self._activities_changed.notify()
+
+    def end(self, key):
+        """Stops watching an activity."""
+
+        with self._activities_changed:
+            self._activities.pop(key, None)
+
+    def _watch(self):
+        """Watchdog thread function."""
+
+        while True:
+            with self._activities_changed:
+                overdue = self._wait_for_overdue()
+
+            for description, elapsed, budget in overdue:
+                self._dump_stacks(description, elapsed, budget)
+
+    def _wait_for_overdue(self):
+        """Waits until activities run over budget and marks them reported.
+
+        Has to be called holding the activities lock.
+
+        Returns:
+          list: Description, elapsed seconds and budget of every overdue activity.
+        """
+
+        while True:
+            now = time.monotonic()
+            overdue = []
+            next_deadline = None
+            for activity in self._activities.values():
+                description, start_time, budget, reported = activity
+                if reported:
+                    continue
+                if now - start_time > budget:
+                    activity[3] = True
+                    overdue.append((description, now - start_time, budget))
+                elif next_deadline is None or start_time + budget < next_deadline:
+                    next_deadline = start_time + budget
+
+            if overdue:
+                return overdue
+            self._activities_changed.wait(None if next_deadline is None else next_deadline - now)
+
+    def _dump_stacks(self, description, elapsed, budget):
+        """Writes the stacks of all threads to the diagnostics file."""
+
+        logger.warning('[WATCHDOG] Over budget (%.2fs > %ss): %s. Dump stacks to: %s', elapsed, budget, description, self.diagnostics_file)
+        self.dump_count += 1
+
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        lines = [
+            f'=== {datetime.datetime.now().isoformat()} ===',
+            f'Activity: {description}',
+            f'Elapsed: {elapsed:.3f}s (budget: {budget}s)',
+        ]
+        for thread_id, frame in sys._current_frames().items():
+            lines.append(f'\n--- Thread: {thread_names.get(thread_id, "unknown")} ({thread_id}) ---')
+            lines.append(''.join(traceback.format_stack(frame)).rstrip())
+
+        try:
+            with open(self.diagnostics_file, 'a') as diag_file:
+                diag_file.write('\n'.join(lines) + '\n\n')
+        except OSError as e:
+            logger.error('[WATCHDOG] Could not write diagnostics: %s', e)
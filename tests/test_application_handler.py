@@ -0,0 +1,224 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from dmicade_pm.application_handler import DmicApplicationHandler, DmicFakeWindowBackend, DmicThreadExitWatcher
+
+APP_ID = 'test-game'
+TIMEOUT = 5
+
+SLEEP = 'import time; time.sleep(60)'
+NOTIFY_READY = 'import os, time; os.write(int(os.environ["DMIC_READY_FD"]), b"1"); time.sleep(60)'
+EXIT = 'import sys; sys.exit(1)'
+
+
+class _CountingWindowBackend(DmicFakeWindowBackend):
+    """Fake backend counting window searches.
+
+    Attributes:
+      find_calls : int
+        Number of find_window calls.
+      hidden_finds : int
+        Number of first searches not finding any window.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.find_calls = 0
+        self.hidden_finds = 0
+
+    def find_window(self, search_term):
+        self.find_calls += 1
+        if self.find_calls <= self.hidden_finds:
+            return 0
+        return super().find_window(search_term)
+
+
+class _ConfigLoader:
+
+    def __init__(self, log_folder):
+        self.apps_path = ''
+        self.global_config = {'logs': log_folder, 'app_stop_timeout': '1'}
+        self.configs = {APP_ID: {'type': 'executable', 'exe': APP_ID}}
+
+    def set_script(self, script):
+        self.configs[APP_ID]['_debug_path'] = [sys.executable, '-c', script]
+
+
+class _ProcessManager:
+
+    def __init__(self):
+        self.crashes = []
+
+    def queue_crash_notification(self, app_id, output_tail):
+        self.crashes.append(app_id)
+
+
+@pytest.fixture
+def backend():
+    backend = _CountingWindowBackend()
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def config_loader(tmp_path):
+    return _ConfigLoader(str(tmp_path))
+
+
+@pytest.fixture
+def handler(backend, config_loader):
+    handler = DmicApplicationHandler(_ProcessManager(), config_loader, DmicThreadExitWatcher(), backend)
+    yield handler
+    for app in list(handler.running_apps.values()):
+        app.stop(1)
+
+
+def _start(handler, config_loader, script):
+    config_loader.set_script(script)
+    handler.start_app(APP_ID)
+    return handler.running_apps[APP_ID]
+
+
+def _timed_wait(handler, **kwargs):
+    start = time.monotonic()
+    result = handler.wait_until_running(APP_ID, **kwargs)
+    return result, time.monotonic() - start
+
+
+def test_readiness_notification_wakes_waiting(handler, config_loader, backend):
+    # Only a wake-up can check again before the first poll interval.
+    handler.READY_POLL_MIN_INTERVAL = 10
+    backend.hidden_finds = 1
+    backend.windows[1] = APP_ID
+    _start(handler, config_loader, NOTIFY_READY)
+
+    running, elapsed = _timed_wait(handler, timeout=TIMEOUT)
+
+    assert running
+    assert elapsed < 1
+    assert backend.find_calls == 2
+
+
+def test_mapped_window_wakes_waiting(handler, config_loader, backend):
+    handler.READY_POLL_MIN_INTERVAL = 10
+    _start(handler, config_loader, SLEEP)
+    threading.Timer(0.1, backend.open_window, (APP_ID,)).start()
+
+    running, elapsed = _timed_wait(handler, timeout=TIMEOUT)
+
+    assert running
+    assert elapsed < 1
+
+
+def test_poll_interval_backs_off_without_signals(handler, config_loader, backend):
+    _start(handler, config_loader, SLEEP)
+
+    running, elapsed = _timed_wait(handler, timeout=1)
+
+    assert not running
+    # Checks after 0, 0.05, 0.15, 0.35, 0.75 and 1 seconds instead of
+    # every READY_POLL_MIN_INTERVAL.
+    assert backend.find_calls <= 7
+
+
+def test_waiting_stops_at_the_deadline(handler, config_loader):
+    _start(handler, config_loader, SLEEP)
+
+    running, elapsed = _timed_wait(handler, timeout=0.3)
+
+    assert not running
+    assert 0.3 <= elapsed < 0.3 + DmicApplicationHandler.READY_POLL_MAX_INTERVAL
+
+
+def test_waiting_returns_when_app_exits(handler, config_loader):
+    _start(handler, config_loader, EXIT)
+
+    running, elapsed = _timed_wait(handler, timeout=TIMEOUT)
+
+    assert not running
+    assert elapsed < 2
+    assert handler.running_apps[APP_ID].has_exited()
+
+
+def test_waiting_returns_when_cancelled(handler, config_loader):
+    cancelled = threading.Event()
+    _start(handler, config_loader, SLEEP)
+    threading.Timer(0.1, cancelled.set).start()
+
+    running, elapsed = _timed_wait(handler, is_cancelled=cancelled.is_set, timeout=TIMEOUT)
+
+    assert not running
+    assert elapsed < 0.1 + DmicApplicationHandler.READY_POLL_MAX_INTERVAL + 0.5
+    assert not handler.running_apps[APP_ID].has_exited()
+
+
+def test_waiting_for_unknown_app_returns_immediately(handler):
+    assert not handler.wait_until_running(APP_ID, timeout=TIMEOUT)
+
+
+def _wait_for_exit(app):
+    deadline = time.monotonic() + TIMEOUT
+    while not app.has_exited() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_window_id_is_cached_for_the_app_process(handler, config_loader, backend):
+    backend.open_window(APP_ID)
+    _start(handler, config_loader, SLEEP)
+
+    assert handler.verify_running(APP_ID)
+    assert handler.focus_app_sync(APP_ID)
+    assert handler.verify_focus(APP_ID)
+    assert backend.find_calls == 1
+
+
+def test_failed_focus_invalidates_cached_window(handler, config_loader, backend):
+    old_window_id = backend.open_window(APP_ID)
+    _start(handler, config_loader, SLEEP)
+    assert handler.focus_app_sync(APP_ID)
+
+    # The app replaced its window.
+    backend.kill_window(old_window_id)
+    new_window_id = backend.open_window(APP_ID)
+
+    assert not handler.focus_app_sync(APP_ID)
+    assert handler.focus_app_sync(APP_ID)
+    assert backend.active_window == new_window_id
+    assert backend.find_calls == 2
+
+
+def test_app_exit_invalidates_cached_window(handler, config_loader, backend):
+    backend.open_window(APP_ID)
+    app = _start(handler, config_loader, SLEEP)
+    assert handler.verify_running(APP_ID)
+
+    app.sub_process.kill()
+    _wait_for_exit(app)
+
+    assert handler.process_manager.crashes == [APP_ID]
+    assert app.get_cached_window_id() == 0
+
+
+def test_close_invalidates_cached_window(handler, config_loader, backend):
+    backend.open_window(APP_ID)
+    app = _start(handler, config_loader, SLEEP)
+    assert handler.verify_running(APP_ID)
+
+    handler.close_app(APP_ID)
+
+    assert app.get_cached_window_id() == 0
+    assert backend.find_calls == 1
+
+
+def test_restarted_app_searches_its_window_again(handler, config_loader, backend):
+    backend.open_window(APP_ID)
+    _start(handler, config_loader, SLEEP)
+    assert handler.verify_running(APP_ID)
+
+    _start(handler, config_loader, SLEEP)
+
+    assert handler.verify_running(APP_ID)
+    assert backend.find_calls == 2
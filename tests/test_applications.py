@@ -0,0 +1,62 @@
+import os
+import sys
+import textwrap
+import time
+
+from dmicade_pm.application_handler import DmicThreadExitWatcher
+from dmicade_pm.application_handler._applications import DmicAppExecutable, _process_group_exists
+
+TIMEOUT = 5
+
+# Forks a child ignoring SIGTERM, which reports its pid on the readiness
+# pipe once the signal is ignored. The parent exits on SIGTERM.
+STUBBORN_CHILD = textwrap.dedent('''
+    import os, signal, sys, time
+    ready_fd = int(os.environ['DMIC_READY_FD'])
+    if os.fork() == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        os.write(ready_fd, str(os.getpid()).encode())
+        while True:
+            time.sleep(1)
+    while True:
+        time.sleep(1)
+''')
+
+
+def _start_app(script):
+    app = DmicAppExecutable('test-app', {'type': 'executable', 'exe': 'test-app', '_debug_path': [sys.executable, '-c', script]})
+    app.run('', DmicThreadExitWatcher())
+    return app
+
+
+def _pid_alive(pid):
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as stat_file:
+            stat = stat_file.read()
+    except OSError:
+        return False
+    return stat[stat.rfind(b')') + 2:].split()[0] not in (b'Z', b'X')
+
+
+def test_stop_kills_children_ignoring_sigterm():
+    app = _start_app(STUBBORN_CHILD)
+    child_pid = int(os.read(app.ready_fileno(), 64))
+    assert _process_group_exists(app.sub_process.pid)
+
+    start = time.monotonic()
+    assert app.stop(timeout=0.2)
+
+    assert time.monotonic() - start < TIMEOUT
+    assert not _process_group_exists(app.sub_process.pid)
+    assert not _pid_alive(child_pid)
+
+
+def test_stop_returns_after_sigterm_when_group_exits():
+    app = _start_app('import time; time.sleep(60)')
+
+    start = time.monotonic()
+    assert app.stop(timeout=TIMEOUT)
+
+    assert time.monotonic() - start < TIMEOUT
+    assert app.sub_process.returncode is not None
+    assert not _process_group_exists(app.sub_process.pid)
@@ -0,0 +1,62 @@
+import asyncio
+import queue
+import subprocess
+import sys
+
+from dmicade_pm.application_handler import DmicLoopExitWatcher, DmicThreadExitWatcher
+
+TIMEOUT = 5
+
+
+def _start(exit_code):
+    return subprocess.Popen([sys.executable, '-c', f'import sys; sys.exit({exit_code})'])
+
+
+def test_thread_watcher_reports_return_codes():
+    watcher = DmicThreadExitWatcher()
+    return_codes = queue.Queue()
+    processes = [_start(exit_code) for exit_code in (0, 3, 7)]
+    for process in processes:
+        watcher.watch(process, return_codes.put, f'pid {process.pid}')
+
+    assert sorted(return_codes.get(timeout=TIMEOUT) for _ in processes) == [0, 3, 7]
+    assert all(process.returncode is not None for process in processes)
+
+
+def test_thread_watcher_reports_already_exited_process():
+    watcher = DmicThreadExitWatcher()
+    return_codes = queue.Queue()
+    process = _start(5)
+    process.wait()
+
+    watcher.watch(process, return_codes.put, 'exited')
+
+    assert return_codes.get(timeout=TIMEOUT) == 5
+
+
+def test_raising_callback_does_not_stop_thread_watcher():
+    def fail(return_code):
+        raise RuntimeError('callback failed')
+
+    watcher = DmicThreadExitWatcher()
+    return_codes = queue.Queue()
+    watcher.watch(_start(1), fail, 'failing')
+    watcher.watch(_start(2), return_codes.put, 'second')
+
+    assert return_codes.get(timeout=TIMEOUT) == 2
+
+
+def test_loop_watcher_reports_return_codes_on_the_loop():
+    async def run():
+        loop = asyncio.get_running_loop()
+        watcher = DmicLoopExitWatcher(loop)
+        exited = loop.create_future()
+
+        def fail(return_code):
+            raise RuntimeError('callback failed')
+
+        watcher.watch(_start(1), fail, 'failing')
+        watcher.watch(_start(4), exited.set_result, 'second')
+        return await asyncio.wait_for(exited, TIMEOUT)
+
+    assert asyncio.run(run()) == 4
@@ -0,0 +1,32 @@
+import threading
+
+from dmicade_pm.flight_recorder import DmicFlightRecorder
+
+
+def test_entries_are_ordered_oldest_first():
+    recorder = DmicFlightRecorder(3)
+    for i in range(5):
+        recorder.record(f'event{i}', float(i), (0.001,))
+
+    assert [entry[1] for entry in recorder.entries()] == ['event2', 'event3', 'event4']
+
+
+def test_concurrent_records_keep_entries_whole():
+    recorder = DmicFlightRecorder(64)
+
+    def record_many(thread_index):
+        for i in range(1000):
+            recorder.record(f'event-{thread_index}', float(i), (float(thread_index),))
+
+    threads = [threading.Thread(target=record_many, args=(n,), name=f'recorder-{n}') for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    entries = recorder.entries()
+    assert len(entries) == 64
+    for _, name, thread_name, durations in entries:
+        thread_index = int(name.split('-')[1])
+        assert thread_name == f'recorder-{thread_index}'
+        assert durations == (float(thread_index),)
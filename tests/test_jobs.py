@@ -0,0 +1,68 @@
+import threading
+
+from dmicade_pm.jobs import DmicJob
+
+
+def _run(job):
+    results = []
+    done = threading.Event()
+    job.done_event += lambda result: (results.append(result), done.set())
+    job.start()
+    assert done.wait(5)
+    return results[0]
+
+
+def test_result_carries_job_and_arguments():
+    job = DmicJob('add', lambda a, b, job=None: a + b, 1, 2)
+
+    result = _run(job)
+
+    assert result.job is job
+    assert result.name == 'add'
+    assert result.args == (1, 2)
+    assert result.result == 3
+    assert not result.cancelled
+
+
+def test_cancel_stops_waiting_target():
+    started = threading.Event()
+
+    def target(job=None):
+        started.set()
+        return job.wait(10)
+
+    job = DmicJob('wait', target)
+    results = []
+    done = threading.Event()
+    job.done_event += lambda result: (results.append(result), done.set())
+    job.start()
+    assert started.wait(5)
+
+    job.cancel()
+
+    assert done.wait(1)
+    assert results[0].cancelled
+    assert results[0].result is True
+
+
+def test_raising_target_finishes_without_result():
+    def target(job=None):
+        raise RuntimeError('failed')
+
+    result = _run(DmicJob('fail', target))
+
+    assert result.result is None
+    assert not result.cancelled
+
+
+def test_progress_is_published_with_the_job():
+    reports = []
+
+    def target(job=None):
+        job.report_progress('half')
+
+    job = DmicJob('progress', target)
+    job.progress_event += reports.append
+    _run(job)
+
+    assert [(report.job, report.data) for report in reports] == [(job, 'half')]
@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from dmicade_pm.launch_stats import DmicLaunchStats
+
+
+@pytest.fixture
+def stats(tmp_path):
+    return DmicLaunchStats(str(tmp_path / 'launch_stats.json'), default_ready_timeout=8, max_ready_timeout=20)
+
+
+def _record_windows(stats, *seconds):
+    for window_seconds in seconds:
+        stats.record_window('game', window_seconds)
+
+
+def test_defaults_until_enough_samples(stats):
+    _record_windows(stats, 1, 1)
+
+    assert stats.ready_timeout('game') == 8
+    assert stats.poll_interval('game') == DmicLaunchStats.MIN_POLL_INTERVAL
+
+
+def test_ready_timeout_follows_slowest_start(stats):
+    _record_windows(stats, 1, 2, 4)
+
+    assert stats.ready_timeout('game') == 4 * DmicLaunchStats.READY_TIMEOUT_FACTOR + DmicLaunchStats.READY_TIMEOUT_MARGIN
+    assert stats.poll_interval('game') == 0.25
+
+
+def test_ready_timeout_is_limited(stats):
+    _record_windows(stats, 0.1, 0.1, 0.1)
+    assert stats.ready_timeout('game') == DmicLaunchStats.MIN_READY_TIMEOUT
+
+    _record_windows(stats, 30)
+    assert stats.ready_timeout('game') == 20
+
+
+def test_failures_back_off_until_next_start(stats):
+    _record_windows(stats, 0.1, 0.1, 0.1)
+
+    stats.record_failure('game')
+    assert stats.ready_timeout('game') == 8
+    assert stats.poll_interval('game') == DmicLaunchStats.MIN_POLL_INTERVAL
+
+    stats.record_failure('game')
+    assert stats.ready_timeout('game') == 16
+
+    stats.record_failure('game')
+    assert stats.ready_timeout('game') == 20
+
+    stats.record_window('game', 3)
+    assert stats.ready_timeout('game') == 3 * DmicLaunchStats.READY_TIMEOUT_FACTOR + DmicLaunchStats.READY_TIMEOUT_MARGIN
+
+
+def test_failures_are_not_window_samples(stats):
+    _record_windows(stats, 1, 1, 1)
+    stats.record_failure('game')
+
+    summary = stats.dump_stats()['game']
+    assert summary['failures'] == 1
+    assert summary['recent_failures'] == 1
+    assert summary['window']['count'] == 3
+
+
+def test_only_last_samples_are_kept(stats):
+    _record_windows(stats, *range(DmicLaunchStats.MAX_SAMPLES + 5))
+
+    assert stats.dump_stats()['game']['window']['count'] == DmicLaunchStats.MAX_SAMPLES
+
+
+def test_stats_are_loaded_again(tmp_path, stats):
+    stats.record_start('game', 0.5)
+    _record_windows(stats, 1, 2, 3)
+    stats.record_failure('game')
+
+    loaded = DmicLaunchStats(stats.path, default_ready_timeout=8, max_ready_timeout=20)
+
+    assert loaded.dump_stats() == stats.dump_stats()
+
+
+def test_unknown_version_is_ignored(tmp_path):
+    path = tmp_path / 'launch_stats.json'
+    path.write_text(json.dumps({'version': 0, 'apps': {'game': {'starts': 3}}}))
+
+    assert DmicLaunchStats(str(path)).dump_stats() == {}
+
+
+def test_stats_without_recent_failures_load(tmp_path):
+    path = tmp_path / 'launch_stats.json'
+    path.write_text(json.dumps({'version': 1, 'apps': {'game': {'starts': 1, 'failures': 2, 'window': [1, 1, 1]}}}))
+
+    summary = DmicLaunchStats(str(path)).dump_stats()['game']
+
+    assert summary['failures'] == 2
+    assert summary['recent_failures'] == 0
+    assert summary['ready_timeout_s'] == 1 * DmicLaunchStats.READY_TIMEOUT_FACTOR + DmicLaunchStats.READY_TIMEOUT_MARGIN
@@ -0,0 +1,92 @@
+import pytest
+
+from dmicade_pm.helper import DmicEvent
+from dmicade_pm.message_parser import DmicMessageParser
+from dmicade_pm.tasks import DmicTaskType
+
+
+class _Server:
+    def __init__(self):
+        self.received_event = DmicEvent('uds.received')
+
+
+@pytest.fixture
+def parser():
+    parser = DmicMessageParser(_Server())
+    parser.tasks = []
+    parser.received_task_event += lambda task: parser.tasks.append((task.type, task.data))
+    return parser
+
+
+@pytest.mark.parametrize('message, task', [
+    ('start_app:game', (DmicTaskType.START_APP, 'game')),
+    ('close_app', (DmicTaskType.CLOSE_APP, None)),
+    ('volume:max', (DmicTaskType.SET_VOLUME, 'max')),
+    ('volume:100', (DmicTaskType.SET_VOLUME, '100')),
+    ('volume:7', (DmicTaskType.SET_VOLUME, '7')),
+    ('led:RAINBOW', (DmicTaskType.SET_BUTTON_COLORS, {'RAINBOW': True})),
+    ('led:A=red,B=0,C=1', (DmicTaskType.SET_BUTTON_COLORS, {'A': 'red', 'B': 0, 'C': 1})),
+])
+def test_valid_messages_become_tasks(parser, message, task):
+    parser.parse_uds_message(message)
+
+    assert parser.tasks == [task]
+    assert parser.rejected_counts == {}
+
+
+@pytest.mark.parametrize('message, reason', [
+    ('unknown:1', 'unknown_type'),
+    ('start_app', 'invalid_data'),
+    ('start_app:', 'invalid_data'),
+    ('volume:101', 'invalid_data'),
+    ('volume:loud', 'invalid_data'),
+    ('led:', 'invalid_data'),
+    ('log_level:x', 'invalid_data'),
+])
+def test_invalid_messages_are_rejected(parser, message, reason):
+    parser.parse_uds_message(message)
+
+    assert parser.tasks == []
+    assert parser.rejected_counts == {reason: 1}
+
+
+@pytest.mark.parametrize('message', ['start_app:game:extra', 'start_app:game more'])
+def test_start_app_ignores_trailing_data(parser, message):
+    parser.parse_uds_message(message)
+
+    assert parser.tasks == [(DmicTaskType.START_APP, 'game')]
+
+
+def test_close_app_ignores_app_id(parser):
+    parser.parse_uds_message('close_app:other_game')
+
+    assert parser.tasks == [(DmicTaskType.CLOSE_APP, None)]
+
+
+def test_several_messages_in_one_chunk(parser):
+    parser.parse_uds_message('start_app:game\r\n\nvolume:min\n')
+
+    assert parser.tasks == [(DmicTaskType.START_APP, 'game'), (DmicTaskType.SET_VOLUME, 'min')]
+    assert parser.parsed_counts == {'start_app': 1, 'volume': 1}
+
+
+def test_log_level_message(parser):
+    levels = []
+    parser.log_level_event += levels.append
+
+    parser.parse_uds_message('log_level:dmicade_pm.uds_server=DEBUG,30')
+    parser.parse_uds_message('log_level:=INFO')
+
+    assert levels == [('dmicade_pm.uds_server', 'DEBUG', 30.0), ('', 'INFO', None)]
+
+
+def test_registered_message_type(parser):
+    received = []
+    parser.register('echo', received.append, r'\d+', lambda match: int(match.group(0)))
+
+    parser.parse_uds_message('echo:12')
+    parser.parse_uds_message('echo:12x')
+
+    assert received == [12]
+    assert 'echo' in parser.message_types()
+    assert parser.dump_stats() == {'parsed': {'echo': 1}, 'rejected': {'invalid_data': 1}}
@@ -0,0 +1,70 @@
+from dmicade_pm.metrics import DmicLatencyHistogram, DmicMetrics
+
+
+def test_samples_fall_into_the_first_bucket_they_fit():
+    histogram = DmicLatencyHistogram()
+    for seconds in (0.0005, 0.001, 0.002, 0.75, 60):
+        histogram.add(seconds)
+
+    buckets = histogram.to_dict()['buckets']
+    assert buckets['<=1ms'] == 2
+    assert buckets['<=2.5ms'] == 1
+    assert buckets['<=1000ms'] == 1
+    assert buckets['>30000ms'] == 1
+    assert sum(buckets.values()) == 5
+
+
+def test_summary_is_reported_in_milliseconds():
+    histogram = DmicLatencyHistogram()
+    for seconds in (0.001, 0.002, 0.003):
+        histogram.add(seconds)
+
+    summary = histogram.to_dict()
+    assert summary['count'] == 3
+    assert summary['mean_ms'] == 2.0
+    assert summary['max_ms'] == 3.0
+
+
+def test_percentiles():
+    histogram = DmicLatencyHistogram()
+    for i in range(1, 101):
+        histogram.add(i / 1000)
+
+    assert histogram.percentile(0) == 0.001
+    assert histogram.percentile(50) == 0.051
+    assert histogram.percentile(95) == 0.096
+    assert histogram.percentile(100) == 0.1
+
+
+def test_percentiles_follow_the_rolling_window():
+    histogram = DmicLatencyHistogram()
+    for _ in range(DmicLatencyHistogram.WINDOW_SIZE):
+        histogram.add(10)
+    for _ in range(DmicLatencyHistogram.WINDOW_SIZE):
+        histogram.add(0.001)
+
+    assert histogram.percentile(99) == 0.001
+    assert histogram.max == 10
+    assert histogram.count == 2 * DmicLatencyHistogram.WINDOW_SIZE
+
+
+def test_empty_histogram():
+    summary = DmicLatencyHistogram().to_dict()
+
+    assert summary['count'] == 0
+    assert summary['mean_ms'] == 0.0
+    assert summary['p99_ms'] == 0.0
+
+
+def test_metrics_keep_one_histogram_per_name():
+    metrics = DmicMetrics()
+    metrics.record('task_wait:START_APP', 0.001)
+    metrics.record('task_wait:START_APP', 0.002)
+    metrics.record('job:start_app', 1)
+
+    dump = metrics.dump()
+    assert list(dump) == ['job:start_app', 'task_wait:START_APP']
+    assert dump['task_wait:START_APP']['count'] == 2
+
+    metrics.reset()
+    assert metrics.dump() == {}
@@ -0,0 +1,61 @@
+import subprocess
+import sys
+import time
+
+from dmicade_pm.application_handler._output_pump import DmicAppOutput, DmicOutputPump
+
+TIMEOUT = 5
+
+
+def _wait_for_lines(output: DmicAppOutput, line_count):
+    deadline = time.monotonic() + TIMEOUT
+    while len(output.tail()) < line_count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_pump_writes_app_output_to_log(tmp_path):
+    pump = DmicOutputPump(str(tmp_path))
+    process = subprocess.Popen(
+        [sys.executable, '-c', 'import sys; print("hello"); print("oops", file=sys.stderr)'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE)
+
+    output = pump.pump('game', process)
+    process.wait()
+    _wait_for_lines(output, 2)
+
+    assert sorted(output.tail()) == ['[stderr] oops', 'hello']
+    log = (tmp_path / 'game.log').read_text()
+    assert 'stdout: hello' in log
+    assert 'stderr: oops' in log
+
+
+def test_tail_keeps_last_lines(tmp_path):
+    output = DmicAppOutput('game', str(tmp_path / 'game.log'), max_bytes=0, backup_count=0, tail_lines=2)
+    output.open_stream('stdout')
+    output.feed('stdout', b'one\ntwo\nthree\nfou')
+
+    assert output.tail() == ['two', 'three']
+
+    output.close_stream('stdout')
+    assert output.tail() == ['three', 'fou']
+
+
+def test_split_utf8_and_crlf_are_joined(tmp_path):
+    output = DmicAppOutput('game', str(tmp_path / 'game.log'), max_bytes=0, backup_count=0, tail_lines=10)
+    output.open_stream('stdout')
+    output.feed('stdout', 'caf'.encode() + b'\xc3')
+    output.feed('stdout', b'\xa9\r\n')
+    output.close_stream('stdout')
+
+    assert output.tail() == ['café']
+
+
+def test_log_gets_rotated(tmp_path):
+    output = DmicAppOutput('game', str(tmp_path / 'game.log'), max_bytes=1000, backup_count=2, tail_lines=10)
+    output.open_stream('stdout')
+    for i in range(200):
+        output.feed('stdout', f'line {i} {"x" * 40}\n'.encode())
+    output.close_stream('stdout')
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['game.log', 'game.log.1', 'game.log.2']
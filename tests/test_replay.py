@@ -0,0 +1,85 @@
+import threading
+import time
+
+from dmicade_pm.commands import commands_set_pm
+from dmicade_pm.replay import DmicRecordingProcessManager, DmicReplay, DmicTaskRecorder
+from dmicade_pm.statemachine import DmicStateMachine
+from dmicade_pm.tasks import DmicTask, DmicTaskType
+
+TIMEOUT = 5
+
+APP_CONFIGS = {'game': {'type': 'godot', 'exe': 'game.x86_64'}}
+GLOBAL_CONFIG = {
+    'game_timeout': '300',
+    'menu_timeout': '600',
+    'volume_perc_low': '0',
+    'volume_perc_high': '100',
+    'button_colors_menu': {},
+    'button_colors_app_default': {},
+}
+
+
+class _ConfigLoader:
+    configs = APP_CONFIGS
+    global_config = GLOBAL_CONFIG
+    apps_path = '/apps/'
+
+
+class _ProcessManager:
+    """Process manager whose apps always start, commands return None."""
+
+    def __init__(self, state_machine):
+        self.config_loader = _ConfigLoader()
+        self._state_machine = state_machine
+
+    def queue_state_task(self, task):
+        self._state_machine.queue_task_for_state(task)
+
+    def __getattr__(self, name):
+        def call(*args):
+            if name in ('verify_running', 'wait_until_running', 'verify_closed', 'verify_focus'):
+                return True
+            return None
+        return call
+
+
+def _wait_for_state(state_machine, state):
+    deadline = time.monotonic() + TIMEOUT
+    while time.monotonic() < deadline:
+        status = state_machine.dump_status()
+        if status['state'] == state and not status['jobs'] and not status['queue_length']:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f'State machine not idle in {state}: {state_machine.dump_status()}')
+
+
+def _record_session(path):
+    recorder = DmicTaskRecorder(path, GLOBAL_CONFIG, APP_CONFIGS)
+    state_machine = DmicStateMachine(GLOBAL_CONFIG, recorder=recorder)
+    commands_set_pm(DmicRecordingProcessManager(_ProcessManager(state_machine), recorder))
+    thread = threading.Thread(target=state_machine.run_event_loop_sync, daemon=True)
+    thread.start()
+
+    try:
+        _wait_for_state(state_machine, 'inmenu')
+        state_machine.queue_task_for_state(DmicTask(DmicTaskType.START_APP, 'game'))
+        _wait_for_state(state_machine, 'ingame')
+        state_machine.queue_task_for_state(DmicTask(DmicTaskType.APP_CRASHED, 'game'))
+        _wait_for_state(state_machine, 'inmenu')
+    finally:
+        state_machine.stop_event_loop()
+        thread.join(TIMEOUT)
+        recorder.close()
+        commands_set_pm(None)
+
+
+def test_replayed_session_matches_recording(tmp_path):
+    path = str(tmp_path / 'session.jsonl.gz')
+    _record_session(path)
+
+    report = DmicReplay(path).run()
+
+    assert report['external_tasks'] == 2
+    assert report['recorded_commands'] > 0
+    assert report['replayed_commands'] == report['recorded_commands']
+    assert report['first_command_mismatch'] is None
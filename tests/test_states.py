@@ -0,0 +1,136 @@
+import pytest
+
+from dmicade_pm.commands import commands_set_pm
+from dmicade_pm.helper import DmicException
+from dmicade_pm.jobs import DmicJobResult
+from dmicade_pm.statemachine import _states
+from dmicade_pm.statemachine._states import DmicState, DmicStatePool, handles
+from dmicade_pm.tasks import DmicTask, DmicTaskType
+
+
+class _ConfigLoader:
+    configs = {'game': {}, 'other': {}}
+    global_config = {'menu_timeout': '600', 'button_colors_menu': {}}
+
+
+class _ProcessManager:
+    """Records the calls of commands, all checks succeed."""
+
+    def __init__(self):
+        self.config_loader = _ConfigLoader()
+        self.calls = []
+        self.tasks = []
+
+    def queue_state_task(self, task):
+        self.tasks.append(task)
+
+    def __getattr__(self, name):
+        def call(*args):
+            self.calls.append((name, args))
+            return True
+        return call
+
+
+@pytest.fixture
+def pm():
+    pm = _ProcessManager()
+    commands_set_pm(pm)
+    yield pm
+    commands_set_pm(None)
+
+
+def _start_job(pool, pm, app_id):
+    pool.get_handler('inmenu', DmicTaskType.START_APP)(DmicTask(DmicTaskType.START_APP, app_id))
+    return [task.data for task in pm.tasks if task.type is DmicTaskType.RUN_JOB][-1]
+
+
+def _finish(pool, job, result, cancelled):
+    pool.get_handler('inmenu', DmicTaskType.JOB_DONE)(DmicTask(DmicTaskType.JOB_DONE, DmicJobResult(job, result, cancelled)))
+
+
+def test_dispatch_table_binds_declared_handlers():
+    pool = DmicStatePool()
+
+    handler = pool.get_handler('ingame', DmicTaskType.APP_CRASHED)
+    assert handler.__self__ is pool.get_object('ingame')
+    assert handler.__name__ == '_app_crashed'
+
+
+def test_one_handler_can_handle_several_task_types():
+    pool = DmicStatePool()
+
+    assert pool.get_handler('idle', DmicTaskType.INTERACTION) == pool.get_handler('idle', DmicTaskType.CLOSE_APP)
+
+
+def test_base_state_handlers_are_inherited_by_every_state():
+    pool = DmicStatePool()
+
+    for state_id in pool.state_ids():
+        assert pool.get_handler(state_id, DmicTaskType.SET_VOLUME) is not None
+
+
+def test_unhandled_task_type_has_no_handler():
+    pool = DmicStatePool()
+
+    assert pool.get_handler('sleep', DmicTaskType.START_APP) is None
+
+
+def test_transition_graph_lists_enter_and_handler_transitions():
+    graph = DmicStatePool().transition_graph()
+
+    assert graph['start'] == {'enter': ['inmenu']}
+    assert graph['ingame']['APP_CRASHED'] == ['inmenu']
+    assert graph['inmenu']['JOB_DONE'] == ['ingame']
+
+
+def test_transition_to_unknown_state_is_rejected(monkeypatch):
+    class S_Broken(DmicState):
+        @handles(DmicTaskType.TEST, transitions=('nowhere',))
+        def _test(self, task):
+            pass
+
+    monkeypatch.setattr(_states, 'S_Broken', S_Broken, raising=False)
+
+    with pytest.raises(DmicException, match='nowhere'):
+        DmicStatePool()
+
+
+def test_multiple_handlers_for_one_task_type_are_rejected(monkeypatch):
+    class S_Broken(DmicState):
+        @handles(DmicTaskType.TEST)
+        def _first(self, task):
+            pass
+
+        @handles(DmicTaskType.TEST)
+        def _second(self, task):
+            pass
+
+    monkeypatch.setattr(_states, 'S_Broken', S_Broken, raising=False)
+
+    with pytest.raises(DmicException, match='Multiple handlers'):
+        DmicStatePool()
+
+
+def test_app_started_after_cancel_gets_closed(pm):
+    pool = DmicStatePool()
+    job = _start_job(pool, pm, 'game')
+
+    _finish(pool, job, True, cancelled=True)
+
+    assert ('close_app', ('game',)) in pm.calls
+    assert ('send_to_ui', ('app_started:false', True)) in pm.calls
+
+
+def test_stale_start_result_is_ignored(pm):
+    pool = DmicStatePool()
+    stale_job = _start_job(pool, pm, 'other')
+    pool.get_object('inmenu').exit()
+    job = _start_job(pool, pm, 'game')
+
+    _finish(pool, stale_job, True, cancelled=True)
+
+    assert ('close_app', ('other',)) in pm.calls
+    assert not any(name == 'send_to_ui' and args[0].startswith('app_started') for name, args in pm.calls)
+
+    _finish(pool, job, True, cancelled=False)
+    assert ('send_to_ui', ('app_started:true', True)) in pm.calls
@@ -0,0 +1,93 @@
+import struct
+import threading
+import time
+
+from dmicade_pm.status_block import DmicStatusBlock
+
+
+def test_read_returns_published_status(tmp_path):
+    path = str(tmp_path / 'status')
+    block = DmicStatusBlock(path)
+    block.update(state='ingame', active_app='café', sleep_time=True)
+
+    status = DmicStatusBlock.read(path)
+
+    assert status['state'] == 'ingame'
+    assert status['active_app'] == 'café'
+    assert status['sleep_time'] is True
+    assert status['timeout_deadline'] is None
+    assert status['sequence'] % 2 == 0
+    block.close()
+
+
+def test_timeout_deadline_is_set_and_cleared(tmp_path):
+    path = str(tmp_path / 'status')
+    block = DmicStatusBlock(path)
+
+    block.set_timeout_remaining(60)
+    assert abs(DmicStatusBlock.read(path)['timeout_deadline'] - (time.time() + 60)) < 1
+
+    block.set_timeout_remaining(None)
+    assert DmicStatusBlock.read(path)['timeout_deadline'] is None
+    block.close()
+
+
+def test_every_update_advances_the_sequence_by_two(tmp_path):
+    path = str(tmp_path / 'status')
+    block = DmicStatusBlock(path)
+    sequence = DmicStatusBlock.read(path)['sequence']
+
+    block.update(state='idle')
+
+    assert DmicStatusBlock.read(path)['sequence'] == sequence + 2
+    block.close()
+
+
+def test_long_values_are_truncated(tmp_path):
+    path = str(tmp_path / 'status')
+    block = DmicStatusBlock(path)
+    block.update(state='s' * 20, active_app='a' * 100)
+
+    status = DmicStatusBlock.read(path)
+
+    assert status['state'] == 's' * 16
+    assert status['active_app'] == 'a' * 64
+    block.close()
+
+
+def test_record_being_written_is_not_read(tmp_path):
+    path = str(tmp_path / 'status')
+    block = DmicStatusBlock(path)
+    with open(path, 'r+b') as status_file:
+        status_file.seek(DmicStatusBlock.SEQUENCE_OFFSET)
+        status_file.write(struct.pack('<Q', 7))
+
+    assert DmicStatusBlock.read(path, retries=3) is None
+    block.close()
+
+
+def test_concurrent_reads_see_consistent_records(tmp_path):
+    path = str(tmp_path / 'status')
+    block = DmicStatusBlock(path)
+    done = threading.Event()
+
+    def write():
+        for i in range(2000):
+            block.update(state=f'state{i}', active_app=f'app{i}')
+        done.set()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    while not done.is_set():
+        status = DmicStatusBlock.read(path, retries=1000)
+        if status and status['state']:
+            assert status['state'][len('state'):] == status['active_app'][len('app'):]
+    writer.join()
+    block.close()
+
+
+def test_close_removes_the_file(tmp_path):
+    path = tmp_path / 'status'
+    DmicStatusBlock(str(path)).close()
+
+    assert not path.exists()
@@ -0,0 +1,141 @@
+import threading
+import time
+
+from dmicade_pm.statemachine._task_queue import DmicTaskQueue
+from dmicade_pm.tasks import DmicTask, DmicTaskType
+
+
+def test_get_returns_most_important_lane_first():
+    queue = DmicTaskQueue()
+    queue.put(DmicTask(DmicTaskType.INTERACTION, None))
+    queue.put(DmicTask(DmicTaskType.START_APP, 'a'))
+    queue.put(DmicTask(DmicTaskType.APP_CRASHED, 'b'))
+    queue.put(DmicTask(DmicTaskType.CHANGE_STATE, 'inmenu'))
+
+    assert [queue.get(0).type for _ in range(4)] == [
+        DmicTaskType.CHANGE_STATE,
+        DmicTaskType.APP_CRASHED,
+        DmicTaskType.START_APP,
+        DmicTaskType.INTERACTION,
+    ]
+    assert len(queue) == 0
+
+
+def test_tasks_of_one_lane_keep_their_order():
+    queue = DmicTaskQueue()
+    for data in ('a', 'b', 'c'):
+        queue.put(DmicTask(DmicTaskType.TEST, data))
+
+    assert [queue.get(0).data for _ in range(3)] == ['a', 'b', 'c']
+
+
+def test_get_times_out_on_empty_queue():
+    queue = DmicTaskQueue()
+
+    start = time.monotonic()
+    assert queue.get(0.05) is None
+    assert time.monotonic() - start >= 0.05
+
+
+def test_put_wakes_waiting_get():
+    queue = DmicTaskQueue()
+    received = []
+    consumer = threading.Thread(target=lambda: received.append(queue.get(5)))
+    consumer.start()
+
+    queue.put(DmicTask(DmicTaskType.TEST, 'a'))
+    consumer.join(1)
+
+    assert not consumer.is_alive()
+    assert received[0].data == 'a'
+
+
+def test_close_wakes_waiting_get():
+    queue = DmicTaskQueue()
+    received = []
+    consumer = threading.Thread(target=lambda: received.append(queue.get()))
+    consumer.start()
+
+    queue.close()
+    consumer.join(1)
+
+    assert not consumer.is_alive()
+    assert received == [None]
+
+
+def test_drop_if_queued_keeps_first_task():
+    queue = DmicTaskQueue()
+    assert queue.put(DmicTask(DmicTaskType.INTERACTION, 1))
+    assert not queue.put(DmicTask(DmicTaskType.INTERACTION, 2))
+
+    assert queue.coalesced_count == 1
+    assert queue.get(0).data == 1
+    assert queue.get(0) is None
+
+
+def test_drop_if_duplicate_only_drops_same_data():
+    queue = DmicTaskQueue()
+    queue.put(DmicTask(DmicTaskType.CLOSE_APP, 'a'))
+    queue.put(DmicTask(DmicTaskType.CLOSE_APP, 'a'))
+    queue.put(DmicTask(DmicTaskType.CLOSE_APP, 'b'))
+
+    assert [queue.get(0).data for _ in range(len(queue))] == ['a', 'b']
+    assert queue.coalesced_count == 1
+
+
+def test_keep_latest_replaces_queued_data_in_place():
+    queue = DmicTaskQueue()
+    queue.put(DmicTask(DmicTaskType.START_APP, 'a'))
+    queue.put(DmicTask(DmicTaskType.TEST, 'x'))
+    queue.put(DmicTask(DmicTaskType.START_APP, 'b'))
+
+    assert [(task.type, task.data) for task in (queue.get(0), queue.get(0))] == [
+        (DmicTaskType.START_APP, 'b'),
+        (DmicTaskType.TEST, 'x'),
+    ]
+    assert len(queue) == 0
+
+
+def test_append_never_coalesces():
+    queue = DmicTaskQueue()
+    queue.put(DmicTask(DmicTaskType.TEST, 'a'))
+    queue.put(DmicTask(DmicTaskType.TEST, 'a'))
+
+    assert len(queue) == 2
+    assert queue.coalesced_count == 0
+
+
+def test_full_lane_drops_new_tasks():
+    queue = DmicTaskQueue()
+    for i in range(DmicTaskQueue.MAX_LANE_LENGTH):
+        assert queue.put(DmicTask(DmicTaskType.TEST, i))
+
+    assert not queue.put(DmicTask(DmicTaskType.TEST, 'overflow'))
+    assert queue.dropped_count == 1
+    assert len(queue) == DmicTaskQueue.MAX_LANE_LENGTH
+
+
+def test_internal_lane_is_not_bounded():
+    queue = DmicTaskQueue()
+    for i in range(DmicTaskQueue.MAX_LANE_LENGTH + 1):
+        assert queue.put(DmicTask(DmicTaskType.CHANGE_STATE, i))
+
+    assert queue.dropped_count == 0
+
+
+def test_job_results_are_not_dropped_by_full_lanes():
+    queue = DmicTaskQueue()
+    for i in range(DmicTaskQueue.MAX_LANE_LENGTH):
+        queue.put(DmicTask(DmicTaskType.TEST, i))
+
+    assert queue.put(DmicTask(DmicTaskType.JOB_DONE, 'result'))
+    assert queue.get(0).type is DmicTaskType.JOB_DONE
+
+
+def test_button_color_bursts_keep_latest_colors():
+    queue = DmicTaskQueue()
+    for color in ('red', 'green', 'blue'):
+        queue.put(DmicTask(DmicTaskType.SET_BUTTON_COLORS, {'A': color}))
+
+    assert len(queue) == 1
+    assert queue.get(0).data == {'A': 'blue'}
@@ -0,0 +1,352 @@
+import asyncio
+import json
+import queue
+import socket
+import threading
+import time
+
+import pytest
+
+from dmicade_pm.metrics import DmicMetrics
+from dmicade_pm.uds_server import DmicLoopUdsServer, DmicUdsConnection, UdsServer
+
+TIMEOUT = 2
+
+
+class _Client:
+    """Client socket reading newline terminated messages."""
+
+    def __init__(self, socket_path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(TIMEOUT)
+        self.sock.connect(socket_path)
+        self._buffer = b''
+
+    def send(self, data: bytes):
+        self.sock.sendall(data)
+
+    def read_line(self) -> str:
+        while b'\n' not in self._buffer:
+            chunk = self.sock.recv(4096)
+            assert chunk, 'connection closed'
+            self._buffer += chunk
+        line, _, self._buffer = self._buffer.partition(b'\n')
+        return line.decode('utf-8')
+
+    def close(self):
+        self.sock.close()
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def metrics():
+    return DmicMetrics()
+
+
+@pytest.fixture
+def server(tmp_path, metrics):
+    server = UdsServer(str(tmp_path / 'pm.sock'), metrics)
+    server.received = queue.Queue()
+    server.received_event += server.received.put
+    server.start()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def connect(server, tmp_path):
+    clients = []
+
+    def connect(protocol=None):
+        connected = len(server.connections())
+        client = _Client(str(tmp_path / 'pm.sock'))
+        clients.append(client)
+        _wait_for(lambda: len(server.connections()) == connected + 1)
+        if protocol:
+            client.send(f'protocol:{protocol}\n'.encode())
+            assert client.read_line() == f'protocol:{min(protocol, UdsServer.PROTOCOL_VERSION)}'
+        return client
+
+    yield connect
+    for client in clients:
+        client.close()
+
+
+def _received(server):
+    return server.received.get(timeout=TIMEOUT)
+
+
+def test_legacy_client_sends_one_message_per_chunk(server, connect):
+    client = connect()
+    client.send(b'start_app:a')
+
+    assert _received(server) == 'start_app:a'
+
+
+def test_protocol_negotiation_agrees_on_highest_common_version(server, connect):
+    connect(protocol=2)
+    connect(protocol=99)
+
+    assert sorted(c.protocol for c in server.connections()) == [2, UdsServer.PROTOCOL_VERSION]
+
+
+def test_messages_after_hello_in_same_chunk_are_handled(server, connect):
+    client = connect()
+    client.send(b'protocol:2\nstart_app:a\n')
+
+    assert client.read_line() == 'protocol:2'
+    assert _received(server) == 'start_app:a'
+
+
+def test_framed_client_receives_every_message_in_order(server, connect):
+    client = connect(protocol=2)
+    for i in range(20):
+        server.send(f'msg:{i}')
+
+    assert [client.read_line() for _ in range(20)] == [f'msg:{i}' for i in range(20)]
+
+
+def test_framed_messages_in_one_chunk_are_split(server, connect):
+    client = connect(protocol=2)
+    client.send(b'start_app:a\nclose_app\n')
+
+    assert [_received(server), _received(server)] == ['start_app:a', 'close_app']
+
+
+
+def test_messages_only_reach_subscribed_clients(server, connect):
+    client = connect(protocol=2)
+    client.send(b'subscribe:status\nunsubscribe:ui\n')
+    _wait_for(lambda: server.connections()[0].topics == {'status'})
+
+    server.send('ui_only')
+    server.send('status_only', topic='status')
+
+    assert client.read_line() == 'status_only'
+
+
+def test_clients_reconnect_and_get_messages_independently(server, connect):
+    first = connect(protocol=2)
+    second = connect(protocol=2)
+    first.close()
+    _wait_for(lambda: len(server.connections()) == 1)
+
+    third = connect(protocol=2)
+    server.send('hello')
+
+    assert second.read_line() == 'hello'
+    assert third.read_line() == 'hello'
+
+
+def test_full_outbox_drops_oldest_message():
+    local, remote = socket.socketpair()
+    local.setblocking(False)
+    connection = DmicUdsConnection(local, 1, ('ui',), max_outbox_length=2)
+    for frame in (b'a\n', b'b\n', b'c\n'):
+        connection.queue(frame)
+
+    assert not connection.flush(UdsServer.MAX_BATCH_MESSAGES)
+    assert remote.recv(100) == b'b\nc\n'
+    assert (connection.dropped_count, connection.sent_count, connection.batch_count) == (1, 2, 1)
+    local.close()
+    remote.close()
+
+
+def test_blocked_flush_keeps_unsent_rest():
+    local, remote = socket.socketpair()
+    local.setblocking(False)
+    connection = DmicUdsConnection(local, 1, ('ui',), max_outbox_length=4)
+    frame = b'x' * (1 << 20)
+    connection.queue(frame)
+
+    assert connection.flush(1)
+    assert connection.has_pending()
+
+    received = b''
+    remote.settimeout(TIMEOUT)
+    while len(received) < len(frame):
+        received += remote.recv(1 << 16)
+        connection.flush(1)
+
+    assert received == frame
+    assert not connection.has_pending()
+    local.close()
+    remote.close()
+
+
+def test_legacy_client_gets_one_message_per_send(server, connect):
+    client = connect()
+    for message in ('a', 'b', 'c'):
+        server.send(message)
+
+    assert [client.sock.recv(100) for _ in range(3)] == [b'a', b'b', b'c']
+
+
+def test_loop_server_spaces_legacy_messages(tmp_path):
+    socket_path = str(tmp_path / 'pm.sock')
+
+    async def run():
+        server = DmicLoopUdsServer(socket_path, asyncio.get_running_loop())
+        server.start()
+        client = _Client(socket_path)
+        client.sock.setblocking(False)
+        while not server.is_connected():
+            await asyncio.sleep(0.01)
+
+        for message in ('a', 'b', 'c'):
+            server.send(message)
+
+        received = []
+        deadline = time.monotonic() + TIMEOUT
+        while len(received) < 3 and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+            try:
+                received.append(client.sock.recv(100))
+            except BlockingIOError:
+                pass
+
+        client.close()
+        server.close()
+        return received
+
+    assert asyncio.run(run()) == [b'a', b'b', b'c']
+
+
+def test_tracked_message_gets_acknowledged(server, connect, metrics):
+    client = connect(protocol=3)
+    server.send('app_started:true', track_ack=True)
+
+    message, _, correlation_id = client.read_line().partition(UdsServer.CORRELATION_SEPARATOR)
+    assert message == 'app_started:true'
+
+    client.send(f'ack:{correlation_id}\n'.encode())
+    _wait_for(lambda: server.connections()[0].acked_count == 1)
+
+    assert server.connections()[0].stats()['awaiting_ack'] == 0
+    assert metrics.dump()['ui_rtt:app_started']['count'] == 1
+
+
+def test_framed_client_gets_tracked_messages_without_correlation_id(server, connect):
+    client = connect(protocol=2)
+    server.send('app_started:true', track_ack=True)
+
+    assert client.read_line() == 'app_started:true'
+    assert server.connections()[0].stats()['awaiting_ack'] == 0
+
+
+def test_unknown_ack_is_ignored(server, connect, metrics):
+    client = connect(protocol=3)
+    client.send(b'ack:42\nack:x\nstart_app:a\n')
+
+    assert _received(server) == 'start_app:a'
+    assert server.connections()[0].acked_count == 0
+    assert metrics.dump() == {}
+
+
+def test_unacknowledged_message_expires_as_lost(server, connect):
+    client = connect(protocol=3)
+    server.send('activate', track_ack=True)
+    client.read_line()
+
+    connection = server.connections()[0]
+    assert connection.expire_acks(0) == ['activate']
+    assert connection.stats()['lost'] == 1
+
+
+def test_utf8_sequence_split_across_chunks_is_reassembled(server, connect):
+    client = connect(protocol=2)
+    client.send('name:caf'.encode() + b'\xc3')
+    time.sleep(0.05)
+    client.send(b'\xa9\n')
+
+    assert _received(server) == 'name:café'
+
+
+def test_message_split_across_chunks_is_reassembled(server, connect):
+    client = connect(protocol=2)
+    for chunk in (b'start_', b'app:a\nclo', b'se_app\n'):
+        client.send(chunk)
+        time.sleep(0.05)
+
+    assert [_received(server), _received(server)] == ['start_app:a', 'close_app']
+
+
+def test_invalid_utf8_is_replaced(server, connect):
+    client = connect(protocol=2)
+    client.send(b'bad\xff\xfebytes\n')
+
+    assert _received(server) == 'bad��bytes'
+
+
+def test_too_long_message_is_discarded(server, connect):
+    client = connect(protocol=2)
+    client.send(b'x' * (2 * UdsServer.MAX_MESSAGE_LENGTH) + b'\nok\n')
+
+    assert _received(server) == 'ok'
+    assert server.received.empty()
+
+
+def test_query_is_answered_only_to_requesting_client(server, connect):
+    server.register_query('status', lambda: {'state': 'inmenu'})
+    asking = connect(protocol=2)
+    other = connect(protocol=2)
+
+    asking.send(b'status\n')
+    assert asking.read_line() == 'status:{"state":"inmenu"}'
+
+    server.send('broadcast')
+    assert other.read_line() == 'broadcast'
+    assert server.received.empty()
+
+
+def test_failing_query_answers_with_error(server, connect):
+    def fail():
+        raise RuntimeError('broken')
+
+    server.register_query('metrics', fail)
+    client = connect(protocol=2)
+    client.send(b'metrics\n')
+
+    assert json.loads(client.read_line().partition(':')[2]) == {'error': "RuntimeError('broken')"}
+
+
+
+class _SlowSocket:
+    """Socket taking six bytes per sendmsg, the first send lets another thread queue a message."""
+
+    def __init__(self, on_first_send):
+        self.sent = b''
+        self.queuing = threading.Thread(target=on_first_send)
+
+    def fileno(self):
+        return -1
+
+    def sendmsg(self, frames):
+        if not self.queuing.is_alive() and not self.sent:
+            self.queuing.start()
+            self.queuing.join(0.05)
+        data = b''.join(frames)[:6]
+        self.sent += data
+        return len(data)
+
+
+def test_queue_during_flush_keeps_frames_intact():
+    connection = None
+    sock = _SlowSocket(lambda: connection.queue(b'NEW\n'))
+    connection = DmicUdsConnection(sock, 1, ('ui',), max_outbox_length=3)
+    for frame in (b'AAA\n', b'BBB\n', b'CCC\n'):
+        connection.queue(frame)
+
+    connection.flush(UdsServer.MAX_BATCH_MESSAGES)
+    sock.queuing.join(TIMEOUT)
+    while connection.has_pending():
+        connection.flush(UdsServer.MAX_BATCH_MESSAGES)
+
+    assert sock.sent == b'AAA\nBBB\nCCC\nNEW\n'
+    assert connection.dropped_count == 0
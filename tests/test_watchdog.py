@@ -0,0 +1,33 @@
+import time
+
+from dmicade_pm.watchdog import DmicWatchdog
+
+
+def _wait_for_dumps(watchdog, count, timeout=2):
+    deadline = time.monotonic() + timeout
+    while watchdog.dump_count < count and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_dumps_when_activity_budget_runs_out(tmp_path):
+    watchdog = DmicWatchdog({'watchdog_budget': '100', 'logs': str(tmp_path)})
+
+    start = time.monotonic()
+    watchdog.begin('task', 'slow task', 0.1)
+    _wait_for_dumps(watchdog, 1)
+
+    # Not bound to checks every quarter of the default budget.
+    assert watchdog.dump_count == 1
+    assert time.monotonic() - start < 1
+
+
+def test_ended_activities_are_not_dumped(tmp_path):
+    watchdog = DmicWatchdog({'watchdog_budget': '100', 'logs': str(tmp_path)})
+
+    watchdog.begin('task', 'quick task', 0.05)
+    watchdog.end('task')
+    watchdog.begin('other', 'slow task', 0.1)
+    _wait_for_dumps(watchdog, 1)
+    time.sleep(0.05)
+
+    assert watchdog.dump_count == 1
@@ -0,0 +1,46 @@
+import pytest
+
+from dmicade_pm.application_handler import DmicFakeWindowBackend, create_window_backend
+
+
+def test_fake_backend_finds_windows_by_pattern():
+    backend = DmicFakeWindowBackend()
+    window_id = backend.open_window('Super Game 2')
+
+    assert backend.find_window('super game') == window_id
+    assert backend.find_window('^Game') == 0
+    backend.close()
+
+
+def test_fake_backend_activates_and_kills_windows():
+    backend = DmicFakeWindowBackend()
+    window_id = backend.open_window('game')
+
+    assert backend.activate_window(window_id)
+    assert backend.get_active_window() == window_id
+    assert backend.kill_window(window_id)
+    assert backend.get_active_window() == 0
+    assert not backend.kill_window(window_id)
+    backend.close()
+
+
+def test_unwatching_drops_unread_window_events():
+    backend = DmicFakeWindowBackend()
+    backend.watch_window_events()
+    backend.open_window('game')
+    backend.unwatch_window_events()
+
+    assert not backend.read_window_events()
+    backend.close()
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match='unknown'):
+        create_window_backend('unknown')
+
+
+def test_backend_by_name():
+    backend = create_window_backend('fake')
+
+    assert isinstance(backend, DmicFakeWindowBackend)
+    backend.close()